@@ -0,0 +1,187 @@
+import time
+import heapq
+import itertools
+from datetime import date, datetime
+from sqlalchemy import delete, insert, inspect, select, text, union_all
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .config import ARCHIVE_AFTER_MONTHS, ARCHIVE_CUTOFF_TTL, ARCHIVE_BATCH
+from .models import Transaction, ArchivedTransaction, ArchiveState, User
+from . import partitions
+
+# Two tiers under the same ids: `transactions` (hot) and `transactions_archive` (rows dated before
+# the cutoff). Reads always include the hot table, since a write filed under a stale cutoff can
+# leave an old row there, and add the archive unless the range starts at or after the cutoff.
+# The cutoff only moves forward, one whole month at a time, through run().
+
+COLUMNS = [c.name for c in ArchivedTransaction.__table__.columns]
+STATE_ID = 1
+
+_cutoff = TTLCache(maxsize=1, ttl=ARCHIVE_CUTOFF_TTL)
+_has_archive = False
+
+def _conn(db):
+    return db.connection() if isinstance(db, Session) else db
+
+def read_cutoff(db):
+    return db.execute(select(ArchiveState.cutoff).where(ArchiveState.state_id == STATE_ID)).scalar()
+
+def cutoff(db):
+    """Transactions dated before this are archived; None until the first run()."""
+    hit = _cutoff.get("cutoff")
+    if hit is None:
+        hit = (read_cutoff(db),)
+        _cutoff.set("cutoff", hit)
+    return hit[0]
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+def tiers(db, start=None) -> list:
+    """Tables that can hold the user's rows dated start or later, hot first."""
+    c = cutoff(db)
+    start = _as_datetime(start)
+    if c is None or (start is not None and start >= c):
+        return [Transaction]
+    return [Transaction, ArchivedTransaction]
+
+def all_tiers(db) -> list:
+    # for rebuilds, which also run from migrations that predate the archive table
+    global _has_archive
+    if not _has_archive:
+        _has_archive = inspect(_conn(db)).has_table(ArchivedTransaction.__tablename__)
+    return [Transaction, ArchivedTransaction] if _has_archive else [Transaction]
+
+def referenced(db, user_id: int, column: str, value) -> bool:
+    """Whether any of the user's transactions, hot or archived, has column == value.
+
+    Deletes of accounts and categories check this: the archive has no foreign keys,
+    and neither has a partitioned transactions table.
+    """
+    return any(
+        db.query(T.transaction_id).filter(T.user_id == user_id, getattr(T, column) == value).first() is not None
+        for T in all_tiers(db)
+    )
+
+def union(selects: list):
+    """One select per tier as a single subquery, for aggregates over both."""
+    return (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+def newest(queries: list, limit: int, offset: int = 0) -> list:
+    """Rows offset..offset+limit of per-tier queries, each ordered newest first, merged the same way."""
+    if len(queries) == 1:
+        return queries[0].offset(offset).limit(limit).all()
+    return _merge([q.limit(offset + limit).all() for q in queries], limit, offset)
+
+async def newest_async(db, stmts: list, limit: int, offset: int = 0) -> list:
+    """newest() for Core selects on an AsyncSession."""
+    if len(stmts) == 1:
+        return (await db.execute(stmts[0].offset(offset).limit(limit))).all()
+    return _merge([(await db.execute(s.limit(offset + limit))).all() for s in stmts], limit, offset)
+
+def _merge(parts: list, limit: int, offset: int) -> list:
+    merged = heapq.merge(*parts, key=lambda r: (r.transaction_time, r.transaction_id), reverse=True)
+    return list(itertools.islice(merged, offset, offset + limit))
+
+def chained(queries: list, limit: int, offset: int = 0) -> list:
+    """Rows offset..offset+limit of the queries' results read one after another."""
+    rows = []
+    for q in queries:
+        got = q.offset(offset).limit(limit - len(rows)).all()
+        rows.extend(got)
+        if len(rows) >= limit:
+            break
+        # the page starts in a later tier: skip past everything this one holds
+        offset = 0 if got or not offset else max(0, offset - q.order_by(None).count())
+    return rows
+
+def _move(db, src, dst, *where) -> int:
+    # up to ARCHIVE_BATCH rows, ids kept; delete first, as on SQLite both tables feed one FTS index keyed by id
+    cols = [src.__table__.c[name] for name in COLUMNS]
+    rows = [dict(r._mapping) for r in db.execute(select(*cols).where(*where).order_by(src.transaction_id).limit(ARCHIVE_BATCH))]
+    if rows:
+        db.execute(delete(src).where(src.transaction_id.in_([r["transaction_id"] for r in rows])))
+        db.execute(insert(dst), rows)
+    return len(rows)
+
+def settle(db: Session, user_id: int, earliest) -> int:
+    """After writing rows dated earliest or later, move the user's hot rows before the cutoff to the archive."""
+    c = cutoff(db)
+    earliest = _as_datetime(earliest)
+    if c is None or earliest is None or earliest >= c:
+        return 0
+    db.flush()
+    moved = 0
+    while True:
+        n = _move(db, Transaction, ArchivedTransaction, Transaction.user_id == user_id, Transaction.transaction_time < c)
+        moved += n
+        if n < ARCHIVE_BATCH:
+            return moved
+
+def find(db: Session, user_id: int, transaction_id: int):
+    """The user's transaction as a hot row, moved back from the archive first if it is there."""
+    q = db.query(Transaction).filter(Transaction.transaction_id == transaction_id, Transaction.user_id == user_id)
+    trx = q.first()
+    if trx is None and cutoff(db) is not None:
+        if _move(db, ArchivedTransaction, Transaction, ArchivedTransaction.transaction_id == transaction_id, ArchivedTransaction.user_id == user_id):
+            trx = q.first()
+    return trx
+
+def month_start(months_ago: int, today: date = None) -> datetime:
+    today = today or datetime.utcnow().date()
+    m = today.year * 12 + today.month - 1 - months_ago
+    return datetime(m // 12, m % 12 + 1, 1)
+
+def publish(db: Session, value: datetime):
+    row = db.get(ArchiveState, STATE_ID)
+    if row is None:
+        db.add(ArchiveState(state_id=STATE_ID, cutoff=value))
+    else:
+        row.cutoff = value
+    db.commit()
+    _cutoff.pop("cutoff")
+
+def check_ids(db: Session):
+    # an archived id must never be handed out again by the hot table
+    conn = _conn(db)
+    if conn.dialect.name == "sqlite":
+        ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'")).scalar() or ""
+        if "AUTOINCREMENT" not in ddl.upper():
+            raise RuntimeError("transactions was created without AUTOINCREMENT; SQLite would reuse archived ids (recreate the database)")
+    elif conn.dialect.name == "mysql":
+        version = conn.execute(text("SELECT VERSION()")).scalar()
+        if int(version.split(".")[0]) < 8:
+            raise RuntimeError(f"MySQL {version} recomputes AUTO_INCREMENT from max(id) on restart and would reuse archived ids; needs 8.0+")
+
+def run(db: Session, months: int = ARCHIVE_AFTER_MONTHS, wait: float = ARCHIVE_CUTOFF_TTL, log=None) -> dict:
+    """Archive transactions dated before the start of the month `months` months ago."""
+    log = log or (lambda msg: None)
+    check_ids(db)
+    current = read_cutoff(db)
+    target = month_start(months)
+    if current is not None and target <= current:
+        target = current
+    else:
+        publish(db, target)
+        # until every process has the new cutoff, one could read a range that starts after the
+        # old one from the hot table alone; nothing moves before their cached copies expire
+        log(f"cutoff {target:%Y-%m-%d} published, waiting {wait:.0f}s for workers to pick it up")
+        time.sleep(wait)
+    moved = 0
+    for user_id in db.execute(select(User.user_id).order_by(User.user_id)).scalars().all():
+        while True:
+            n = _move(db, Transaction, ArchivedTransaction, Transaction.user_id == user_id, Transaction.transaction_time < target)
+            db.commit()
+            moved += n
+            if n < ARCHIVE_BATCH:
+                break
+    dropped = partitions.drop_before(_conn(db), target) if partitions.is_partitioned(_conn(db)) else []
+    db.commit()
+    return {"cutoff": target, "moved": moved, "dropped_partitions": dropped}
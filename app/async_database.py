@@ -0,0 +1,63 @@
+from fastapi import Depends, HTTPException
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from .config import ASYNC_DATABASE_URL, ASYNC_DB_POOL, REPLICA_POOL, async_url
+from . import search, versions
+from .database import pool_options, replicas
+from .deps import Principal, get_token_authorization, get_read_db, _cached_principal, _claims, _generation, _principal_select, _remember_principal
+
+def make_async_engine(url: str, pool: dict):
+    engine = create_async_engine(url, pool_pre_ping=True, **pool_options(url, pool))
+    if engine.dialect.name == "sqlite":
+        search.register_sqlite(engine.sync_engine)
+    return engine
+
+async_engine = make_async_engine(ASYNC_DATABASE_URL, ASYNC_DB_POOL)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# an async engine beside each replica's sync one; the ReplicaSet health checks choose for both
+replica_engines = {r.name: make_async_engine(async_url(r.engine.url.render_as_string(hide_password=False)), REPLICA_POOL) for r in replicas.replicas}
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_current_principal_async(token: str = Depends(get_token_authorization), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    # the version-store lookups go through versions.off_loop: with Redis they would block the event loop
+    principal = await versions.off_loop(_cached_principal, token)
+    if principal:
+        return principal
+    payload = _claims(token)
+    generation = await versions.off_loop(_generation, payload["user_id"])
+    try:
+        row = (await db.execute(_principal_select(payload["user_id"]))).first()
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return _remember_principal(token, payload, generation, row)
+
+def get_read_db_async(user: Principal = Depends(get_current_principal_async)):
+    # get_read_db on the async principal, so a route doesn't authenticate twice
+    yield from get_read_db(user)
+
+async def read_session_async(user_id: int = None) -> AsyncSession:
+    """database.read_session for AsyncSession: a healthy replica unless the user wrote recently, else the primary."""
+    if replicas and not (user_id is not None and await versions.off_loop(versions.pinned, user_id)):
+        for replica in replicas.candidates():
+            db = AsyncSession(replica_engines[replica.name], autoflush=False, expire_on_commit=False)
+            try:
+                # connect now, so a dead replica falls back here rather than failing the endpoint
+                await db.connection()
+                return db
+            except DBAPIError as e:
+                await db.close()
+                replica.mark_down(e)
+    return AsyncSessionLocal()
+
+async def get_async_read_db(user: Principal = Depends(get_current_principal_async)):
+    """Session for the native async reads, routed like get_read_db."""
+    db = await read_session_async(user.user_id)
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from .config import RECONCILE_WORKERS
+from .database import SessionLocal
+from .models import Account, Transaction, ArchivedTransaction
+from . import snapshots, versions
+
+CENT = Decimal("0.01")
+MAX_MISMATCHES = 1000
+
+def to_decimal(amount) -> Decimal:
+    return Decimal(str(amount)).quantize(CENT)
+
+def signed_amount(amount, ttype: str) -> Decimal:
+    amount = to_decimal(amount)
+    return amount if ttype == "INCOME" else -amount
+
+def apply_balance(db: Session, user_id: int, account_id: int, delta: Decimal):
+    # single atomic UPDATE: no read-modify-write, so concurrent writers cannot lose updates
+    res = db.execute(update(Account).where(Account.account_id == account_id, Account.user_id == user_id).values(balance=Account.balance + delta))
+    if res.rowcount == 0:
+        raise HTTPException(status_code=404, detail="account not found")
+
+def apply_balance_deltas(db: Session, user_id: int, deltas: dict):
+    for account_id, delta in sorted(deltas.items()):
+        if delta:
+            apply_balance(db, user_id, account_id, delta)
+
+def post_many(db: Session, user_id: int, items):
+    # items: (account_id, transaction_time, signed delta); moves balances and daily snapshots together
+    items = list(items)
+    deltas = defaultdict(Decimal)
+    for account_id, _, delta in items:
+        deltas[account_id] += delta
+    apply_balance_deltas(db, user_id, deltas)
+    snapshots.record_many(db, user_id, items)
+
+def post(db: Session, user_id: int, account_id: int, when, delta: Decimal):
+    apply_balance(db, user_id, account_id, delta)
+    snapshots.record(db, user_id, account_id, when, delta)
+
+def adjust_opening(db: Session, user_id: int, account_id: int, delta: Decimal):
+    # a manual balance correction is treated as a different starting balance
+    res = db.execute(update(Account).where(Account.account_id == account_id, Account.user_id == user_id).values(balance=Account.balance + delta, opening_balance=Account.opening_balance + delta))
+    if res.rowcount == 0:
+        raise HTTPException(status_code=404, detail="account not found")
+    snapshots.shift(db, account_id, delta)
+
+def _expected_balance():
+    expected = Account.opening_balance
+    for T in (Transaction, ArchivedTransaction):
+        expected = expected + select(func.coalesce(func.sum(snapshots.signed_amount_expr(T)), 0)).where(T.account_id == Account.account_id, T.user_id == Account.user_id).scalar_subquery()
+    return expected
+
+def _ranges(lo: int, hi: int, parts: int):
+    step = max((hi - lo + 1) // parts + 1, 1)
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
+
+def _check_range(lo: int, hi: int, user_id: int = None):
+    db = SessionLocal.session_factory()
+    try:
+        stmt = select(Account.account_id, Account.user_id, Account.balance, _expected_balance()).where(Account.account_id.between(lo, hi))
+        if user_id is not None:
+            stmt = stmt.where(Account.user_id == user_id)
+        checked, mismatches = 0, []
+        for account_id, uid, balance, expected in db.execute(stmt):
+            checked += 1
+            balance, expected = to_decimal(balance or 0), to_decimal(expected or 0)
+            if balance != expected:
+                mismatches.append({"account_id": account_id, "user_id": uid, "balance": balance, "expected": expected, "diff": balance - expected})
+        return checked, mismatches
+    finally:
+        db.close()
+
+def reconcile(user_id: int = None, fix: bool = False, workers: int = RECONCILE_WORKERS) -> dict:
+    """Recompute balances from transactions, account-id ranges checked in parallel."""
+    db = SessionLocal.session_factory()
+    try:
+        bounds = select(func.min(Account.account_id), func.max(Account.account_id))
+        if user_id is not None:
+            bounds = bounds.where(Account.user_id == user_id)
+        lo, hi = db.execute(bounds).one()
+        checked, mismatches = 0, []
+        if lo is not None:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reconcile") as pool:
+                for n, found in pool.map(lambda r: _check_range(r[0], r[1], user_id), _ranges(lo, hi, workers)):
+                    checked += n
+                    mismatches.extend(found)
+        fixed = rebuilt = 0
+        if fix:
+            # snapshots can drift while the balance is right, so every checked account is rebuilt
+            ids = db.execute(select(Account.account_id).where(*([Account.user_id == user_id] if user_id is not None else [])).order_by(Account.account_id)).scalars().all()
+            wrong = {m["account_id"] for m in mismatches}
+            db.commit()
+            for i in range(0, len(ids), snapshots.ACCOUNT_BATCH):
+                batch = ids[i:i + snapshots.ACCOUNT_BATCH]
+                # writers lock their account row before touching balance or snapshots, so with the
+                # batch locked first the rebuild sees every committed transaction and none posts midway
+                db.execute(select(Account.account_id).where(Account.account_id.in_(batch)).with_for_update())
+                bad = [a for a in batch if a in wrong]
+                if bad:
+                    # recomputed inside the UPDATE so writes since the check are not lost
+                    fixed += db.execute(update(Account).where(Account.account_id.in_(bad)).values(balance=_expected_balance())).rowcount
+                rebuilt += snapshots.rebuild(db, account_ids=batch)
+                db.commit()
+            for uid in {m["user_id"] for m in mismatches} | ({user_id} if user_id is not None else set()):
+                versions.bump(uid, "accounts")
+        return {"accounts": checked, "mismatch_count": len(mismatches), "mismatches": mismatches[:MAX_MISMATCHES], "fixed": fixed, "snapshots_rebuilt": rebuilt}
+    finally:
+        db.close()
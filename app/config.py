@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,4 +16,104 @@ JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "1440"))
 
 API_PREFIX = os.getenv("API_PREFIX", "/v1")
 
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+BATCH_ADD_MAX = int(os.getenv("BATCH_ADD_MAX", "1000"))
+# largest page_size the list endpoints accept
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
 MYSQL_DSN = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+# overrides the MySQL settings above, e.g. sqlite:///./meloon.db for local runs
+DATABASE_URL = os.getenv("DATABASE_URL", MYSQL_DSN)
+# comma separated read replicas served through get_read_db; empty means every read goes to DATABASE_URL
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+
+def _pool(prefix: str, default: dict = None) -> dict:
+    # <prefix>_POOL_SIZE, _MAX_OVERFLOW, _POOL_TIMEOUT, _POOL_RECYCLE; unset ones follow default
+    default = default or {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_recycle": 3600}
+    env = {"pool_size": "POOL_SIZE", "max_overflow": "MAX_OVERFLOW", "pool_timeout": "POOL_TIMEOUT", "pool_recycle": "POOL_RECYCLE"}
+    return {k: int(os.getenv(f"{prefix}_{name}", str(default[k]))) for k, name in env.items()}
+
+DB_POOL = _pool("DB")
+REPLICA_POOL = _pool("REPLICA", DB_POOL)
+ASYNC_DB_POOL = _pool("ASYNC_DB", DB_POOL)
+# replicas are pinged (and their lag read on MySQL) this often; a failed or lagging one is skipped until it recovers
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "2"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+# after any write the user's reads stay on the primary this long, so they see their own changes and ETags
+# never tag stale replica data; keep it above REPLICA_MAX_LAG + REPLICA_CHECK_SECONDS
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+
+# DB_ASYNC=1 serves the routers as async endpoints that authenticate on an AsyncSession; the hot reads
+# query it natively, the rest still run on the threadpool so their CPU work never blocks the event loop
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+
+def async_url(url: str) -> str:
+    # the same database through its asyncio driver
+    return url.replace("mysql+pymysql://", "mysql+aiomysql://").replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url(DATABASE_URL))
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_DIR = os.getenv("JOB_DIR", os.path.join(tempfile.gettempdir(), "meloon_jobs"))
+# RUNNING jobs without a heartbeat for this long are assumed orphaned by a dead worker
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+# running jobs refresh updated_at this often; keep it well under JOB_STALE_SECONDS
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# finished export files are deleted after this long
+JOB_EXPORT_RETENTION_HOURS = float(os.getenv("JOB_EXPORT_RETENTION_HOURS", "24"))
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", "4"))
+
+# per-user data versions behind ETags: "memory" (single process) or "redis" (shared by workers)
+VERSION_STORE = os.getenv("VERSION_STORE", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# cached principals are invalidated through the version store; the memory store only sees this
+# process's changes, so other workers may keep a deleted or changed user for up to this long
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300" if VERSION_STORE == "redis" else "30"))
+# read replicas keep read-your-writes only with a store shared by every worker; 1 accepts the
+# memory store for a single-process deployment
+REPLICA_LOCAL_PINS = os.getenv("REPLICA_LOCAL_PINS", "0") == "1"
+# X-Internal-Token for /internal/*; unset hides those endpoints
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN", "")
+
+# in-process reminder scheduler; safe to run in every worker, firings are claimed in the database
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+REMINDER_BATCH = int(os.getenv("REMINDER_BATCH", "500"))
+REMINDER_LOOKAHEAD = int(os.getenv("REMINDER_LOOKAHEAD", "60"))
+# "log" or "package.module:Factory" returning an object with send(reminders)
+REMINDER_NOTIFIER = os.getenv("REMINDER_NOTIFIER", "log")
+
+# Prometheus /metrics, request/SQL accounting; off means no middleware or engine hooks at all
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# 1 runs pending migrations when a worker starts (handy for local runs); 0 is the fast-start mode:
+# schema changes only through `python -m app.migrations`, and a worker reports ready once the schema is current
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+# connections opened before /ready passes, so the first requests don't pay for connects
+POOL_WARMUP = int(os.getenv("POOL_WARMUP", str(DB_POOL["pool_size"])))
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "2"))
+
+# password hashing runs on its own processes so a login burst can't take every request thread;
+# each uvicorn worker has its own pool. HASH_WORKERS=0 hashes inline (still admission controlled)
+PASSWORD_ROUNDS = int(os.getenv("PASSWORD_ROUNDS", "29000"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# hashes queued or running beyond this are refused with 503 instead of waiting
+HASH_QUEUE = int(os.getenv("HASH_QUEUE", str(max(1, HASH_WORKERS) * 4)))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "5"))
+# >0 runs hash workers at lower CPU priority: on a saturated box the rest of the API goes first, logins slow down
+HASH_NICE = int(os.getenv("HASH_NICE", "0"))
+
+# cold tier: transactions older than this many whole months move to transactions_archive when
+# `scripts/archive_transactions.py` runs; every process reads the published cutoff at most this stale
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_CUTOFF_TTL = float(os.getenv("ARCHIVE_CUTOFF_TTL", "30"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "1000"))
+
+# /stats/ai_analysis: months of monthly_stats history loaded per user, of which the last
+# INSIGHTS_BASELINE_MONTHS before the period form the baseline; results cached until the user writes
+INSIGHTS_HISTORY_MONTHS = int(os.getenv("INSIGHTS_HISTORY_MONTHS", "24"))
+INSIGHTS_BASELINE_MONTHS = int(os.getenv("INSIGHTS_BASELINE_MONTHS", "12"))
+INSIGHTS_Z = float(os.getenv("INSIGHTS_Z", "2"))
+INSIGHTS_CACHE_SIZE = int(os.getenv("INSIGHTS_CACHE_SIZE", "10000"))
+INSIGHTS_CACHE_TTL = int(os.getenv("INSIGHTS_CACHE_TTL", "3600"))
@@ -1,18 +1,179 @@
-from sqlalchemy import create_engine
+import time
+import logging
+import itertools
+import threading
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import sessionmaker, scoped_session
-from .config import MYSQL_DSN
+from sqlalchemy.pool import QueuePool
+from .config import DATABASE_URL, DB_POOL, DATABASE_REPLICA_URLS, REPLICA_POOL, REPLICA_CHECK_SECONDS, REPLICA_MAX_LAG, VERSION_STORE, REPLICA_LOCAL_PINS
+from . import search, versions
 
-engine = create_engine(
-    MYSQL_DSN,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-)
+logger = logging.getLogger(__name__)
+
+def pool_options(url: str, pool: dict) -> dict:
+    # sizing only applies to queue pools; SQLite memory and aiosqlite files use pools that reject it
+    u = make_url(url)
+    if issubclass(u.get_dialect().get_pool_class(u), QueuePool):
+        return dict(pool)
+    return {"pool_recycle": pool["pool_recycle"]}
+
+def make_engine(url: str, pool: dict):
+    engine = create_engine(
+        url,
+        pool_pre_ping=True,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+        **pool_options(url, pool),
+    )
+    if engine.dialect.name == "sqlite":
+        search.register_sqlite(engine)
+    return engine
+
+engine = make_engine(DATABASE_URL, DB_POOL)
 
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
 def get_db():
-    db = SessionLocal()
+    # a fresh session per request: the thread-local one would be shared by requests
+    # that FastAPI runs on the same threadpool thread
+    db = SessionLocal.session_factory()
     try:
         yield db
     finally:
         db.close()
+
+ReadSession = sessionmaker(autocommit=False, autoflush=False)
+
+@event.listens_for(ReadSession, "before_flush")
+def _read_only(session, flush_context, instances):
+    raise RuntimeError("replica sessions are read-only; use get_db for writes")
+
+def _replication_lag(conn):
+    """Seconds the replica is behind, None if replication is stopped, 0 if it isn't a replica."""
+    if conn.dialect.name != "mysql":
+        return 0
+    try:
+        row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+    except DBAPIError:
+        # MySQL before 8.0.22
+        row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+    if row is None:
+        return 0
+    return row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.checked_at = None
+
+    def check(self, max_lag: float):
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                try:
+                    lag = _replication_lag(conn)
+                except DBAPIError:
+                    # no REPLICATION CLIENT grant: liveness is all we can see
+                    lag = 0
+        except Exception as e:
+            self.mark_down(e)
+        else:
+            self.lag = lag
+            healthy = lag is not None and lag <= max_lag
+            if healthy != self.healthy:
+                logger.warning("replica %s is %s (lag %s s)", self.name, "back" if healthy else "lagging or stopped", lag)
+            self.healthy = healthy
+            self.error = None if healthy else f"lag {lag}"
+        self.checked_at = time.time()
+
+    def mark_down(self, error):
+        if self.healthy:
+            logger.warning("replica %s is down: %s", self.name, error)
+        self.healthy = False
+        # the message names hosts and users; it goes to the log above, status only gets the type
+        self.error = type(error).__name__
+
+    def status(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag": self.lag, "error": self.error, "checked_at": self.checked_at}
+
+class ReplicaSet:
+    """Read replicas taken round robin, skipping ones the health check or a failed connect marked down."""
+
+    def __init__(self, urls: list, pool: dict, interval: float = REPLICA_CHECK_SECONDS, max_lag: float = REPLICA_MAX_LAG):
+        self.replicas = [Replica(f"replica{i}", make_engine(url, pool)) for i, url in enumerate(urls)]
+        self.interval = interval
+        self.max_lag = max_lag
+        self._next = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def candidates(self) -> list:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return []
+        i = next(self._next) % len(healthy)
+        return healthy[i:] + healthy[:i]
+
+    def check(self):
+        for replica in self.replicas:
+            replica.check(self.max_lag)
+
+    def _loop(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logger.exception("replica health check failed")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        # the first check runs on the thread: a replica that hangs on connect mustn't hold up boot
+        if not self.replicas or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="replica-health", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def status(self) -> list:
+        return [r.status() for r in self.replicas]
+
+if DATABASE_REPLICA_URLS and VERSION_STORE == "memory" and not REPLICA_LOCAL_PINS:
+    # a write pins its user to the primary only in the worker that served it; another worker
+    # would read that user's own change from a lagging replica
+    raise RuntimeError("read replicas need VERSION_STORE=redis for read-your-writes; set REPLICA_LOCAL_PINS=1 if this is the only process")
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS, REPLICA_POOL)
+
+def read_session(user_id: int = None):
+    """A session for read-only work: a healthy replica, else the primary.
+
+    Users who wrote within READ_YOUR_WRITES_SECONDS stay on the primary so a
+    lagging replica can't hide their own change from them.
+    """
+    if replicas and not (user_id is not None and versions.pinned(user_id)):
+        for replica in replicas.candidates():
+            db = ReadSession(bind=replica.engine)
+            try:
+                # connect now, so a dead replica falls back here rather than failing the endpoint
+                db.connection()
+                return db
+            except DBAPIError as e:
+                db.close()
+                replica.mark_down(e)
+    return SessionLocal.session_factory()
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import mysql, sqlite
+from .models import Debt, DebtLedger, DebtTotal
+
+AMOUNT_COLUMNS = ("borrowed", "lent", "debt_count")
+DEBT_TYPES = ("BORROW", "LEND")
+
+def _upsert(db: Session, model, keys: tuple, rows: list):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(model).values(rows)
+        stmt = stmt.on_duplicate_key_update(**{c: getattr(model, c) + stmt.inserted[c] for c in AMOUNT_COLUMNS})
+        db.execute(stmt)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_={c: getattr(model, c) + stmt.excluded[c] for c in AMOUNT_COLUMNS})
+        db.execute(stmt)
+    else:
+        for r in rows:
+            row = db.get(model, tuple(r[k] for k in keys), with_for_update=True)
+            if row:
+                for c in AMOUNT_COLUMNS:
+                    setattr(row, c, getattr(row, c) + r[c])
+            else:
+                db.add(model(**r))
+        db.flush()
+
+def record_many(db: Session, items):
+    # items: (user_id, person_name, debt_type, amount, sign)
+    people = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for user_id, person, dtype, amount, sign in items:
+        if dtype not in DEBT_TYPES:
+            raise ValueError(f"invalid debt type: {dtype}")
+        acc = people[user_id, person]
+        acc[DEBT_TYPES.index(dtype)] += Decimal(str(amount)) * sign
+        acc[2] += sign
+    users = defaultdict(lambda: [Decimal("0"), Decimal("0"), 0])
+    for (user_id, _), acc in people.items():
+        for i, v in enumerate(acc):
+            users[user_id][i] += v
+    # sorted, so concurrent writers take the row locks in the same order
+    _upsert(db, DebtLedger, ("user_id", "person_name"), [
+        {"user_id": user_id, "person_name": person, **dict(zip(AMOUNT_COLUMNS, acc))}
+        for (user_id, person), acc in sorted(people.items()) if any(acc)
+    ])
+    _upsert(db, DebtTotal, ("user_id",), [
+        {"user_id": user_id, **dict(zip(AMOUNT_COLUMNS, acc))}
+        for user_id, acc in sorted(users.items()) if any(acc)
+    ])
+
+def record(db: Session, debt: Debt, sign: int = 1):
+    record_many(db, [(debt.user_id, debt.person_name, debt.debt_type, debt.amount, sign)])
+
+def totals(db: Session, user_id: int) -> dict:
+    row = db.get(DebtTotal, user_id)
+    borrowed, lent = (row.borrowed, row.lent) if row else (Decimal("0"), Decimal("0"))
+    return {"borrowed": borrowed or Decimal("0"), "lent": lent or Decimal("0")}
+
+def totals_columns(user_id: int) -> tuple:
+    # totals() as (borrowed, lent) scalar subqueries, to batch into a larger SELECT
+    return tuple(func.coalesce(select(col).where(DebtTotal.user_id == user_id).scalar_subquery(), 0) for col in (DebtTotal.borrowed, DebtTotal.lent))
+
+def people(db: Session, user_id: int):
+    # counterparties with any debt left on record, largest outstanding balance first
+    net = DebtLedger.lent - DebtLedger.borrowed
+    return db.query(DebtLedger).filter(DebtLedger.user_id == user_id, DebtLedger.debt_count > 0).order_by(func.abs(net).desc(), DebtLedger.person_name).all()
+
+def person(db: Session, user_id: int, person_name: str):
+    return db.get(DebtLedger, (user_id, person_name))
+
+def rebuild(db, user_id: int = None) -> int:
+    """Recompute the ledger and per-user totals from the debts table; db may be a Session or a Connection."""
+    borrowed = func.coalesce(func.sum(case((Debt.debt_type == "BORROW", Debt.amount), else_=0)), 0)
+    lent = func.coalesce(func.sum(case((Debt.debt_type == "LEND", Debt.amount), else_=0)), 0)
+    by_person = select(Debt.user_id, Debt.person_name, borrowed, lent, func.count()).group_by(Debt.user_id, Debt.person_name)
+    by_user = select(Debt.user_id, borrowed, lent, func.count()).group_by(Debt.user_id)
+    clear_people, clear_users = delete(DebtLedger), delete(DebtTotal)
+    if user_id is not None:
+        by_person, by_user = by_person.where(Debt.user_id == user_id), by_user.where(Debt.user_id == user_id)
+        clear_people, clear_users = clear_people.where(DebtLedger.user_id == user_id), clear_users.where(DebtTotal.user_id == user_id)
+    db.execute(clear_people)
+    db.execute(clear_users)
+    rows = db.execute(insert(DebtLedger).from_select(["user_id", "person_name", *AMOUNT_COLUMNS], by_person)).rowcount
+    db.execute(insert(DebtTotal).from_select(["user_id", *AMOUNT_COLUMNS], by_user))
+    return rows
@@ -1,8 +1,45 @@
+import time
+import logging
+import secrets
+from dataclasses import dataclass
+from typing import Optional
 from fastapi import Header, HTTPException, Depends
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
-from .database import get_db
+from .database import get_db, read_session
 from .security import decode_token
 from .models import User
+from .cache import TTLCache
+from .config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, INTERNAL_TOKEN
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    nickname: Optional[str] = None
+    language: Optional[str] = None
+
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+# a cached principal is only good while the user's "user" version is the one it was loaded under;
+# with VERSION_STORE=redis that covers changes made through any worker
+def _generation(user_id: int):
+    try:
+        epoch, (version,) = versions.store.snapshot(user_id, ["user"])
+        return epoch, version
+    except Exception:
+        logger.exception("user version lookup failed for user %s", user_id)
+        return None
+
+def invalidate_user(user_id: int):
+    versions.bump(user_id, "user")
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.user_id)
 
 def get_token_authorization(authorization: str = Header(default=None)) -> str:
     if not authorization or not authorization.startswith("Bearer "):
@@ -21,3 +58,60 @@ def get_current_user(token: str = Depends(get_token_authorization), db: Session
         return user
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+def _cached_principal(token: str) -> Optional[Principal]:
+    cached = principal_cache.get(token)
+    if cached and cached[1] is not None and cached[1] == _generation(cached[0].user_id):
+        return cached[0]
+    return None
+
+def _claims(token: str) -> dict:
+    try:
+        payload = decode_token(token)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if not payload.get("user_id"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def _principal_select(user_id: int):
+    return select(User.user_id, User.nickname, User.language).where(User.user_id == user_id)
+
+def _load_principal(token: str, db: Session) -> Principal:
+    payload = _claims(token)
+    generation = _generation(payload["user_id"])
+    try:
+        row = db.execute(_principal_select(payload["user_id"])).first()
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return _remember_principal(token, payload, generation, row)
+
+def _remember_principal(token: str, payload: dict, generation, row) -> Principal:
+    # generation is read before the row, so a change racing the load only makes the entry stale
+    if not row:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    principal = Principal(user_id=row.user_id, nickname=row.nickname, language=row.language)
+    ttl = AUTH_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        principal_cache.set(token, (principal, generation), ttl)
+    return principal
+
+def get_current_principal(token: str = Depends(get_token_authorization), db: Session = Depends(get_db)) -> Principal:
+    return _cached_principal(token) or _load_principal(token, db)
+
+def get_read_db(user: Principal = Depends(get_current_principal)):
+    """Session for read-only endpoints: a replica unless the user wrote recently."""
+    db = read_session(user.user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def require_internal(x_internal_token: str = Header(default=None)):
+    """Guard for /internal endpoints: the INTERNAL_TOKEN header, and they don't exist without one."""
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_internal_token or not secrets.compare_digest(x_internal_token, INTERNAL_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
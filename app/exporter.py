@@ -0,0 +1,106 @@
+import io
+import csv
+import tempfile
+from sqlalchemy import select
+from .database import read_session
+from .models import Debt, Account, Category
+from .response import dumps
+from . import archive
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+SHEETS = {
+    "transactions": ["transaction_id", "type", "amount", "category", "account", "time", "summary", "person"],
+    "debts": ["debt_id", "type", "person", "amount", "time", "note"],
+}
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+def _fmt_time(dt):
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+def transaction_rows(db, user_id: int):
+    # oldest first, so the archive before the hot table
+    for T in reversed(archive.tiers(db)):
+        stmt = select(
+            T.transaction_id,
+            T.transaction_type,
+            T.amount,
+            Category.category_name,
+            Account.account_name,
+            T.transaction_time,
+            T.summary,
+            T.target_person,
+        ).join(Category, T.category_id == Category.category_id).join(Account, T.account_id == Account.account_id).where(T.user_id == user_id).order_by(T.transaction_time, T.transaction_id)
+        for r in db.execute(stmt.execution_options(yield_per=BATCH_SIZE)):
+            yield [r[0], r[1], float(r[2]), r[3], r[4], _fmt_time(r[5]), r[6] or "", r[7] or ""]
+
+def debt_rows(db, user_id: int):
+    stmt = select(Debt.debt_id, Debt.debt_type, Debt.person_name, Debt.amount, Debt.action_time, Debt.note).where(Debt.user_id == user_id).order_by(Debt.action_time, Debt.debt_id)
+    for r in db.execute(stmt.execution_options(yield_per=BATCH_SIZE)):
+        yield [r[0], r[1], r[2], float(r[3]), _fmt_time(r[4]), r[5] or ""]
+
+ROWS = {"transactions": transaction_rows, "debts": debt_rows}
+
+def iter_xlsx(db, user_id: int):
+    from openpyxl import Workbook
+    # write-only sheets spill rows to temp files instead of holding cells in memory
+    wb = Workbook(write_only=True)
+    for sheet, header in SHEETS.items():
+        ws = wb.create_sheet(sheet)
+        ws.append(header)
+        for row in ROWS[sheet](db, user_id):
+            ws.append(row)
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_csv(db, user_id: int, sheet: str = "transactions"):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(SHEETS[sheet])
+    for row in ROWS[sheet](db, user_id):
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def iter_ndjson(db, user_id: int):
+    buf = []
+    size = 0
+    for sheet, header in SHEETS.items():
+        for row in ROWS[sheet](db, user_id):
+            line = dumps({"sheet": sheet, **dict(zip(header, row))}) + b"\n"
+            buf.append(line)
+            size += len(line)
+            if size >= CHUNK_SIZE:
+                yield b"".join(buf)
+                buf = []
+                size = 0
+    yield b"".join(buf)
+
+def stream(user_id: int, fmt: str, sheet: str = "transactions"):
+    # own session: the request-scoped one is closed before the body is sent
+    db = read_session(user_id)
+    try:
+        if fmt == "csv":
+            yield from iter_csv(db, user_id, sheet)
+        elif fmt == "ndjson":
+            yield from iter_ndjson(db, user_id)
+        else:
+            yield from iter_xlsx(db, user_id)
+    finally:
+        db.close()
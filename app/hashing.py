@@ -0,0 +1,109 @@
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from .config import HASH_WORKERS, HASH_QUEUE, HASH_TIMEOUT, HASH_NICE
+from . import security
+
+logger = logging.getLogger(__name__)
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+
+def _init_worker(nice: int):
+    if nice:
+        os.nice(nice)
+
+def _noop():
+    return None
+
+class HashPool:
+    """pbkdf2 on worker processes, with at most `queue` hashes queued or running.
+
+    A request over the limit gets 503 at once instead of holding a request
+    thread while it waits its turn. A slot is freed when the hash finishes,
+    not when the caller gives up, so the bound holds even after timeouts.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue: int = HASH_QUEUE, timeout: float = HASH_TIMEOUT, nice: int = HASH_NICE):
+        self.workers = workers
+        self.timeout = timeout
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs the scheduler and job threads is unsafe
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(self.nice,))
+            return self._executor
+
+    def _release(self, _future=None):
+        self.completed += 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise _busy()
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise _busy()
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.timeouts += 1
+            future.cancel()
+            raise _busy()
+        except BrokenProcessPool:
+            # a worker died (OOM kill); the next call starts a fresh pool
+            logger.exception("password hashing pool broke")
+            self._reset()
+            raise _busy()
+
+    def _reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self):
+        """Start every worker now, so the first logins don't pay for process spawns."""
+        if self.workers:
+            executor = self._get_executor()
+            for future in [executor.submit(_noop) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "completed": self.completed, "rejected": self.rejected, "timeouts": self.timeouts}
+
+pool = HashPool()
+
+def hash_password(password: str) -> str:
+    return pool.run(security.hash_password, password)
+
+def verify_and_update(password: str, hashed: str):
+    return pool.run(security.verify_and_update, password, hashed)
@@ -0,0 +1,178 @@
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from .models import Transaction, Debt, Account, Category
+from . import archive, rollup, debt_ledger
+from .balances import post_many, signed_amount
+
+CHUNK_SIZE = 1000
+MAX_ERRORS = 1000
+# MySQL TEXT
+TEXT_BYTES = 65535
+
+class RowError(ValueError):
+    pass
+
+def _parse_time(value) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value.strip(), "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise RowError(f"invalid time: {value!r}")
+
+def _parse_amount(value) -> Decimal:
+    try:
+        amount = Decimal(str(value)).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"invalid amount: {value!r}")
+    if amount <= 0:
+        raise RowError(f"amount must be positive: {value!r}")
+    return amount
+
+def _parse_choice(value, choices) -> str:
+    if value not in choices:
+        raise RowError(f"invalid type: {value!r}")
+    return value
+
+def _parse_text(value, column, label: str):
+    # checked per row: on MySQL strict mode one over-long cell would fail the whole chunk
+    if value is None or value == "":
+        return None
+    value = str(value)
+    limit = column.type.length
+    if limit is not None and len(value) > limit:
+        raise RowError(f"{label} longer than {limit} characters")
+    if limit is None and len(value.encode("utf-8")) > TEXT_BYTES:
+        raise RowError(f"{label} longer than {TEXT_BYTES} bytes")
+    return value
+
+def _name_map(db: Session, id_col, name_col, user_col, user_id: int) -> dict:
+    # first id wins for duplicate names, matching the old per-row .first() lookup
+    names = {}
+    for row_id, name in db.query(id_col, name_col).filter(user_col == user_id).order_by(id_col):
+        names.setdefault(name, row_id)
+    return names
+
+def _data_rows(ws):
+    rows = ws.iter_rows(values_only=True)
+    next(rows, None)
+    for index, row in enumerate(rows, start=2):
+        if row and any(v not in (None, "") for v in row):
+            yield index, row
+
+class ImportResult:
+    def __init__(self):
+        self.transactions = 0
+        self.debts = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, sheet: str, row: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"sheet": sheet, "row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "transactions_imported": self.transactions,
+            "debts_imported": self.debts,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+def import_transactions(db: Session, user_id: int, ws, result: ImportResult, progress=None):
+    categories = _name_map(db, Category.category_id, Category.category_name, Category.user_id, user_id)
+    accounts = _name_map(db, Account.account_id, Account.account_name, Account.user_id, user_id)
+    balance = defaultdict(Decimal)
+    chunk = []
+
+    def flush():
+        if chunk:
+            db.execute(insert(Transaction), chunk)
+            rollup.record_many(db, ((user_id, r["transaction_time"], r["transaction_type"], r["category_id"], r["amount"], 1) for r in chunk))
+            result.transactions += len(chunk)
+            chunk.clear()
+            if progress:
+                progress(result)
+
+    for index, row in _data_rows(ws):
+        try:
+            _, ttype, amount, category_name, account_name, ttime, summary, person = (tuple(row) + (None,) * 8)[:8]
+            ttype = _parse_choice(ttype, ("EXPENSE", "INCOME"))
+            amount = _parse_amount(amount)
+            dt = _parse_time(ttime)
+            if category_name not in categories:
+                raise RowError(f"unknown category: {category_name!r}")
+            if account_name not in accounts:
+                raise RowError(f"unknown account: {account_name!r}")
+            summary = _parse_text(summary, Transaction.summary, "summary")
+            person = _parse_text(person, Transaction.target_person, "person")
+        except RowError as e:
+            result.error("transactions", index, str(e))
+            continue
+        category_id = categories[category_name]
+        account_id = accounts[account_name]
+        chunk.append({
+            "user_id": user_id,
+            "account_id": account_id,
+            "category_id": category_id,
+            "amount": amount,
+            "transaction_type": ttype,
+            "transaction_time": dt,
+            "summary": summary,
+            "target_person": person,
+        })
+        balance[account_id, dt.date()] += signed_amount(amount, ttype)
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    flush()
+    post_many(db, user_id, ((account_id, day, delta) for (account_id, day), delta in balance.items()))
+    archive.settle(db, user_id, min((day for _, day in balance), default=None))
+
+def import_debts(db: Session, user_id: int, ws, result: ImportResult, progress=None):
+    chunk = []
+
+    def flush():
+        if chunk:
+            db.execute(insert(Debt), chunk)
+            debt_ledger.record_many(db, ((user_id, r["person_name"], r["debt_type"], r["amount"], 1) for r in chunk))
+            result.debts += len(chunk)
+            chunk.clear()
+            if progress:
+                progress(result)
+
+    for index, row in _data_rows(ws):
+        try:
+            _, dtype, person, amount, dtime, note = (tuple(row) + (None,) * 6)[:6]
+            dtype = _parse_choice(dtype, debt_ledger.DEBT_TYPES)
+            amount = _parse_amount(amount)
+            dt = _parse_time(dtime)
+            person = _parse_text(person, Debt.person_name, "person")
+            if not person:
+                raise RowError("person is required")
+            note = _parse_text(note, Debt.note, "note")
+        except RowError as e:
+            result.error("debts", index, str(e))
+            continue
+        chunk.append({"user_id": user_id, "debt_type": dtype, "person_name": person, "amount": amount, "action_time": dt, "note": note})
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    flush()
+
+def import_workbook(db: Session, user_id: int, fileobj, progress=None) -> ImportResult:
+    from openpyxl import load_workbook
+    result = ImportResult()
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        if "transactions" in wb.sheetnames:
+            import_transactions(db, user_id, wb["transactions"], result, progress)
+        if "debts" in wb.sheetnames:
+            import_debts(db, user_id, wb["debts"], result, progress)
+    finally:
+        wb.close()
+    return result
@@ -0,0 +1,216 @@
+import math
+import logging
+import calendar
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .config import INSIGHTS_HISTORY_MONTHS, INSIGHTS_BASELINE_MONTHS, INSIGHTS_Z, INSIGHTS_CACHE_SIZE, INSIGHTS_CACHE_TTL
+from .models import MonthlyStat, Category
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# A user's monthly_stats history as a months x categories expense matrix plus an income vector,
+# loaded in one query; every figure below is array arithmetic over it. numpy is imported where it's
+# used so workers that never serve /stats/ai_analysis don't pay for it at boot.
+
+# fewer baseline months than this and there is no "usual" to compare against
+MIN_BASELINE = 3
+TREND_MONTHS = 12
+TOP = 5
+
+_cache = TTLCache(maxsize=INSIGHTS_CACHE_SIZE, ttl=INSIGHTS_CACHE_TTL)
+
+def parse_period(period: str = None) -> str:
+    try:
+        y, m = (period or datetime.utcnow().strftime("%Y-%m")).split("-")[:2]
+        if not 1 <= int(m) <= 12:
+            raise ValueError(period)
+        return f"{int(y)}-{int(m):02d}"
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid period: {period}")
+
+def _index(month: str) -> int:
+    return int(month[:4]) * 12 + int(month[5:7]) - 1
+
+def _label(index: int) -> str:
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+class History:
+    def __init__(self, months: list, category_ids: "np.ndarray", names: list, expense: "np.ndarray", income: "np.ndarray"):
+        self.months = months
+        self.category_ids = category_ids
+        self.names = names
+        self.expense = expense
+        self.income = income
+
+def _labels(period: str, months: int = INSIGHTS_HISTORY_MONTHS) -> list:
+    end = _index(period)
+    return [_label(i) for i in range(end - months, end + 1)]
+
+def _history_select(user_id: int, labels: list):
+    # outer join: a deleted category's spending still counts towards the totals
+    return select(MonthlyStat.stat_month, MonthlyStat.transaction_type, MonthlyStat.category_id, Category.category_name, MonthlyStat.total_amount).outerjoin(Category, MonthlyStat.category_id == Category.category_id).where(MonthlyStat.user_id == user_id, MonthlyStat.stat_month >= labels[0], MonthlyStat.stat_month <= labels[-1])
+
+def load(db: Session, user_id: int, period: str, months: int = INSIGHTS_HISTORY_MONTHS) -> History:
+    """The `months` months before period plus period itself."""
+    labels = _labels(period, months)
+    return _history(labels, db.execute(_history_select(user_id, labels)).all())
+
+def _history(labels: list, rows: list) -> History:
+    import numpy as np
+    if not rows:
+        return History(labels, np.zeros(0, dtype=np.int64), [], np.zeros((len(labels), 0)), np.zeros(len(labels)))
+    month_col, type_col, cat_col, name_col, amount_col = zip(*rows)
+    m = np.searchsorted(np.array(labels), np.array(month_col))
+    amount = np.array(amount_col, dtype=float)
+    cats = np.array(cat_col, dtype=np.int64)
+    spent = np.array(type_col) == "EXPENSE"
+    category_ids, c = np.unique(cats[spent], return_inverse=True)
+    expense = np.zeros((len(labels), len(category_ids)))
+    np.add.at(expense, (m[spent], c), amount[spent])
+    income = np.bincount(m[~spent], weights=amount[~spent], minlength=len(labels))
+    names = dict(zip(cat_col, name_col))
+    return History(labels, category_ids, [names[i] or "未分类" for i in category_ids.tolist()], expense, income)
+
+def _change(now, then):
+    import numpy as np
+    now, then = np.asarray(now, dtype=float), np.asarray(then, dtype=float)
+    return np.divide(now - then, then, out=np.full(np.broadcast(now, then).shape, np.nan), where=then > 0)
+
+def _rolling(values: "np.ndarray", window: int) -> "np.ndarray":
+    import numpy as np
+    # mean of the window ending at each month; NaN until a full window exists
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    out = np.full(len(values), np.nan)
+    out[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return out
+
+def _num(value, digits: int = 2):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, digits)
+
+def analyze(h: History, elapsed: float = 1.0, baseline: int = INSIGHTS_BASELINE_MONTHS, z_limit: float = INSIGHTS_Z) -> dict:
+    """Insights for the last month of h; elapsed < 1 scales full past months to the part of it gone so far."""
+    import numpy as np
+    E, income = h.expense, h.income
+    n_months = len(h.months)
+    total = E.sum(axis=1)
+    cur, now = E[-1], total[-1]
+    # months before the user's first activity are not part of their baseline
+    active = np.flatnonzero(total + income > 0)
+    first = int(active[0]) if active.size else n_months - 1
+    lo = max(first, n_months - 1 - baseline)
+    base = E[lo:n_months - 1]
+    n_base = base.shape[0]
+
+    mom = _change(now, total[-2] * elapsed) if first <= n_months - 2 else np.nan
+    yoy = _change(now, total[-13] * elapsed) if n_months >= 13 and first <= n_months - 13 else np.nan
+    category_mom = _change(cur, E[-2] * elapsed) if n_months >= 2 else np.full(len(cur), np.nan)
+
+    mean = base.mean(axis=0) * elapsed if n_base else np.zeros_like(cur)
+    std = base.std(axis=0) * elapsed if n_base else np.zeros_like(cur)
+    z = np.divide(cur - mean, std, out=np.zeros_like(cur), where=std > 0)
+    flagged = np.flatnonzero(np.abs(z) >= z_limit) if n_base >= MIN_BASELINE else np.zeros(0, dtype=int)
+    flagged = flagged[np.argsort(-np.abs(z[flagged]), kind="stable")]
+
+    base_sum = base.sum()
+    share_now = cur / now if now > 0 else np.zeros_like(cur)
+    share_base = base.sum(axis=0) / base_sum if base_sum > 0 else np.zeros_like(cur)
+    drift = share_now - share_base
+    drifted = np.flatnonzero((share_now > 0) | (share_base > 0)) if now > 0 and base_sum > 0 else np.zeros(0, dtype=int)
+    drifted = drifted[np.argsort(-np.abs(drift[drifted]), kind="stable")][:TOP]
+
+    usual = total[lo:n_months - 1].mean() * elapsed if n_base else 0.0
+    ratio = now / usual if usual > 0 else np.nan
+    if n_base >= MIN_BASELINE and usual > 0:
+        # 80 at the user's usual pace, 100 at half of it, 0 at three times it
+        score = int(np.clip(round(80 - 40 * (ratio - 1)), 0, 100))
+    else:
+        score = 100 if now == 0 else 80
+
+    trend_from = max(0, n_months - TREND_MONTHS)
+    mean3, mean6 = _rolling(total, 3), _rolling(total, 6)
+    top = np.argsort(-cur, kind="stable")[:TOP]
+    top = top[cur[top] > 0]
+    return {
+        "period": h.months[-1],
+        "expense_total": _num(now),
+        "income_total": _num(income[-1]),
+        "baseline_months": n_base,
+        "baseline_expense": _num(usual),
+        "pace_ratio": _num(ratio, 4),
+        "mom_change": _num(mom, 4),
+        "yoy_change": _num(yoy, 4),
+        "score": score,
+        "top_categories": [{"category": h.names[i], "amount": _num(cur[i]), "share": _num(share_now[i], 4), "mom_change": _num(category_mom[i], 4)} for i in top],
+        "anomalies": [{"category": h.names[i], "amount": _num(cur[i]), "baseline_mean": _num(mean[i]), "z_score": _num(z[i], 2)} for i in flagged],
+        "share_drift": [{"category": h.names[i], "share": _num(share_now[i], 4), "baseline_share": _num(share_base[i], 4), "drift": _num(drift[i], 4)} for i in drifted],
+        "trend": [{"month": h.months[i], "expense": _num(total[i]), "income": _num(income[i]), "mean_3": _num(mean3[i]), "mean_6": _num(mean6[i])} for i in range(trend_from, n_months)],
+    }
+
+def advice(result: dict) -> str:
+    higher = [a for a in result["anomalies"] if a["z_score"] > 0]
+    if higher:
+        a = higher[0]
+        return f"本月{a['category']}支出{a['amount']:.0f}元，明显高于平时（约{a['baseline_mean']:.0f}元），建议留意。"
+    if result["share_drift"] and result["share_drift"][0]["drift"] >= 0.1:
+        d = result["share_drift"][0]
+        return f"{d['category']}占本月支出的{d['share'] * 100:.0f}%，比平时高{d['drift'] * 100:.0f}个百分点。"
+    if result["pace_ratio"] is not None and result["pace_ratio"] > 1.2:
+        return "本月支出高于你的平均水平，建议适当控制。"
+    if result["top_categories"] and result["baseline_months"] < MIN_BASELINE:
+        return f"本月在{result['top_categories'][0]['category']}的支出最高，建议适当控制。"
+    return "本月支出较少，保持良好习惯。" if not result["expense_total"] else "本月支出与平时基本持平，保持良好习惯。"
+
+def _elapsed(period: str, today=None) -> float:
+    # share of the period gone by: the current month is compared at the pace so far
+    today = today or datetime.utcnow().date()
+    if period != today.strftime("%Y-%m"):
+        return 1.0
+    return today.day / calendar.monthrange(today.year, today.month)[1]
+
+def _key(user_id: int, period: str, elapsed: float):
+    try:
+        # the version token changes on every transaction or category write, so stale entries are never hit
+        return user_id, period, elapsed, versions.token(user_id, ["transactions", "categories"])
+    except Exception:
+        logger.exception("version lookup failed for user %s", user_id)
+        return None
+
+def _result(labels: list, rows: list, elapsed: float) -> dict:
+    result = analyze(_history(labels, rows), elapsed)
+    result["advice_text"] = advice(result)
+    return result
+
+def insights(db: Session, user_id: int, period: str = None) -> dict:
+    period = parse_period(period)
+    elapsed = _elapsed(period)
+    key = _key(user_id, period, elapsed)
+    result = _cache.get(key) if key else None
+    if result is None:
+        labels = _labels(period)
+        result = _result(labels, db.execute(_history_select(user_id, labels)).all(), elapsed)
+        if key:
+            _cache.set(key, result)
+    return result
+
+async def insights_async(db, user_id: int, period: str = None) -> dict:
+    """insights() on an AsyncSession; the array work runs on the threadpool, off the event loop."""
+    period = parse_period(period)
+    elapsed = _elapsed(period)
+    key = await versions.off_loop(_key, user_id, period, elapsed)
+    result = _cache.get(key) if key else None
+    if result is None:
+        labels = _labels(period)
+        rows = (await db.execute(_history_select(user_id, labels))).all()
+        result = await run_in_threadpool(_result, labels, rows, elapsed)
+        if key:
+            _cache.set(key, result)
+    return result
+
+def cache_stats() -> dict:
+    return _cache.stats()
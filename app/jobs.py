@@ -0,0 +1,252 @@
+import os
+import glob
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update, or_
+from .config import JOB_WORKERS, JOB_DIR, JOB_STALE_SECONDS, JOB_HEARTBEAT_SECONDS, JOB_EXPORT_RETENTION_HOURS
+from .database import SessionLocal, engine
+from .models import Job
+from . import rollup, exporter, importer, balances, versions
+from .pagination import invalidate_counts
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+_live_progress = {}
+# jobs running in this process; the heartbeat keeps their updated_at fresh so no other worker requeues them
+_running = set()
+_heartbeat = None
+_stop = threading.Event()
+PURGE_SECONDS = 3600
+
+HANDLERS = {}
+
+def handler(kind: str):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+def _session():
+    return SessionLocal.session_factory()
+
+def _set(job_id: int, **values):
+    db = _session()
+    try:
+        db.execute(update(Job).where(Job.job_id == job_id).values(updated_at=datetime.utcnow(), **values))
+        db.commit()
+    finally:
+        db.close()
+
+def _progress(job_id: int, n: int):
+    _live_progress[job_id] = n
+    # SQLite has a single writer; the job's own transaction would block this update
+    if engine.dialect.name != "sqlite":
+        _set(job_id, progress=n)
+
+def after_commit(db, fn):
+    """Run fn once the job's writes and its SUCCEEDED status have committed together."""
+    db.info.setdefault("after_commit", []).append(fn)
+
+def _discard(job_id: int):
+    # a failed job keeps neither its upload nor a partial export
+    for path in glob.glob(os.path.join(JOB_DIR, f"job_{job_id}.*")):
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning("could not remove %s", path)
+
+def job_path(job_id: int, suffix: str) -> str:
+    os.makedirs(JOB_DIR, exist_ok=True)
+    return os.path.join(JOB_DIR, f"job_{job_id}.{suffix}")
+
+def to_dict(job: Job) -> dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": max(job.progress or 0, _live_progress.get(job.job_id, 0)),
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+def create(db, user_id, kind: str, params: dict = None, upload=None, suffix: str = None) -> Job:
+    if kind not in HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    job = Job(user_id=user_id, kind=kind, status="PENDING", progress=0, params=json.dumps(params or {}))
+    db.add(job)
+    db.flush()
+    if upload is not None:
+        # keep the input on disk so the job survives a restart
+        job.file_path = job_path(job.job_id, suffix or "in")
+        with open(job.file_path, "wb") as f:
+            shutil.copyfileobj(upload, f)
+    db.commit()
+    _submit(job.job_id)
+    return job
+
+def _claim(job_id: int) -> bool:
+    db = _session()
+    try:
+        now = datetime.utcnow()
+        res = db.execute(update(Job).where(Job.job_id == job_id, Job.status == "PENDING").values(status="RUNNING", started_at=now, updated_at=now))
+        db.commit()
+        return res.rowcount == 1
+    finally:
+        db.close()
+
+def run(job_id: int):
+    if not _claim(job_id):
+        return
+    _running.add(job_id)
+    db = _session()
+    try:
+        job = db.get(Job, job_id)
+        params = json.loads(job.params or "{}")
+        result = HANDLERS[job.kind](db, job, params, lambda n: _progress(job_id, n))
+        # same transaction as the handler's writes: a crash before this commit undoes both and the job
+        # re-runs from scratch, one after it leaves a SUCCEEDED job that is never run again
+        now = datetime.utcnow()
+        db.execute(update(Job).where(Job.job_id == job_id).values(
+            status="SUCCEEDED", progress=_live_progress.get(job_id, 0), result=json.dumps(result or {}, ensure_ascii=False, default=str),
+            file_path=job.file_path, finished_at=now, updated_at=now,
+        ))
+        callbacks = db.info.pop("after_commit", [])
+        db.commit()
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                logger.exception("job %s: post-commit step failed", job_id)
+    except Exception as e:
+        db.rollback()
+        logger.exception("job %s failed", job_id)
+        _discard(job_id)
+        _set(job_id, status="FAILED", error=str(e)[:2000], file_path=None, finished_at=datetime.utcnow())
+    finally:
+        db.close()
+        _running.discard(job_id)
+        _live_progress.pop(job_id, None)
+
+def _beat():
+    ids = list(_running)
+    if not ids:
+        return
+    # on SQLite this waits behind a job holding the write lock and may time out; the next beat retries
+    db = _session()
+    try:
+        db.execute(update(Job).where(Job.job_id.in_(ids), Job.status == "RUNNING").values(updated_at=datetime.utcnow()))
+        db.commit()
+    finally:
+        db.close()
+
+def purge_exports(now: datetime = None) -> int:
+    """Delete export files older than JOB_EXPORT_RETENTION_HOURS; their jobs stay listed as expired."""
+    expired = (now or datetime.utcnow()) - timedelta(hours=JOB_EXPORT_RETENTION_HOURS)
+    db = _session()
+    try:
+        rows = db.query(Job.job_id, Job.file_path).filter(Job.status == "SUCCEEDED", Job.kind == "export", Job.file_path.isnot(None), Job.finished_at < expired).all()
+        for _, path in rows:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if rows:
+            db.execute(update(Job).where(Job.job_id.in_([job_id for job_id, _ in rows])).values(file_path=None))
+            db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+def _heartbeat_loop():
+    purged = 0.0
+    while not _stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            _beat()
+        except Exception as e:
+            logger.warning("job heartbeat failed: %s", e)
+        if time.monotonic() - purged >= PURGE_SECONDS:
+            try:
+                logger.info("purged %s expired export files", purge_exports())
+            except Exception:
+                logger.exception("export purge failed")
+            purged = time.monotonic()
+
+def _submit(job_id: int):
+    global _executor, _heartbeat
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        if _heartbeat is None:
+            _stop.clear()
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True)
+            _heartbeat.start()
+        _executor.submit(run, job_id)
+
+def start():
+    # requeue jobs left behind by a previous process
+    db = _session()
+    try:
+        stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        db.execute(update(Job).where(Job.status == "RUNNING", or_(Job.updated_at.is_(None), Job.updated_at < stale)).values(status="PENDING"))
+        db.commit()
+        pending = [job_id for (job_id,) in db.query(Job.job_id).filter(Job.status == "PENDING").order_by(Job.job_id)]
+    finally:
+        db.close()
+    for job_id in pending:
+        _submit(job_id)
+    return len(pending)
+
+def shutdown():
+    global _executor, _heartbeat
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _heartbeat is not None:
+            _stop.set()
+            _heartbeat.join(timeout=5)
+            _heartbeat = None
+
+@handler("import")
+def _run_import(db, job, params, progress):
+    with open(job.file_path, "rb") as f:
+        result = importer.import_workbook(db, job.user_id, f, progress=lambda r: progress(r.transactions + r.debts))
+    path = job.file_path
+    job.file_path = None
+    after_commit(db, lambda: invalidate_counts(job.user_id))
+    after_commit(db, lambda: versions.bump(job.user_id, "transactions", "debts", "accounts"))
+    after_commit(db, lambda: os.remove(path))
+    return result.as_dict()
+
+@handler("export")
+def _run_export(db, job, params, progress):
+    fmt = params.get("format", "xlsx")
+    sheet = params.get("sheet", "transactions")
+    path = job_path(job.job_id, fmt)
+    size = 0
+    with open(path, "wb") as f:
+        for chunk in exporter.stream(job.user_id, fmt, sheet):
+            f.write(chunk)
+            size += len(chunk)
+    job.file_path = path
+    return {"format": fmt, "sheet": sheet, "size": size}
+
+@handler("rebuild_rollup")
+def _run_rebuild_rollup(db, job, params, progress):
+    rows = rollup.rebuild(db, job.user_id)
+    after_commit(db, lambda: versions.bump(job.user_id, "transactions"))
+    return {"rows": rows}
+
+@handler("reconcile_balances")
+def _run_reconcile_balances(db, job, params, progress):
+    return balances.reconcile(job.user_id, fix=params.get("fix", True))
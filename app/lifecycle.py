@@ -0,0 +1,70 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+from sqlalchemy import text
+from .config import MIGRATE_ON_STARTUP, POOL_WARMUP, STARTUP_RETRY_SECONDS
+from .database import engine, replicas
+from . import migrations, scheduler, jobs, hashing
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_stop = threading.Event()
+_state = {"status": "starting", "error": None}
+
+def warm(engine, n: int) -> int:
+    """Open n pooled connections up front; they go back to the pool idle."""
+    conns = []
+    try:
+        for _ in range(n):
+            conns.append(engine.connect())
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+def _prepare():
+    # everything that needs the database; retried so a worker that boots while
+    # the database is away starts serving once it is back
+    while not _stop.is_set():
+        try:
+            todo = migrations.pending(engine)
+            if todo:
+                _state.update(status="waiting for migrations", error=", ".join(f"{v} {name}" for v, name in todo))
+            else:
+                warm(engine, POOL_WARMUP)
+                hashing.pool.warm()
+                jobs.start()
+                _state.update(status="ready", error=None)
+                _ready.set()
+                return
+        except Exception as e:
+            logger.warning("startup: database not usable yet: %s", e)
+            _state.update(status="database unavailable", error=str(e).splitlines()[0][:200])
+        _stop.wait(STARTUP_RETRY_SECONDS)
+
+def readiness():
+    """(ok, detail) for the readiness probe."""
+    if not _ready.is_set():
+        return False, dict(_state)
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return False, {"status": "database unavailable", "error": str(e).splitlines()[0][:200]}
+    return True, {"status": "ready", "replicas": sum(r.healthy for r in replicas.replicas)}
+
+@asynccontextmanager
+async def lifespan(app):
+    if MIGRATE_ON_STARTUP:
+        migrations.run(engine)
+    _stop.clear()
+    threading.Thread(target=_prepare, name="startup", daemon=True).start()
+    replicas.start()
+    scheduler.start()
+    yield
+    _stop.set()
+    scheduler.shutdown()
+    jobs.shutdown()
+    hashing.pool.shutdown()
+    replicas.shutdown()
@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .config import API_PREFIX
-from .models import Base
-from .database import engine
-from .routers import auth, accounts, transactions, debts, reminders, categories, dashboard, stats, export_import
+from .config import API_PREFIX, DB_ASYNC, METRICS_ENABLED
+from .database import engine, replicas
+from . import metrics, lifecycle, hashing
+from .deps import principal_cache, require_internal
+from .routers import auth, accounts, transactions, debts, reminders, categories, dashboard, stats, export_import, jobs, bootstrap
 
-app = FastAPI(title="MeloonMoney API", version="1.0")
+# schema work, pool warmup and background threads live in the lifespan, not at import
+app = FastAPI(title="MeloonMoney API", version="1.0", lifespan=lifecycle.lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,23 +18,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# create tables if not exist (will not drop)
-Base.metadata.create_all(bind=engine)
-
 api = FastAPI()
 
+if DB_ASYNC:
+    from .routers.asyncify import asyncify as wire
+else:
+    def wire(router):
+        return router
+
+# waits on the password hashing pool, which would block the event loop under DB_ASYNC
 api.include_router(auth.router)
-api.include_router(dashboard.router)
-api.include_router(accounts.router)
-api.include_router(categories.router)
-api.include_router(transactions.router)
-api.include_router(debts.router)
-api.include_router(stats.router)
+api.include_router(wire(dashboard.router))
+api.include_router(wire(accounts.router))
+api.include_router(wire(categories.router))
+api.include_router(wire(transactions.router))
+api.include_router(wire(debts.router))
+api.include_router(wire(stats.router))
+# file upload/download stays on the sync stack: openpyxl is CPU bound
 api.include_router(export_import.router)
-api.include_router(reminders.router)
+api.include_router(jobs.router)
+api.include_router(wire(bootstrap.router))
+api.include_router(wire(reminders.router))
 
 app.mount(API_PREFIX, api)
 
+if METRICS_ENABLED:
+    engines = {"sync": engine}
+    engines.update((r.name, r.engine) for r in replicas.replicas)
+    if DB_ASYNC:
+        from .async_database import async_engine, replica_engines
+        engines["async"] = async_engine.sync_engine
+        engines.update((f"{name}-async", e.sync_engine) for name, e in replica_engines.items())
+    metrics.install(app, engines)
+
 @app.get("/")
 def root():
     return {"service": "MeloonMoney", "version": "1.0"}
+
+@app.get("/ready")
+def ready():
+    ok, detail = lifecycle.readiness()
+    return JSONResponse(detail, status_code=200 if ok else 503)
+
+@app.get("/internal/cache_stats", dependencies=[Depends(require_internal)])
+def cache_stats():
+    from . import insights
+    return {"auth": principal_cache.stats(), "hashing": hashing.pool.stats(), "insights": insights.cache_stats()}
+
+@app.get("/internal/replicas", dependencies=[Depends(require_internal)])
+def replica_status():
+    return {"replicas": replicas.status()}
@@ -0,0 +1,210 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.responses import Response
+from .config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("app.metrics.slow")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(v: float) -> str:
+    return "+Inf" if v == float("inf") else repr(float(v)) if isinstance(v, float) else str(v)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {_fmt(v)}" for k, v in items]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # per label set: [count per bucket..., +Inf bucket], sum
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            item[0][i] += 1
+            item[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(counts), total)) for k, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="' + _fmt(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {running}")
+        return lines
+
+requests_total = Counter("meloon_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+request_seconds = Histogram("meloon_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+request_queries = Histogram("meloon_http_request_queries", "SQL statements issued per request.", ("method", "route"), COUNT_BUCKETS)
+request_db_seconds = Histogram("meloon_http_request_db_seconds", "Time spent in SQL per request.", ("method", "route"))
+query_seconds = Histogram("meloon_db_query_seconds", "SQL statement latency.", ("engine",))
+slow_queries = Counter("meloon_db_slow_queries_total", f"SQL statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS} ms).", ("engine", "route"))
+checkout_seconds = Histogram("meloon_db_pool_checkout_seconds", "Time to get a connection from the pool, including connects and pings.", ("engine",))
+
+METRICS = (requests_total, request_seconds, request_queries, request_db_seconds, query_seconds, slow_queries, checkout_seconds)
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        return route_of(self.scope)
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("meloon_request_stats", default=None)
+
+def route_of(scope) -> str:
+    # the path template, not the raw path, so ids don't explode the label set
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    return scope.get("root_path", "") + getattr(route, "path_format", route.path)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            method, route = scope["method"], route_of(scope)
+            requests_total.inc(method, route, str(status))
+            request_seconds.observe(elapsed, method, route)
+            request_queries.observe(stats.queries, method, route)
+            request_db_seconds.observe(stats.db_seconds, method, route)
+
+_engines = {}
+
+def instrument_engine(engine, name: str):
+    """Time every statement and pool checkout on engine."""
+    _engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+        query_seconds.observe(elapsed, name)
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            route = stats.route if stats is not None else "-"
+            slow_queries.inc(name, route)
+            slow_logger.warning("slow query %.1f ms on %s [%s]: %s", elapsed * 1000, name, route, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        starts = ctx.connection.info.get("metrics_start") if ctx.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # the pool has no "before checkout" event, so time the call the engine makes
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            checkout_seconds.observe(time.perf_counter() - start, name)
+
+    pool.connect = timed_connect
+
+def _pool_lines() -> list:
+    gauges = {
+        "meloon_db_pool_size": ("Configured pool size.", "size"),
+        "meloon_db_pool_checked_out": ("Connections currently in use.", "checkedout"),
+        "meloon_db_pool_checked_in": ("Idle connections held by the pool.", "checkedin"),
+        "meloon_db_pool_overflow": ("Connections opened beyond the pool size.", "overflow"),
+    }
+    lines = []
+    for metric, (help, attr) in gauges.items():
+        # QueuePool reports overflow as negative while below pool_size
+        rows = [(name, max(0, getattr(engine.pool, attr)())) for name, engine in sorted(_engines.items()) if hasattr(engine.pool, attr)]
+        if rows:
+            lines += [f"# HELP {metric} {help}", f"# TYPE {metric} gauge"]
+            lines += [f'{metric}{{engine="{name}"}} {value}' for name, value in rows]
+    return lines
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _pool_lines()
+    return "\n".join(lines) + "\n"
+
+def metrics_endpoint(request):
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def install(app, engines: dict):
+    """Wire metrics into app; nothing here runs when METRICS_ENABLED is off."""
+    for name, engine in engines.items():
+        instrument_engine(engine, name)
+    app.add_middleware(MetricsMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
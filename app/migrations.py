@@ -0,0 +1,164 @@
+from datetime import datetime
+from contextlib import contextmanager
+from sqlalchemy import MetaData, Table, Column, Integer, String, TIMESTAMP, bindparam, inspect, or_, select, text, update
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.sql import func
+from .models import Base, Account, Transaction, Reminder
+from . import snapshots, search, scheduler, debt_ledger
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", TIMESTAMP, server_default=func.current_timestamp()),
+)
+
+# every step must be idempotent: a fresh database gets the current models
+# from step 1, so later steps only fill in what an older database lacks
+
+def create_tables(*names):
+    def step(conn: Connection):
+        Base.metadata.create_all(conn, tables=[Base.metadata.tables[n] for n in names], checkfirst=True)
+    return step
+
+def create_indexes(*names):
+    def step(conn: Connection):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+    return step
+
+def add_column(table: str, column: str, ddl: str):
+    def step(conn: Connection):
+        if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return step
+
+def steps(*fns):
+    def step(conn: Connection):
+        for fn in fns:
+            fn(conn)
+    return step
+
+def backfill_balance_snapshots(conn: Connection):
+    # existing balances are taken as correct; the opening balance is what they imply
+    total = select(func.coalesce(func.sum(snapshots.signed_amount_expr()), 0)).where(Transaction.account_id == Account.account_id).scalar_subquery()
+    conn.execute(update(Account).values(opening_balance=Account.balance - total))
+    snapshots.rebuild(conn)
+
+def _schedule_active_reminders(conn: Connection, *where):
+    # each active reminder repeats from its starts_on, or from the day it was created
+    now = datetime.utcnow()
+    stmt = update(Reminder).where(Reminder.reminder_id == bindparam("rid")).values(starts_on=bindparam("day"), next_fire_at=bindparam("fire"))
+    after = 0
+    while True:
+        rows = conn.execute(
+            select(Reminder.reminder_id, Reminder.reminder_time, Reminder.frequency, Reminder.starts_on, Reminder.created_at)
+            .where(Reminder.reminder_id > after, or_(Reminder.is_active.is_(None), Reminder.is_active != 0), *where)
+            .order_by(Reminder.reminder_id)
+            .limit(snapshots.CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        params = []
+        for rid, at, frequency, starts_on, created in rows:
+            day = starts_on or (created or now).date()
+            params.append({"rid": rid, "day": day, "fire": scheduler.first_fire(at, frequency, day, now)})
+        conn.execute(stmt, params)
+        after = rows[-1][0]
+
+def backfill_reminder_schedule(conn: Connection):
+    _schedule_active_reminders(conn)
+
+def reminder_schedule_utc(conn: Connection):
+    # fired ONCE reminders used to stay active with no next firing
+    conn.execute(update(Reminder).where(Reminder.frequency == "ONCE", Reminder.next_fire_at.is_(None), or_(Reminder.is_active.is_(None), Reminder.is_active != 0)).values(is_active=0))
+    # next_fire_at was computed on the server's local clock; recompute it in UTC
+    _schedule_active_reminders(conn, Reminder.next_fire_at.isnot(None))
+
+MIGRATIONS = [
+    (1, "initial schema", create_tables("users", "accounts", "categories", "transactions", "debts", "reminders")),
+    (2, "monthly_stats rollup", create_tables("monthly_stats")),
+    (3, "hot query indexes", create_indexes(
+        "ix_accounts_user_name",
+        "ix_categories_user_name",
+        "ix_transactions_user_time",
+        "ix_transactions_user_type_time",
+        "ix_transactions_user_account_time",
+        "ix_debts_user_time",
+        "ix_debts_user_type_time",
+        "ix_reminders_user",
+    )),
+    (4, "background jobs", create_tables("jobs")),
+    (5, "balance snapshots", steps(
+        add_column("accounts", "opening_balance", "DECIMAL(15, 2) NOT NULL DEFAULT 0"),
+        create_tables("balance_snapshots"),
+        backfill_balance_snapshots,
+    )),
+    (6, "transaction search index", search.rebuild),
+    (7, "reminder schedule", steps(
+        add_column("reminders", "starts_on", "DATE"),
+        add_column("reminders", "next_fire_at", "DATETIME"),
+        create_indexes("ix_reminders_next_fire"),
+        backfill_reminder_schedule,
+    )),
+    (8, "transactions archive", steps(
+        create_tables("transactions_archive", "archive_state"),
+        search.index_archive,
+    )),
+    (9, "debt ledger", steps(
+        create_tables("debt_ledger", "debt_totals"),
+        create_indexes("ix_debts_user_person_time"),
+        debt_ledger.rebuild,
+    )),
+    (10, "reminder schedule in UTC", reminder_schedule_utc),
+]
+
+@contextmanager
+def _lock(engine: Engine):
+    # serialise workers that boot at the same time
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT GET_LOCK('meloon_migrations', 60)"))
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('meloon_migrations')"))
+
+def applied_versions(engine: Engine) -> set:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return set()
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+def pending(engine: Engine) -> list:
+    done = applied_versions(engine)
+    return [(v, name) for v, name, _ in MIGRATIONS if v not in done]
+
+def run(engine: Engine) -> list:
+    applied = []
+    with _lock(engine):
+        schema_migrations.create(engine, checkfirst=True)
+        done = applied_versions(engine)
+        for version, name, step in MIGRATIONS:
+            if version in done:
+                continue
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(schema_migrations.insert().values(version=version, name=name))
+            applied.append((version, name))
+    return applied
+
+if __name__ == "__main__":
+    import sys
+    from .database import engine
+    if sys.argv[1:] == ["status"]:
+        for version, name in pending(engine):
+            print(f"pending {version:>4} {name}")
+    else:
+        for version, name in run(engine):
+            print(f"applied {version:>4} {name}")
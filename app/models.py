@@ -1,12 +1,15 @@
-from sqlalchemy import Column, BigInteger, String, Enum, DECIMAL, DateTime, Text, TIMESTAMP, ForeignKey, TIME, Integer, Boolean
+from sqlalchemy import Column, BigInteger, String, Enum, DECIMAL, Date, DateTime, Text, TIMESTAMP, ForeignKey, TIME, Integer, Boolean, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
 
 Base = declarative_base()
 
+# SQLite only auto-increments INTEGER PRIMARY KEY
+BigIntPK = BigInteger().with_variant(Integer, "sqlite")
+
 class User(Base):
     __tablename__ = "users"
-    user_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     email = Column(String(255), nullable=False, unique=True)
     password_hash = Column(String(255), nullable=False)
     nickname = Column(String(50), default="蜜瓜用户")
@@ -19,19 +22,25 @@ class User(Base):
 
 class Account(Base):
     __tablename__ = "accounts"
-    account_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    account_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     account_name = Column(String(50), nullable=False)
     account_type = Column(String(20), nullable=False)
     balance = Column(DECIMAL(15, 2), default=0)
+    # balance before any transaction; balance == opening_balance + sum(signed amounts)
+    opening_balance = Column(DECIMAL(15, 2), nullable=False, default=0, server_default="0")
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
     user = relationship("User", back_populates="accounts")
 
+    __table_args__ = (
+        Index("ix_accounts_user_name", "user_id", "account_name"),
+    )
+
 class Category(Base):
     __tablename__ = "categories"
-    category_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    category_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     category_name = Column(String(50), nullable=False)
     category_type = Column(Enum("EXPENSE", "INCOME"), nullable=False)
@@ -39,9 +48,13 @@ class Category(Base):
     is_system = Column(Integer, default=0)
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
 
+    __table_args__ = (
+        Index("ix_categories_user_name", "user_id", "category_name"),
+    )
+
 class Transaction(Base):
     __tablename__ = "transactions"
-    transaction_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    transaction_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     account_id = Column(BigInteger, ForeignKey("accounts.account_id", ondelete="RESTRICT"), nullable=False)
     category_id = Column(BigInteger, ForeignKey("categories.category_id", ondelete="RESTRICT"), nullable=False)
@@ -57,9 +70,43 @@ class Transaction(Base):
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
+    __table_args__ = (
+        Index("ix_transactions_user_time", "user_id", "transaction_time", "transaction_id"),
+        Index("ix_transactions_user_type_time", "user_id", "transaction_type", "transaction_time", "category_id", "amount"),
+        Index("ix_transactions_user_account_time", "user_id", "account_id", "transaction_time"),
+        # ids must never be reused once rows move to the archive; MySQL 8 keeps its counter anyway
+        {"sqlite_autoincrement": True},
+    )
+
+class ArchivedTransaction(Base):
+    # cold tier for transactions older than archive.cutoff(); same ids, no timestamps, one index
+    __tablename__ = "transactions_archive"
+    transaction_id = Column(BigIntPK, primary_key=True, autoincrement=False)
+    user_id = Column(BigInteger, nullable=False)
+    account_id = Column(BigInteger, nullable=False)
+    category_id = Column(BigInteger, nullable=False)
+    amount = Column(DECIMAL(15, 2), nullable=False)
+    transaction_type = Column(Enum("EXPENSE", "INCOME"), nullable=False)
+    transaction_time = Column(DateTime, nullable=False)
+    target_person = Column(String(50))
+    summary = Column(String(100))
+    note = Column(Text)
+
+    __table_args__ = (
+        Index("ix_transactions_archive_user_time", "user_id", "transaction_time", "transaction_id"),
+        {"mysql_row_format": "COMPRESSED"},
+    )
+
+class ArchiveState(Base):
+    # single row: transactions before cutoff belong in transactions_archive
+    __tablename__ = "archive_state"
+    state_id = Column(Integer, primary_key=True, autoincrement=False)
+    cutoff = Column(DateTime)
+    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
 class Debt(Base):
     __tablename__ = "debts"
-    debt_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    debt_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     debt_type = Column(Enum("BORROW", "LEND"), nullable=False)
     person_name = Column(String(50), nullable=False)
@@ -69,14 +116,85 @@ class Debt(Base):
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
 
+    __table_args__ = (
+        Index("ix_debts_user_time", "user_id", "action_time", "debt_id"),
+        Index("ix_debts_user_type_time", "user_id", "debt_type", "action_time", "amount"),
+        Index("ix_debts_user_person_time", "user_id", "person_name", "action_time", "debt_id"),
+    )
+
+class DebtLedger(Base):
+    # running totals per counterparty, maintained by debt_ledger.record_many
+    __tablename__ = "debt_ledger"
+    user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    person_name = Column(String(50), primary_key=True)
+    borrowed = Column(DECIMAL(18, 2), nullable=False, default=0)
+    lent = Column(DECIMAL(18, 2), nullable=False, default=0)
+    debt_count = Column(Integer, nullable=False, default=0)
+
+class DebtTotal(Base):
+    # the same totals over all of a user's counterparties, so /debts/summary is one row
+    __tablename__ = "debt_totals"
+    user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    borrowed = Column(DECIMAL(18, 2), nullable=False, default=0)
+    lent = Column(DECIMAL(18, 2), nullable=False, default=0)
+    debt_count = Column(Integer, nullable=False, default=0)
+
 class Reminder(Base):
     __tablename__ = "reminders"
-    reminder_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    reminder_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
     event_name = Column(String(100), nullable=False)
     reminder_time = Column(TIME, nullable=False)
     frequency = Column(Enum("ONCE", "DAILY", "WEEKLY", "MONTHLY"), nullable=False, server_default="ONCE")
     note = Column(String(255))
     is_active = Column(Integer, default=1)
+    # WEEKLY/MONTHLY repeat on this date's weekday/day of month
+    starts_on = Column(Date)
+    # NULL once inactive or fired for the last time; maintained by scheduler.reschedule
+    next_fire_at = Column(DateTime)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    __table_args__ = (
+        Index("ix_reminders_user", "user_id", "reminder_id"),
+        Index("ix_reminders_next_fire", "next_fire_at", "reminder_id"),
+    )
+
+class MonthlyStat(Base):
+    __tablename__ = "monthly_stats"
+    user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    stat_month = Column(String(7), primary_key=True)
+    transaction_type = Column(Enum("EXPENSE", "INCOME"), primary_key=True)
+    category_id = Column(BigInteger, primary_key=True)
+    total_amount = Column(DECIMAL(18, 2), nullable=False, default=0)
+    trx_count = Column(Integer, nullable=False, default=0)
+
+class BalanceSnapshot(Base):
+    # one row per account per day with activity; closing_balance is the balance at end of day
+    __tablename__ = "balance_snapshots"
+    account_id = Column(BigInteger, ForeignKey("accounts.account_id", ondelete="CASCADE"), primary_key=True)
+    snap_date = Column(Date, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"), nullable=False)
+    net_change = Column(DECIMAL(18, 2), nullable=False, default=0)
+    closing_balance = Column(DECIMAL(18, 2), nullable=False, default=0)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    job_id = Column(BigIntPK, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.user_id", ondelete="CASCADE"))
+    kind = Column(String(30), nullable=False)
+    status = Column(Enum("PENDING", "RUNNING", "SUCCEEDED", "FAILED"), nullable=False, server_default="PENDING")
+    progress = Column(Integer, nullable=False, default=0)
+    params = Column(Text)
+    result = Column(Text)
+    error = Column(Text)
+    file_path = Column(String(255))
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     updated_at = Column(TIMESTAMP, server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_jobs_status", "status", "job_id"),
+        Index("ix_jobs_user", "user_id", "job_id"),
+    )
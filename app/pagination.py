@@ -0,0 +1,48 @@
+import json
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from .cache import TTLCache
+from .config import COUNT_CACHE_TTL
+
+_counts = TTLCache(maxsize=10000, ttl=COUNT_CACHE_TTL)
+_generation = {}
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = json.dumps([ts.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+def invalidate_counts(user_id: int):
+    _generation[user_id] = _generation.get(user_id, 0) + 1
+
+def _count_key(user_id: int, resource: str, filters: tuple) -> tuple:
+    return user_id, _generation.get(user_id, 0), resource, filters
+
+def cached_count(user_id: int, resource: str, filters: tuple, *queries) -> int:
+    # several queries (one per storage tier) add up to one total
+    key = _count_key(user_id, resource, filters)
+    total = _counts.get(key)
+    if total is None:
+        total = sum(q.order_by(None).count() for q in queries)
+        _counts.set(key, total)
+    return total
+
+async def cached_count_async(db, user_id: int, resource: str, filters: tuple, *stmts) -> int:
+    """cached_count for Core selects on an AsyncSession; shares its entries and invalidation."""
+    key = _count_key(user_id, resource, filters)
+    total = _counts.get(key)
+    if total is None:
+        total = 0
+        for stmt in stmts:
+            total += (await db.execute(select(func.count()).select_from(stmt.order_by(None).subquery()))).scalar()
+        _counts.set(key, total)
+    return total
@@ -0,0 +1,112 @@
+from datetime import date, datetime
+from sqlalchemy import inspect, text
+
+# Optional monthly RANGE COLUMNS partitioning of `transactions` on MySQL, one partition per month
+# (p202405 holds rows before 2024-06-01) plus pmax for anything later. Every hot query carries
+# user_id and a time range, so the optimizer prunes to the months asked for, and months emptied
+# by the archive are dropped instead of deleted row by row.
+#
+# MySQL refuses foreign keys and FULLTEXT indexes on partitioned tables, so enable() drops them:
+# ownership is still checked by the routers, account and category deletes look for transactions
+# themselves (archive.referenced), and hot-table search falls back to LIKE over the user's rows
+# (the archive keeps its FULLTEXT index; running workers notice the dropped one via search.forget).
+
+TABLE = "transactions"
+MAX_PARTITION = "pmax"
+
+def _month(d) -> date:
+    return date(d.year, d.month, 1)
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+def _name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+def _definition(month: date) -> str:
+    return f"PARTITION {_name(month)} VALUES LESS THAN ('{_next_month(month):%Y-%m-%d}')"
+
+def _require_mysql(conn):
+    if conn.dialect.name != "mysql":
+        raise RuntimeError(f"partitioning needs MySQL, not {conn.dialect.name}")
+
+def status(conn, table: str = TABLE) -> list:
+    """[(name, upper bound or None for MAXVALUE, estimated rows)]; empty when not partitioned."""
+    if conn.dialect.name != "mysql":
+        return []
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS FROM information_schema.PARTITIONS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"t": table}).all()
+    out = []
+    for name, bound, count in rows:
+        bound = None if bound == "MAXVALUE" else datetime.fromisoformat(bound.strip("'"))
+        out.append((name, bound, count))
+    return out
+
+def is_partitioned(conn, table: str = TABLE) -> bool:
+    return bool(status(conn, table))
+
+def fulltext_indexes(conn, table: str) -> set:
+    if conn.dialect.name != "mysql":
+        return set()
+    return set(conn.execute(text(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND INDEX_TYPE = 'FULLTEXT'"
+    ), {"t": table}).scalars())
+
+def _wanted(ahead: int, today: date = None) -> date:
+    # last month that must have its own partition
+    month = _month(today or datetime.utcnow().date())
+    for _ in range(ahead):
+        month = _next_month(month)
+    return month
+
+def enable(conn, ahead: int = 3) -> list:
+    """Partition transactions by month up to `ahead` months from now; rebuilds the table."""
+    _require_mysql(conn)
+    if is_partitioned(conn):
+        return maintain(conn, ahead)
+    for fk in inspect(conn).get_foreign_keys(TABLE):
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP FOREIGN KEY {fk['name']}"))
+    for name in fulltext_indexes(conn, TABLE):
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP INDEX {name}"))
+    # every unique key must contain the partitioning column
+    conn.execute(text(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (transaction_id, transaction_time)"))
+    first = conn.execute(text(f"SELECT MIN(transaction_time) FROM {TABLE}")).scalar()
+    month, last = _month(first or datetime.utcnow()), _wanted(ahead)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = _next_month(month)
+    parts = [_definition(m) for m in months] + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+    conn.execute(text(f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(transaction_time) ({', '.join(parts)})"))
+    return [_name(m) for m in months]
+
+def maintain(conn, ahead: int = 3) -> list:
+    """Split pmax so every month up to `ahead` months from now has its own partition."""
+    _require_mysql(conn)
+    bounds = [bound for _, bound, _ in status(conn) if bound is not None]
+    if not bounds:
+        raise RuntimeError(f"{TABLE} is not partitioned; run enable first")
+    month, last = _month(max(bounds)), _wanted(ahead)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = _next_month(month)
+    if months:
+        parts = [_definition(m) for m in months] + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+        # pmax normally holds nothing, so this is a metadata change
+        conn.execute(text(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(parts)})"))
+    return [_name(m) for m in months]
+
+def drop_before(conn, cutoff: datetime) -> list:
+    """Drop the empty partitions that end on or before cutoff, i.e. months already archived."""
+    dropped = []
+    for name, bound, _ in status(conn):
+        if bound is None or bound > cutoff:
+            continue
+        # TABLE_ROWS is an estimate; a straggler written under a stale cutoff keeps its partition
+        if conn.execute(text(f"SELECT 1 FROM {TABLE} PARTITION ({name}) LIMIT 1")).first() is None:
+            conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {name}"))
+            dropped.append(name)
+    return dropped
@@ -0,0 +1,165 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import MonthlyStat, Category
+from . import archive
+
+PERIOD_TYPES = ("WEEK", "MONTH", "QUARTER", "YEAR", "CUSTOM")
+BUCKETS = ("day", "week", "month")
+
+def _add_months(d: date, n: int) -> date:
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+def parse_day(s: str) -> date:
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"invalid date: {s}")
+
+def resolve_period(period_type: str, anchor: str = None, start: str = None, end: str = None, today: date = None):
+    # returns [start, end) as dates
+    today = today or datetime.utcnow().date()
+    try:
+        if period_type == "CUSTOM":
+            if not start or not end:
+                raise HTTPException(status_code=400, detail="start and end are required")
+            s, e = parse_day(start), parse_day(end) + timedelta(days=1)
+        elif period_type == "WEEK":
+            d = parse_day(anchor) if anchor else today
+            s = d - timedelta(days=d.weekday())
+            e = s + timedelta(days=7)
+        elif period_type == "QUARTER":
+            if anchor and "-Q" in anchor.upper():
+                y, q = (int(x) for x in anchor.upper().split("-Q"))
+            elif anchor:
+                y, q = int(anchor[:4]), (int(anchor[5:7]) - 1) // 3 + 1
+            else:
+                y, q = today.year, (today.month - 1) // 3 + 1
+            if not 1 <= q <= 4:
+                raise ValueError(anchor)
+            s = date(y, 3 * (q - 1) + 1, 1)
+            e = _add_months(s, 3)
+        elif period_type == "YEAR":
+            y = int(anchor or today.year)
+            s, e = date(y, 1, 1), date(y + 1, 1, 1)
+        elif period_type == "MONTH":
+            y, m = (anchor or today.strftime("%Y-%m")).split("-")[:2]
+            s = date(int(y), int(m), 1)
+            e = _add_months(s, 1)
+        else:
+            raise HTTPException(status_code=400, detail=f"unsupported period_type: {period_type}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid date: {anchor}")
+    if e <= s:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    return s, e
+
+def default_bucket(period_type: str, start: date, end: date) -> str:
+    if period_type == "WEEK":
+        return "day"
+    if period_type == "CUSTOM" and (end - start).days <= 92:
+        return "day"
+    return "month"
+
+def bucket_key(d: date, bucket: str) -> str:
+    if bucket == "month":
+        return d.strftime("%Y-%m")
+    if bucket == "week":
+        d = d - timedelta(days=d.weekday())
+    return d.isoformat()
+
+def bucket_labels(start: date, end: date, bucket: str) -> list:
+    labels = []
+    if bucket == "month":
+        d = date(start.year, start.month, 1)
+        while d < end:
+            labels.append(bucket_key(d, bucket))
+            d = _add_months(d, 1)
+        return labels
+    step = 7 if bucket == "week" else 1
+    d = start - timedelta(days=start.weekday()) if bucket == "week" else start
+    while d < end:
+        labels.append(bucket_key(d, bucket))
+        d += timedelta(days=step)
+    return labels
+
+def _month_aligned(start: date, end: date) -> bool:
+    return start.day == 1 and end.day == 1
+
+def _rollup_select(user_id: int, start: date, end: date):
+    # one grouped read over monthly_stats: (month, type, category) -> amount
+    last_month = (end - timedelta(days=1)).strftime("%Y-%m")
+    return select(MonthlyStat.stat_month, MonthlyStat.transaction_type, Category.category_name, func.sum(MonthlyStat.total_amount)).join(Category, MonthlyStat.category_id == Category.category_id).where(MonthlyStat.user_id == user_id, MonthlyStat.stat_month >= start.strftime("%Y-%m"), MonthlyStat.stat_month <= last_month).group_by(MonthlyStat.stat_month, MonthlyStat.transaction_type, Category.category_name).having(func.sum(MonthlyStat.trx_count) > 0)
+
+def _days(start: date, end: date) -> tuple:
+    return datetime.combine(start, datetime.min.time()), datetime.combine(end, datetime.min.time())
+
+def _day_select(T, user_id: int, start: datetime, end: datetime):
+    # one grouped scan over one tier's raw rows: (day, type, category) -> amount
+    day = func.date(T.transaction_time)
+    return select(day, T.transaction_type, Category.category_name, func.sum(T.amount)).join(Category, T.category_id == Category.category_id).where(T.user_id == user_id, T.transaction_time >= start, T.transaction_time < end).group_by(day, T.transaction_type, Category.category_name)
+
+def _period(period_type: str, anchor: str, start: str, end: str, bucket: str) -> tuple:
+    period_type = (period_type or "MONTH").upper()
+    s, e = resolve_period(period_type, anchor, start, end)
+    bucket = (bucket or default_bucket(period_type, s, e)).lower()
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"unsupported bucket: {bucket}")
+    return period_type, s, e, bucket
+
+def build_report(db: Session, user_id: int, period_type: str = "MONTH", anchor: str = None, start: str = None, end: str = None, bucket: str = None) -> dict:
+    period_type, s, e, bucket = _period(period_type, anchor, start, end, bucket)
+    if bucket == "month" and _month_aligned(s, e):
+        return _summarize(period_type, s, e, bucket, db.execute(_rollup_select(user_id, s, e)).all())
+    rows = []
+    for T in archive.tiers(db, _days(s, e)[0]):
+        rows += db.execute(_day_select(T, user_id, *_days(s, e))).all()
+    return _summarize(period_type, s, e, bucket, rows, by_day=True)
+
+async def build_report_async(db, user_id: int, period_type: str = "MONTH", anchor: str = None, start: str = None, end: str = None, bucket: str = None) -> dict:
+    """build_report on an AsyncSession."""
+    period_type, s, e, bucket = _period(period_type, anchor, start, end, bucket)
+    if bucket == "month" and _month_aligned(s, e):
+        return _summarize(period_type, s, e, bucket, (await db.execute(_rollup_select(user_id, s, e))).all())
+    rows = []
+    # the tier list is a cached cutoff lookup
+    for T in await db.run_sync(archive.tiers, _days(s, e)[0]):
+        rows += (await db.execute(_day_select(T, user_id, *_days(s, e)))).all()
+    return _summarize(period_type, s, e, bucket, rows, by_day=True)
+
+def _summarize(period_type: str, s: date, e: date, bucket: str, rows: list, by_day: bool = False) -> dict:
+    # rows: (month or day, type, category, amount); days are folded into the bucket
+    if by_day:
+        rows = [(bucket_key(parse_day(str(d)[:10]), bucket), ttype, name, amount) for d, ttype, name, amount in rows]
+    totals = {"INCOME": Decimal("0"), "EXPENSE": Decimal("0")}
+    trend = {"INCOME": defaultdict(Decimal), "EXPENSE": defaultdict(Decimal)}
+    by_category = {"INCOME": defaultdict(Decimal), "EXPENSE": defaultdict(Decimal)}
+    for key, ttype, name, amount in rows:
+        amount = amount or Decimal("0")
+        totals[ttype] += amount
+        trend[ttype][key] += amount
+        by_category[ttype][name] += amount
+
+    def breakdown(ttype):
+        total = totals[ttype]
+        items = sorted(by_category[ttype].items(), key=lambda kv: kv[1], reverse=True)
+        return [{"category": name, "amount": float(amount), "percent": float(amount) / float(total) if total else 0} for name, amount in items]
+
+    labels = bucket_labels(s, e, bucket)
+    return {
+        "period_type": period_type,
+        "start": s.isoformat(),
+        "end": (e - timedelta(days=1)).isoformat(),
+        "bucket": bucket,
+        "buckets": labels,
+        "income_total": float(totals["INCOME"]),
+        "expense_total": float(totals["EXPENSE"]),
+        "expense_by_category": breakdown("EXPENSE"),
+        "income_by_category": breakdown("INCOME"),
+        "income_trend": [float(trend["INCOME"].get(k, 0)) for k in labels],
+        "expense_trend": [float(trend["EXPENSE"].get(k, 0)) for k in labels],
+    }
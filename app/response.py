@@ -1,7 +1,31 @@
+from decimal import Decimal
 from typing import Any, Dict
+import orjson
+from fastapi import Response
 
 def ok(data: Any = None, message: str = "success") -> Dict[str, Any]:
     return {"code": 200, "message": message, "data": data}
 
 def err(code: int, message: str) -> Dict[str, Any]:
     return {"code": code, "message": message}
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    # datetimes serialize as ISO 8601 like jsonable_encoder; Decimals as numbers
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def fast_ok(data: Any = None, message: str = "success", response: Response = None) -> Response:
+    """ok() rendered by orjson, skipping FastAPI's jsonable_encoder pass."""
+    # a returned Response replaces the injected one, so carry its headers (ETag) over
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"} if response is not None else None
+    return FastJSONResponse(ok(data, message), headers=headers)
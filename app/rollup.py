@@ -0,0 +1,110 @@
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import func, select, delete, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import mysql, sqlite
+from .models import MonthlyStat, Transaction, Category
+from . import archive
+
+KEY_COLUMNS = ("user_id", "stat_month", "transaction_type", "category_id")
+
+def month_key(dt) -> str:
+    return dt.strftime("%Y-%m")
+
+def month_expr(db: Session, col):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime("%Y-%m", col)
+    return func.date_format(col, "%Y-%m")
+
+def _upsert(db: Session, rows: list):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(MonthlyStat).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            total_amount=MonthlyStat.total_amount + stmt.inserted.total_amount,
+            trx_count=MonthlyStat.trx_count + stmt.inserted.trx_count,
+        )
+        db.execute(stmt)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(MonthlyStat).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                "total_amount": MonthlyStat.total_amount + stmt.excluded.total_amount,
+                "trx_count": MonthlyStat.trx_count + stmt.excluded.trx_count,
+            },
+        )
+        db.execute(stmt)
+    else:
+        for r in rows:
+            row = db.get(MonthlyStat, tuple(r[k] for k in KEY_COLUMNS), with_for_update=True)
+            if row:
+                row.total_amount = row.total_amount + r["total_amount"]
+                row.trx_count = row.trx_count + r["trx_count"]
+            else:
+                db.add(MonthlyStat(**r))
+        db.flush()
+
+def record_many(db: Session, items):
+    # items: (user_id, transaction_time, transaction_type, category_id, amount, sign)
+    acc = defaultdict(lambda: [Decimal("0"), 0])
+    for user_id, when, ttype, category_id, amount, sign in items:
+        key = (user_id, month_key(when), ttype, category_id)
+        acc[key][0] += Decimal(str(amount)) * sign
+        acc[key][1] += sign
+    rows = [
+        dict(zip(KEY_COLUMNS, key), total_amount=total, trx_count=count)
+        for key, (total, count) in acc.items()
+        if total or count
+    ]
+    _upsert(db, rows)
+
+def record(db: Session, user_id: int, when, ttype: str, category_id: int, amount, sign: int = 1):
+    record_many(db, [(user_id, when, ttype, category_id, amount, sign)])
+
+def record_transaction(db: Session, trx: Transaction, sign: int = 1):
+    record(db, trx.user_id, trx.transaction_time, trx.transaction_type, trx.category_id, trx.amount, sign)
+
+def totals_by_type(db: Session, user_id: int, start_month: str, end_month: str) -> dict:
+    rows = db.query(MonthlyStat.transaction_type, func.coalesce(func.sum(MonthlyStat.total_amount), 0)).filter(MonthlyStat.user_id == user_id, MonthlyStat.stat_month >= start_month, MonthlyStat.stat_month <= end_month).group_by(MonthlyStat.transaction_type).all()
+    data = {"INCOME": Decimal("0"), "EXPENSE": Decimal("0")}
+    for ttype, total in rows:
+        data[ttype] = total
+    return data
+
+def month_total(user_id: int, month: str, ttype: str):
+    """One month's total of one type as a scalar subquery, to batch into a larger SELECT."""
+    return select(func.coalesce(func.sum(MonthlyStat.total_amount), 0)).where(MonthlyStat.user_id == user_id, MonthlyStat.stat_month == month, MonthlyStat.transaction_type == ttype).scalar_subquery()
+
+def totals_by_category(db: Session, user_id: int, ttype: str, start_month: str, end_month: str):
+    total = func.sum(MonthlyStat.total_amount)
+    return db.query(Category.category_name, func.coalesce(total, 0)).join(MonthlyStat, MonthlyStat.category_id == Category.category_id).filter(MonthlyStat.user_id == user_id, MonthlyStat.transaction_type == ttype, MonthlyStat.stat_month >= start_month, MonthlyStat.stat_month <= end_month).group_by(Category.category_name).having(func.sum(MonthlyStat.trx_count) > 0).order_by(total.desc()).all()
+
+def totals_by_month(db: Session, user_id: int, ttype: str, start_month: str, end_month: str) -> dict:
+    rows = db.query(MonthlyStat.stat_month, func.coalesce(func.sum(MonthlyStat.total_amount), 0)).filter(MonthlyStat.user_id == user_id, MonthlyStat.transaction_type == ttype, MonthlyStat.stat_month >= start_month, MonthlyStat.stat_month <= end_month).group_by(MonthlyStat.stat_month).all()
+    return {m: total for m, total in rows}
+
+def rebuild(db: Session, user_id: int = None) -> int:
+    # archived rows count too: the rollup covers all of a user's history
+    tiers = []
+    for T in archive.all_tiers(db):
+        tier = select(T.user_id, T.transaction_time, T.transaction_type, T.category_id, T.amount)
+        tiers.append(tier if user_id is None else tier.where(T.user_id == user_id))
+    rows = archive.union(tiers)
+    month = month_expr(db, rows.c.transaction_time)
+    src = select(
+        rows.c.user_id,
+        month,
+        rows.c.transaction_type,
+        rows.c.category_id,
+        func.sum(rows.c.amount),
+        func.count(),
+    ).group_by(rows.c.user_id, month, rows.c.transaction_type, rows.c.category_id)
+    clear = delete(MonthlyStat)
+    if user_id is not None:
+        clear = clear.where(MonthlyStat.user_id == user_id)
+    db.execute(clear)
+    result = db.execute(insert(MonthlyStat).from_select(list(KEY_COLUMNS) + ["total_amount", "trx_count"], src))
+    return result.rowcount
@@ -1 +1 @@
-from . import auth, accounts, transactions, debts, reminders, categories, dashboard, stats, export_import
+from . import auth, accounts, transactions, debts, reminders, categories, dashboard, stats, export_import, jobs, bootstrap
@@ -1,49 +1,110 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from ..deps import get_current_user
+from ..deps import get_current_principal
 from ..database import get_db
-from ..models import Account
+from ..models import Account, BalanceSnapshot
 from ..schemas import AccountCreate, AccountUpdate, AccountItem
 from ..response import ok
+from .. import archive, reports, snapshots, versions
+from ..balances import adjust_opening, to_decimal
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
+def account_item(r) -> dict:
+    return {"account_id": r.account_id, "name": r.account_name, "type": r.account_type, "balance": float(r.balance)}
+
+def account_items(db: Session, user_id: int) -> list:
+    return [account_item(r) for r in db.query(Account).filter(Account.user_id == user_id).all()]
+
 @router.get("/list")
-def list_accounts(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    rows = db.query(Account).filter(Account.user_id == user.user_id).all()
-    data = [
-        {"account_id": r.account_id, "name": r.account_name, "type": r.account_type, "balance": float(r.balance)}
-        for r in rows
-    ]
-    return ok(data)
+def list_accounts(request: Request, response: Response, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    versions.conditional(request, response, user.user_id, ["accounts"])
+    return ok(account_items(db, user.user_id))
 
 @router.post("/add")
-def add_account(payload: AccountCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    acc = Account(user_id=user.user_id, account_name=payload.name, account_type=payload.type, balance=payload.initial_balance)
+def add_account(payload: AccountCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    initial = to_decimal(payload.initial_balance)
+    acc = Account(user_id=user.user_id, account_name=payload.name, account_type=payload.type, balance=initial, opening_balance=initial)
     db.add(acc)
     db.commit()
     db.refresh(acc)
+    versions.bump(user.user_id, "accounts")
     return ok({"account_id": acc.account_id}, "添加成功")
 
 @router.post("/update")
-def update_account(payload: AccountUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def update_account(payload: AccountUpdate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     acc = db.query(Account).filter(Account.account_id == payload.account_id, Account.user_id == user.user_id).first()
     if not acc:
         raise HTTPException(status_code=404, detail="account not found")
     if payload.name is not None:
         acc.account_name = payload.name
     if payload.balance is not None:
-        acc.balance = payload.balance
+        delta = to_decimal(payload.balance) - acc.balance
+        if delta:
+            adjust_opening(db, user.user_id, acc.account_id, delta)
     db.commit()
+    versions.bump(user.user_id, "accounts")
     return ok(message="更新成功")
 
 @router.post("/delete")
-def delete_account(req: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_account(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     account_id = req.get("account_id")
     acc = db.query(Account).filter(Account.account_id == account_id, Account.user_id == user.user_id).first()
     if not acc:
         raise HTTPException(status_code=404, detail="account not found")
-    # naive check: allow delete; in production ensure no transactions exist
+    if archive.referenced(db, user.user_id, "account_id", acc.account_id):
+        raise HTTPException(status_code=409, detail="account has transactions")
+    db.query(BalanceSnapshot).filter(BalanceSnapshot.account_id == acc.account_id).delete()
     db.delete(acc)
     db.commit()
+    versions.bump(user.user_id, "accounts")
     return ok(message="删除成功")
+
+def _get_account(db: Session, account_id: int, user_id: int) -> Account:
+    acc = db.query(Account).filter(Account.account_id == account_id, Account.user_id == user_id).first()
+    if not acc:
+        raise HTTPException(status_code=404, detail="account not found")
+    return acc
+
+@router.get("/balance_at")
+def balance_at(account_id: int, date: str = Query(None), db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    acc = _get_account(db, account_id, user.user_id)
+    day = reports.parse_day(date) if date else datetime.utcnow().date()
+    return ok({"account_id": acc.account_id, "date": day.isoformat(), "balance": float(snapshots.balance_at(db, acc, day))})
+
+@router.get("/balance_history")
+def balance_history(
+    account_id: int,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_principal),
+    period_type: str = Query("MONTH"),
+    date: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    bucket: str = Query(None),
+):
+    acc = _get_account(db, account_id, user.user_id)
+    period_type = period_type.upper()
+    s, e = reports.resolve_period(period_type, date, start, end)
+    bucket = (bucket or reports.default_bucket(period_type, s, e)).lower()
+    if bucket not in reports.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"unsupported bucket: {bucket}")
+    # closing balance of each bucket: the last snapshot inside it, else carried forward
+    closing = {}
+    for day, value in snapshots.closing_by_day(db, acc, s, e).items():
+        closing[reports.bucket_key(day, bucket)] = value
+    current = snapshots.balance_at(db, acc, s - timedelta(days=1))
+    labels = reports.bucket_labels(s, e, bucket)
+    points = []
+    for key in labels:
+        current = closing.get(key, current)
+        points.append(float(current))
+    return ok({
+        "account_id": acc.account_id,
+        "start": s.isoformat(),
+        "end": (e - timedelta(days=1)).isoformat(),
+        "bucket": bucket,
+        "buckets": labels,
+        "balances": points,
+    })
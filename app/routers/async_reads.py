@@ -0,0 +1,71 @@
+from fastapi import Depends, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..async_database import get_async_read_db, get_current_principal_async
+from ..config import MAX_PAGE_SIZE
+from ..models import Account
+from ..response import ok, fast_ok
+from ..pagination import decode_cursor, cached_count_async
+from ..reports import build_report_async
+from .. import archive, rollup, versions
+from . import dashboard, stats, transactions
+from .transactions import item_select, with_filters, newest_first, list_page
+
+# Native async versions of the hot reads, served under DB_ASYNC in place of their sync twins: the
+# queries are awaited on the AsyncSession instead of holding a threadpool thread. Version-store
+# lookups go through versions.off_loop, and reads are routed to replicas the way get_read_db does.
+
+async def list_transactions(
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_principal_async),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    type: str = Query(None),
+    account_id: int = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    with_total: bool = Query(None),
+):
+    tiers = await db.run_sync(archive.tiers, start_date)
+    stmts = [with_filters(item_select(user.user_id, T), T, start_date, end_date, type, account_id) for T in tiers]
+    if with_total is None:
+        with_total = cursor is None
+    total = await cached_count_async(db, user.user_id, "transactions", (start_date, end_date, type, account_id), *stmts) if with_total else None
+    after = decode_cursor(cursor) if cursor else None
+    stmts = [newest_first(s, T, after) for s, T in zip(stmts, tiers)]
+    rows = await archive.newest_async(db, stmts, page_size + 1, 0 if cursor else (page - 1) * page_size)
+    return fast_ok(list_page(rows, total, page, page_size, cursor))
+
+async def dashboard_summary(request: Request, response: Response, db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_principal_async), month: str = Query(None)):
+    month = month or dashboard.current_month()
+    await versions.off_loop(versions.conditional, request, response, user.user_id, dashboard.RESOURCES, month)
+    # the balance total and the month's income and expense in one round trip
+    balance = select(func.coalesce(func.sum(Account.balance), 0)).where(Account.user_id == user.user_id).scalar_subquery()
+    total_balance, income, expense = (await db.execute(select(balance, rollup.month_total(user.user_id, month, "INCOME"), rollup.month_total(user.user_id, month, "EXPENSE")))).one()
+    tiers = await db.run_sync(archive.tiers)
+    recent = await archive.newest_async(db, [newest_first(item_select(user.user_id, T), T) for T in tiers], 5)
+    return fast_ok(dashboard.summary_item(total_balance, income, expense, [r._asdict() for r in recent]), response=response)
+
+async def report(
+    db: AsyncSession = Depends(get_async_read_db),
+    user=Depends(get_current_principal_async),
+    period_type: str = Query("MONTH"),
+    date: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    bucket: str = Query(None),
+):
+    return ok(await build_report_async(db, user.user_id, period_type, date, start, end, bucket))
+
+async def ai_analysis(req: dict, db: AsyncSession = Depends(get_async_read_db), user=Depends(get_current_principal_async)):
+    from .. import insights
+    return ok(await insights.insights_async(db, user.user_id, req.get("period")))
+
+# sync endpoint -> its native async replacement, picked up by asyncify
+NATIVE = {
+    transactions.list_transactions: list_transactions,
+    dashboard.summary: dashboard_summary,
+    stats.report: report,
+    stats.ai_analysis: ai_analysis,
+}
@@ -0,0 +1,49 @@
+import inspect
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from ..deps import get_current_principal, get_read_db
+from ..async_database import get_current_principal_async, get_read_db_async
+from .async_reads import NATIVE
+
+# every add_api_route option an APIRoute keeps; path and endpoint are rebuilt, methods listified
+ROUTE_OPTIONS = (
+    "response_model", "status_code", "tags", "dependencies", "summary", "description", "response_description",
+    "responses", "deprecated", "operation_id", "response_model_include", "response_model_exclude",
+    "response_model_by_alias", "response_model_exclude_unset", "response_model_exclude_defaults",
+    "response_model_exclude_none", "include_in_schema", "response_class", "name", "callbacks", "openapi_extra",
+    "generate_unique_id_function",
+)
+
+def _async_endpoint(endpoint):
+    # routes without a native version in async_reads: the principal resolves on the event loop
+    # (touching the AsyncSession only on a cache miss); the handler, its queries and its CPU work
+    # run on the threadpool with the usual sync session, so one slow call can't stall the loop
+    sig = inspect.signature(endpoint)
+    params = []
+    for p in sig.parameters.values():
+        dependency = getattr(p.default, "dependency", None)
+        if dependency is get_current_principal:
+            p = p.replace(default=Depends(get_current_principal_async))
+        elif dependency is get_read_db:
+            p = p.replace(default=Depends(get_read_db_async))
+        params.append(p)
+
+    async def wrapper(**kwargs):
+        return await run_in_threadpool(endpoint, **kwargs)
+
+    wrapper.__name__ = endpoint.__name__
+    wrapper.__doc__ = endpoint.__doc__
+    wrapper.__signature__ = sig.replace(parameters=params)
+    return wrapper
+
+def asyncify(router: APIRouter) -> APIRouter:
+    # the routes already carry the router's tags and dependencies
+    out = APIRouter(prefix=router.prefix)
+    for route in router.routes:
+        out.add_api_route(
+            route.path[len(router.prefix):],
+            NATIVE.get(route.endpoint) or _async_endpoint(route.endpoint),
+            methods=list(route.methods),
+            **{option: getattr(route, option) for option in ROUTE_OPTIONS},
+        )
+    return out
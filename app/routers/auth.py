@@ -3,7 +3,8 @@ from sqlalchemy.orm import Session
 from ..schemas import RegisterRequest, LoginRequest, TokenData
 from ..models import User
 from ..database import get_db
-from ..security import hash_password, verify_password, create_access_token
+from ..security import create_access_token
+from ..hashing import hash_password, verify_and_update
 from ..response import ok
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -23,7 +24,14 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
 @router.post("/login")
 def login(payload: LoginRequest, db: Session = Depends(get_db)):
     user = db.query(User).filter(User.email == payload.email).first()
-    if not user or not verify_password(payload.password, user.password_hash):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    matches, new_hash = verify_and_update(payload.password, user.password_hash)
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # PASSWORD_ROUNDS changed since this hash was made; the plain password is only here now
+        user.password_hash = new_hash
+        db.commit()
     token = create_access_token({"user_id": user.user_id, "nickname": user.nickname})
     return ok({"user_id": user.user_id, "nickname": user.nickname, "token": token})
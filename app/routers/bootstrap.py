@@ -0,0 +1,82 @@
+import logging
+from decimal import Decimal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..deps import get_current_principal, get_read_db
+from ..models import Account
+from ..response import fast_ok
+from .. import debt_ledger, rollup, versions
+from . import accounts, categories, dashboard, debts, reminders
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/bootstrap", tags=["bootstrap"])
+
+# section -> resources its token follows
+SECTIONS = {
+    "dashboard": dashboard.RESOURCES,
+    "accounts": ["accounts"],
+    "categories": ["categories"],
+    "debts_summary": ["debts"],
+    "reminders": ["reminders"],
+}
+
+def _parse_known(known: str) -> dict:
+    # "accounts:<token>,categories:<token>"
+    out = {}
+    for part in (known or "").split(","):
+        if not part.strip():
+            continue
+        name, sep, tok = part.partition(":")
+        if not sep or name.strip() not in SECTIONS:
+            raise HTTPException(status_code=400, detail=f"invalid known section: {part}")
+        out[name.strip()] = tok.strip()
+    return out
+
+def _token(name: str, user_id: int):
+    # fails open like versions.conditional: without a token the section is simply sent
+    extra = [dashboard.current_month()] if name == "dashboard" else []
+    try:
+        return versions.token(user_id, SECTIONS[name], name, *extra)
+    except Exception:
+        logger.exception("version lookup failed for user %s", user_id)
+        return None
+
+@router.get("")
+def bootstrap(db: Session = Depends(get_read_db), user=Depends(get_current_principal), known: str = Query(None)):
+    known = _parse_known(known)
+    # tokens are taken before loading, so a racing write can only make a section look stale
+    tokens = {name: _token(name, user.user_id) for name in SECTIONS}
+    unchanged = [name for name in SECTIONS if tokens[name] is not None and known.get(name) == tokens[name]]
+    data = {"versions": tokens, "unchanged": unchanged}
+    data.update(_load(db, user.user_id, [name for name in SECTIONS if name not in unchanged]))
+    return fast_ok(data)
+
+def _load(db: Session, user_id: int, wanted: list) -> dict:
+    # the sections share round trips on the request's own session: one read of the accounts serves the
+    # account list and the dashboard's balance total, and the month's income and expense come back in
+    # the same SELECT as the debt totals
+    out = {}
+    if "accounts" in wanted or "dashboard" in wanted:
+        rows = db.query(Account).filter(Account.user_id == user_id).all()
+        if "accounts" in wanted:
+            out["accounts"] = [accounts.account_item(r) for r in rows]
+    scalars = []
+    if "dashboard" in wanted:
+        month = dashboard.current_month()
+        scalars += [rollup.month_total(user_id, month, "INCOME"), rollup.month_total(user_id, month, "EXPENSE")]
+    if "debts_summary" in wanted:
+        scalars += debt_ledger.totals_columns(user_id)
+    totals = list(db.execute(select(*scalars)).one()) if scalars else []
+    if "dashboard" in wanted:
+        income, expense = totals[:2]
+        total_balance = sum((r.balance for r in rows), Decimal("0"))
+        out["dashboard"] = dashboard.summary_item(total_balance, income, expense, dashboard.recent_items(db, user_id))
+    if "debts_summary" in wanted:
+        out["debts_summary"] = debts.summary_item(*totals[-2:])
+    if "categories" in wanted:
+        out["categories"] = categories.category_items(db, user_id)
+    if "reminders" in wanted:
+        out["reminders"] = reminders.reminder_items(db, user_id)
+    return {name: out[name] for name in wanted}
@@ -1,17 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from ..deps import get_current_user
+from ..deps import get_current_principal
 from ..database import get_db
 from ..models import Category
 from ..schemas import CategoryCreate, CategoryUpdate
 from ..response import ok
+from .. import archive, versions
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
-@router.get("/list")
-def list_categories(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    rows = db.query(Category).filter(Category.user_id == user.user_id).all()
-    data = [
+def category_items(db: Session, user_id: int) -> list:
+    rows = db.query(Category).filter(Category.user_id == user_id).all()
+    return [
         {
             "category_id": r.category_id,
             "name": r.category_name,
@@ -20,17 +20,22 @@ def list_categories(db: Session = Depends(get_db), user=Depends(get_current_user
         }
         for r in rows
     ]
-    return ok(data)
+
+@router.get("/list")
+def list_categories(request: Request, response: Response, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    versions.conditional(request, response, user.user_id, ["categories"])
+    return ok(category_items(db, user.user_id))
 
 @router.post("/add")
-def add_category(payload: CategoryCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def add_category(payload: CategoryCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     row = Category(user_id=user.user_id, category_name=payload.name, category_type=payload.type, icon=payload.icon, is_system=0)
     db.add(row)
     db.commit()
+    versions.bump(user.user_id, "categories")
     return ok(message="添加成功")
 
 @router.post("/update")
-def update_category(payload: CategoryUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def update_category(payload: CategoryUpdate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     row = db.query(Category).filter(Category.category_id == payload.category_id, Category.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="category not found")
@@ -39,14 +44,18 @@ def update_category(payload: CategoryUpdate, db: Session = Depends(get_db), user
     if payload.icon is not None:
         row.icon = payload.icon
     db.commit()
+    versions.bump(user.user_id, "categories")
     return ok(message="更新成功")
 
 @router.post("/delete")
-def delete_category(req: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_category(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     category_id = req.get("category_id")
     row = db.query(Category).filter(Category.category_id == category_id, Category.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="category not found")
+    if archive.referenced(db, user.user_id, "category_id", row.category_id):
+        raise HTTPException(status_code=409, detail="category has transactions")
     db.delete(row)
     db.commit()
+    versions.bump(user.user_id, "categories")
     return ok(message="删除成功")
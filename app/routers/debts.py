@@ -1,75 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from ..deps import get_current_user
+from sqlalchemy import or_, and_
+from ..deps import get_current_principal, get_read_db
 from ..database import get_db
 from ..models import Debt
 from ..schemas import DebtCreate, DebtUpdate
 from ..response import ok
+from .. import versions, debt_ledger
+from ..balances import to_decimal
+from ..config import MAX_PAGE_SIZE
+from ..pagination import encode_cursor, decode_cursor, cached_count, invalidate_counts
 
 router = APIRouter(prefix="/debts", tags=["debts"])
 
-@router.get("/summary")
-def debts_summary(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    borrow_sum = db.query(func.coalesce(func.sum(Debt.amount), 0)).filter(Debt.user_id == user.user_id, Debt.debt_type == "BORROW").scalar()
-    lend_sum = db.query(func.coalesce(func.sum(Debt.amount), 0)).filter(Debt.user_id == user.user_id, Debt.debt_type == "LEND").scalar()
-    data = {
-        "total_borrow_in": float(borrow_sum or 0),
-        "total_lend_out": float(lend_sum or 0),
-        "net_debt": float((lend_sum or 0) - (borrow_sum or 0)),
+def summary_item(borrowed, lent) -> dict:
+    return {
+        "total_borrow_in": float(borrowed),
+        "total_lend_out": float(lent),
+        "net_debt": float(lent - borrowed),
     }
-    return ok(data)
+
+def summary_data(db: Session, user_id: int) -> dict:
+    # one primary-key read of the running totals
+    totals = debt_ledger.totals(db, user_id)
+    return summary_item(totals["borrowed"], totals["lent"])
+
+def person_item(row) -> dict:
+    # net > 0: they owe the user; net < 0: the user owes them
+    return {
+        "person_name": row.person_name,
+        "total_borrow_in": float(row.borrowed),
+        "total_lend_out": float(row.lent),
+        "net_debt": float(row.lent - row.borrowed),
+        "count": row.debt_count,
+    }
+
+def debt_item(r) -> dict:
+    return {
+        "debt_id": r.debt_id,
+        "type": r.debt_type,
+        "person_name": r.person_name,
+        "amount": float(r.amount),
+        "action_time": r.action_time,
+        "note": r.note,
+    }
+
+@router.get("/summary")
+def debts_summary(request: Request, response: Response, db: Session = Depends(get_read_db), user=Depends(get_current_principal)):
+    versions.conditional(request, response, user.user_id, ["debts"])
+    return ok(summary_data(db, user.user_id))
+
+@router.get("/people")
+def people(request: Request, response: Response, db: Session = Depends(get_read_db), user=Depends(get_current_principal)):
+    versions.conditional(request, response, user.user_id, ["debts"])
+    return ok([person_item(r) for r in debt_ledger.people(db, user.user_id)])
+
+@router.get("/people/history")
+def person_history(
+    person_name: str,
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_principal),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+):
+    ledger = debt_ledger.person(db, user.user_id, person_name)
+    if ledger is None or not ledger.debt_count:
+        raise HTTPException(status_code=404, detail="person not found")
+    q = db.query(Debt).filter(Debt.user_id == user.user_id, Debt.person_name == person_name)
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        q = q.filter(or_(Debt.action_time < ts, and_(Debt.action_time == ts, Debt.debt_id < last_id)))
+    rows = q.order_by(Debt.action_time.desc(), Debt.debt_id.desc()).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return ok({
+        "person": person_item(ledger),
+        "list": [debt_item(r) for r in rows],
+        "next_cursor": encode_cursor(rows[-1].action_time, rows[-1].debt_id) if has_more else None,
+    })
 
 @router.get("/list")
-def list_debts(db: Session = Depends(get_db), user=Depends(get_current_user), type: str = Query(None), page: int = 1, page_size: int = 20):
+def list_debts(
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_principal),
+    type: str = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    with_total: bool = Query(None),
+):
     q = db.query(Debt).filter(Debt.user_id == user.user_id)
     if type:
         q = q.filter(Debt.debt_type == type)
-    total = q.count()
-    rows = q.order_by(Debt.action_time.desc()).offset((page - 1) * page_size).limit(page_size).all()
+    if with_total is None:
+        with_total = cursor is None
+    total = cached_count(user.user_id, "debts", (type,), q) if with_total else None
+    if cursor:
+        ts, last_id = decode_cursor(cursor)
+        q = q.filter(or_(Debt.action_time < ts, and_(Debt.action_time == ts, Debt.debt_id < last_id)))
+    q = q.order_by(Debt.action_time.desc(), Debt.debt_id.desc())
+    if not cursor:
+        q = q.offset((page - 1) * page_size)
+    rows = q.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
     data = {
-        "list": [
-            {
-                "debt_id": r.debt_id,
-                "type": r.debt_type,
-                "person_name": r.person_name,
-                "amount": float(r.amount),
-                "action_time": r.action_time,
-                "note": r.note,
-            }
-            for r in rows
-        ],
+        "list": [debt_item(r) for r in rows],
         "total": total,
+        "next_cursor": encode_cursor(rows[-1].action_time, rows[-1].debt_id) if has_more else None,
     }
     return ok(data)
 
 @router.post("/add")
-def add_debt(payload: DebtCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    row = Debt(user_id=user.user_id, debt_type=payload.type, person_name=payload.person_name, amount=payload.amount, action_time=payload.action_time, note=payload.note)
+def add_debt(payload: DebtCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    if payload.type not in debt_ledger.DEBT_TYPES:
+        raise HTTPException(status_code=400, detail="type must be BORROW or LEND")
+    row = Debt(user_id=user.user_id, debt_type=payload.type, person_name=payload.person_name, amount=to_decimal(payload.amount), action_time=payload.action_time, note=payload.note)
     db.add(row)
+    debt_ledger.record(db, row)
     db.commit()
+    versions.bump(user.user_id, "debts")
+    invalidate_counts(user.user_id)
     return ok(message="添加成功")
 
 @router.post("/update")
-def update_debt(payload: DebtUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def update_debt(payload: DebtUpdate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     row = db.query(Debt).filter(Debt.debt_id == payload.debt_id, Debt.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="debt not found")
+    debt_ledger.record(db, row, sign=-1)
     if payload.person_name is not None:
         row.person_name = payload.person_name
     if payload.amount is not None:
-        row.amount = payload.amount
+        row.amount = to_decimal(payload.amount)
     if payload.note is not None:
         row.note = payload.note
+    debt_ledger.record(db, row)
     db.commit()
+    versions.bump(user.user_id, "debts")
     return ok(message="修改成功")
 
 @router.post("/delete")
-def delete_debt(req: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_debt(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     debt_id = req.get("debt_id")
     row = db.query(Debt).filter(Debt.debt_id == debt_id, Debt.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="debt not found")
+    debt_ledger.record(db, row, sign=-1)
     db.delete(row)
     db.commit()
+    versions.bump(user.user_id, "debts")
+    invalidate_counts(user.user_id)
     return ok(message="删除成功")
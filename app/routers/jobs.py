@@ -0,0 +1,61 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from ..deps import get_current_principal
+from ..database import get_db
+from ..models import Job
+from ..response import ok
+from .. import jobs, exporter
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+REBUILD_KINDS = {"rollup": "rebuild_rollup", "balances": "reconcile_balances"}
+
+def _get_job(db: Session, job_id: int, user_id: int) -> Job:
+    job = db.query(Job).filter(Job.job_id == job_id, Job.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+@router.post("/import")
+def submit_import(file: UploadFile, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    job = jobs.create(db, user.user_id, "import", {"filename": file.filename}, upload=file.file, suffix="xlsx")
+    return ok({"job_id": job.job_id}, "已提交")
+
+@router.post("/export")
+def submit_export(db: Session = Depends(get_db), user=Depends(get_current_principal), format: str = Query("xlsx"), sheet: str = Query("transactions")):
+    if format not in exporter.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be xlsx, csv or ndjson")
+    if sheet not in exporter.SHEETS:
+        raise HTTPException(status_code=400, detail="sheet must be transactions or debts")
+    job = jobs.create(db, user.user_id, "export", {"format": format, "sheet": sheet})
+    return ok({"job_id": job.job_id}, "已提交")
+
+@router.post("/rebuild")
+def submit_rebuild(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    kind = REBUILD_KINDS.get(req.get("target", "rollup"))
+    if not kind:
+        raise HTTPException(status_code=400, detail=f"target must be one of {', '.join(REBUILD_KINDS)}")
+    job = jobs.create(db, user.user_id, kind)
+    return ok({"job_id": job.job_id}, "已提交")
+
+@router.get("/status")
+def job_status(job_id: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    return ok(jobs.to_dict(_get_job(db, job_id, user.user_id)))
+
+@router.get("/list")
+def list_jobs(db: Session = Depends(get_db), user=Depends(get_current_principal), limit: int = 20):
+    rows = db.query(Job).filter(Job.user_id == user.user_id).order_by(Job.job_id.desc()).limit(limit).all()
+    return ok([jobs.to_dict(r) for r in rows])
+
+@router.get("/download")
+def download(job_id: int, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    job = _get_job(db, job_id, user.user_id)
+    if job.kind == "export" and job.status == "SUCCEEDED" and not job.file_path:
+        raise HTTPException(status_code=410, detail="export expired")
+    if job.kind != "export" or job.status != "SUCCEEDED" or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409, detail="export not ready")
+    fmt = job.file_path.rsplit(".", 1)[-1]
+    filename = f"meloonmoney_job{job.job_id}.{fmt}"
+    return FileResponse(job.file_path, media_type=exporter.MEDIA_TYPES[fmt], filename=filename)
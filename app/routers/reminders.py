@@ -1,38 +1,51 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from ..deps import get_current_user
+from ..deps import get_current_principal
 from ..database import get_db
 from ..models import Reminder
 from ..schemas import ReminderCreate, ReminderUpdate
 from ..response import ok
+from .. import versions, scheduler
 
 router = APIRouter(prefix="/reminders", tags=["reminders"])
 
-@router.get("/list")
-def list_reminders(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    rows = db.query(Reminder).filter(Reminder.user_id == user.user_id).order_by(Reminder.reminder_id.desc()).all()
-    data = [
+def reminder_items(db: Session, user_id: int) -> list:
+    rows = db.query(Reminder).filter(Reminder.user_id == user_id).order_by(Reminder.reminder_id.desc()).all()
+    return [
         {
             "reminder_id": r.reminder_id,
             "event_name": r.event_name,
             "reminder_time": r.reminder_time,
             "frequency": r.frequency,
             "is_active": bool(r.is_active),
+            "next_fire_at": r.next_fire_at,
             "note": r.note,
         }
         for r in rows
     ]
-    return ok(data)
+
+def _reschedule(row: Reminder):
+    try:
+        return scheduler.reschedule(row)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/list")
+def list_reminders(db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    return ok(reminder_items(db, user.user_id))
 
 @router.post("/add")
-def add_reminder(payload: ReminderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    row = Reminder(user_id=user.user_id, event_name=payload.event_name, reminder_time=payload.reminder_time, frequency=payload.frequency, note=payload.note)
+def add_reminder(payload: ReminderCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    row = Reminder(user_id=user.user_id, event_name=payload.event_name, reminder_time=payload.reminder_time, frequency=payload.frequency, note=payload.note, is_active=1)
+    fire_at = _reschedule(row)
     db.add(row)
     db.commit()
+    scheduler.hint(fire_at)
+    versions.bump(user.user_id, "reminders")
     return ok(message="设置成功")
 
 @router.post("/update")
-def update_reminder(payload: ReminderUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def update_reminder(payload: ReminderUpdate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     row = db.query(Reminder).filter(Reminder.reminder_id == payload.reminder_id, Reminder.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="reminder not found")
@@ -46,15 +59,22 @@ def update_reminder(payload: ReminderUpdate, db: Session = Depends(get_db), user
         row.note = payload.note
     if payload.is_active is not None:
         row.is_active = 1 if payload.is_active else 0
+    # a note or name edit must not re-arm a ONCE reminder that already fired
+    fire_at = None
+    if payload.reminder_time is not None or payload.frequency is not None or payload.is_active is not None:
+        fire_at = _reschedule(row)
     db.commit()
+    scheduler.hint(fire_at)
+    versions.bump(user.user_id, "reminders")
     return ok(message="更新成功")
 
 @router.post("/delete")
-def delete_reminder(req: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def delete_reminder(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     reminder_id = req.get("reminder_id")
     row = db.query(Reminder).filter(Reminder.reminder_id == reminder_id, Reminder.user_id == user.user_id).first()
     if not row:
         raise HTTPException(status_code=404, detail="reminder not found")
     db.delete(row)
     db.commit()
+    versions.bump(user.user_id, "reminders")
     return ok(message="删除成功")
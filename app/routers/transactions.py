@@ -1,95 +1,230 @@
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from ..deps import get_current_user
+from sqlalchemy import func, or_, and_, insert, select
+from sqlalchemy.exc import DBAPIError
+from ..deps import get_current_principal, get_read_db
 from ..database import get_db
 from ..models import Transaction, Account, Category
-from ..schemas import TransactionCreate, TransactionUpdate
-from ..response import ok
+from ..schemas import TransactionCreate, TransactionUpdate, TransactionBatchCreate
+from ..response import ok, fast_ok
+from .. import rollup
+from ..config import BATCH_ADD_MAX, MAX_PAGE_SIZE
+from .. import archive, balances, versions, search
+from ..balances import signed_amount, to_decimal
+from ..pagination import encode_cursor, decode_cursor, cached_count, invalidate_counts
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
-def apply_balance(db: Session, account_id: int, amount: float, ttype: str, reverse: bool = False):
-    acc = db.query(Account).filter(Account.account_id == account_id).first()
-    if not acc:
-        raise HTTPException(status_code=404, detail="account not found")
-    delta = amount if ttype == "INCOME" else -amount
-    if reverse:
-        delta = -delta
-    acc.balance = float(acc.balance) + delta
+def item_columns(T=Transaction):
+    # list item columns, selected as plain rows instead of entities; T is a storage tier
+    return (
+        T.transaction_id,
+        T.amount,
+        T.transaction_type.label("type"),
+        Category.category_name,
+        Account.account_name,
+        T.transaction_time,
+        T.summary,
+        T.target_person,
+    )
+
+def item_query(db: Session, user_id: int, T=Transaction):
+    return db.query(*item_columns(T)).join(Category, T.category_id == Category.category_id).join(Account, T.account_id == Account.account_id).filter(T.user_id == user_id)
+
+def item_select(user_id: int, T=Transaction):
+    # item_query as a Core select, for AsyncSession
+    return select(*item_columns(T)).select_from(T).join(Category, T.category_id == Category.category_id).join(Account, T.account_id == Account.account_id).where(T.user_id == user_id)
+
+def filtered_query(db: Session, user_id: int, T, start_date: str = None, end_date: str = None, type: str = None, account_id: int = None):
+    return with_filters(item_query(db, user_id, T), T, start_date, end_date, type, account_id)
+
+def with_filters(q, T, start_date: str = None, end_date: str = None, type: str = None, account_id: int = None):
+    # q is a Query or a select; both take .filter
+    if start_date:
+        q = q.filter(T.transaction_time >= f"{start_date} 00:00:00")
+    if end_date:
+        q = q.filter(T.transaction_time <= f"{end_date} 23:59:59")
+    if type:
+        q = q.filter(T.transaction_type == type)
+    if account_id:
+        q = q.filter(T.account_id == account_id)
+    return q
 
 @router.post("/add")
-def add_transaction(payload: TransactionCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def add_transaction(payload: TransactionCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
     if payload.transaction_time is None:
         payload.transaction_time = datetime.utcnow()
     trx = Transaction(
         user_id=user.user_id,
         account_id=payload.account_id,
         category_id=payload.category_id,
-        amount=payload.amount,
+        amount=to_decimal(payload.amount),
         transaction_type=payload.type,
         transaction_time=payload.transaction_time,
         target_person=payload.target_person,
         summary=payload.summary,
         note=payload.note,
     )
-    apply_balance(db, payload.account_id, payload.amount, payload.type, reverse=False)
+    balances.post(db, user.user_id, trx.account_id, trx.transaction_time, signed_amount(trx.amount, trx.transaction_type))
     db.add(trx)
+    rollup.record_transaction(db, trx)
+    archive.settle(db, user.user_id, trx.transaction_time)
     db.commit()
+    invalidate_counts(user.user_id)
+    versions.bump(user.user_id, "transactions", "accounts")
     return ok(message="记账成功")
 
+@router.post("/batch_add")
+def batch_add_transactions(payload: TransactionBatchCreate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    if len(payload.items) > BATCH_ADD_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {BATCH_ADD_MAX} items per batch")
+    results = [None] * len(payload.items)
+    parsed = []
+    for index, item in enumerate(payload.items):
+        try:
+            trx = TransactionCreate.model_validate(item)
+        except ValidationError as e:
+            results[index] = {"index": index, "ok": False, "error": "; ".join(f"{'.'.join(map(str, x['loc']))}: {x['msg']}" for x in e.errors())}
+            continue
+        if trx.type not in ("EXPENSE", "INCOME"):
+            results[index] = {"index": index, "ok": False, "error": f"invalid type: {trx.type}"}
+            continue
+        parsed.append((index, trx))
+
+    account_ids = {trx.account_id for _, trx in parsed}
+    category_ids = {trx.category_id for _, trx in parsed}
+    owned_accounts = {r for (r,) in db.query(Account.account_id).filter(Account.user_id == user.user_id, Account.account_id.in_(account_ids))} if account_ids else set()
+    owned_categories = {r for (r,) in db.query(Category.category_id).filter(Category.user_id == user.user_id, Category.category_id.in_(category_ids))} if category_ids else set()
+
+    now = datetime.utcnow()
+    rows = []
+    indexes = []
+    for index, trx in parsed:
+        if trx.account_id not in owned_accounts:
+            results[index] = {"index": index, "ok": False, "error": "account not found"}
+            continue
+        if trx.category_id not in owned_categories:
+            results[index] = {"index": index, "ok": False, "error": "category not found"}
+            continue
+        amount = to_decimal(trx.amount)
+        rows.append({
+            "user_id": user.user_id,
+            "account_id": trx.account_id,
+            "category_id": trx.category_id,
+            "amount": amount,
+            "transaction_type": trx.type,
+            "transaction_time": trx.transaction_time or now,
+            "target_person": trx.target_person,
+            "summary": trx.summary,
+            "note": trx.note,
+        })
+        indexes.append(index)
+
+    ids = None
+    if rows:
+        if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            stmt = insert(Transaction).returning(Transaction.transaction_id, sort_by_parameter_order=True)
+            ids = list(db.execute(stmt, rows).scalars())
+        else:
+            # no RETURNING (MySQL): lastrowid arithmetic isn't safe under interleaved autoinc locking,
+            # so per-item ids are left out rather than guessed
+            db.execute(insert(Transaction), rows)
+        balances.post_many(db, user.user_id, ((r["account_id"], r["transaction_time"], signed_amount(r["amount"], r["transaction_type"])) for r in rows))
+        rollup.record_many(db, ((user.user_id, r["transaction_time"], r["transaction_type"], r["category_id"], r["amount"], 1) for r in rows))
+        archive.settle(db, user.user_id, min(r["transaction_time"] for r in rows))
+    db.commit()
+    invalidate_counts(user.user_id)
+    versions.bump(user.user_id, "transactions", "accounts")
+    for position, index in enumerate(indexes):
+        results[index] = {"index": index, "ok": True}
+        if ids is not None:
+            results[index]["transaction_id"] = ids[position]
+    return ok({"created": len(rows), "failed": len(results) - len(rows), "results": results}, "记账成功")
+
 @router.get("/list")
 def list_transactions(
-    db: Session = Depends(get_db),
-    user=Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_principal),
     start_date: str = Query(None),
     end_date: str = Query(None),
     type: str = Query(None),
     account_id: int = Query(None),
-    page: int = 1,
-    page_size: int = 20,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = Query(None),
+    with_total: bool = Query(None),
 ):
-    q = db.query(Transaction, Category.category_name, Account.account_name).join(Category, Transaction.category_id == Category.category_id).join(Account, Transaction.account_id == Account.account_id).filter(Transaction.user_id == user.user_id)
-    if start_date:
-        q = q.filter(Transaction.transaction_time >= f"{start_date} 00:00:00")
-    if end_date:
-        q = q.filter(Transaction.transaction_time <= f"{end_date} 23:59:59")
-    if type:
-        q = q.filter(Transaction.transaction_type == type)
-    if account_id:
-        q = q.filter(Transaction.account_id == account_id)
-    total = q.count()
-    rows = q.order_by(Transaction.transaction_time.desc()).offset((page - 1) * page_size).limit(page_size).all()
-    data = {
-        "list": [
-            {
-                "transaction_id": r.Transaction.transaction_id,
-                "amount": float(r.Transaction.amount),
-                "type": r.Transaction.transaction_type,
-                "category_name": r[1],
-                "account_name": r[2],
-                "transaction_time": r.Transaction.transaction_time,
-                "summary": r.Transaction.summary,
-                "target_person": r.Transaction.target_person,
-            }
-            for r in rows
-        ],
+    # the archive is only read when the range reaches back before the cutoff
+    tiers = archive.tiers(db, start_date)
+    queries = [filtered_query(db, user.user_id, T, start_date, end_date, type, account_id) for T in tiers]
+    if with_total is None:
+        with_total = cursor is None
+    total = cached_count(user.user_id, "transactions", (start_date, end_date, type, account_id), *queries) if with_total else None
+    after = decode_cursor(cursor) if cursor else None
+    queries = [newest_first(q, T, after) for q, T in zip(queries, tiers)]
+    rows = archive.newest(queries, page_size + 1, 0 if cursor else (page - 1) * page_size)
+    return fast_ok(list_page(rows, total, page, page_size, cursor))
+
+def newest_first(q, T, after: tuple = None):
+    # q is a Query or a select; after is a decoded cursor
+    if after:
+        ts, last_id = after
+        q = q.filter(or_(T.transaction_time < ts, and_(T.transaction_time == ts, T.transaction_id < last_id)))
+    return q.order_by(T.transaction_time.desc(), T.transaction_id.desc())
+
+def list_page(rows: list, total, page: int, page_size: int, cursor: str = None) -> dict:
+    # rows holds up to page_size + 1 rows; the extra one only says there is a next page
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return {
+        "list": [r._asdict() for r in rows],
         "total": total,
-        "current_page": page,
+        "current_page": None if cursor else page,
+        "next_cursor": encode_cursor(rows[-1].transaction_time, rows[-1].transaction_id) if has_more else None,
     }
-    return ok(data)
+
+@router.get("/search")
+def search_transactions(
+    q: str,
+    db: Session = Depends(get_read_db),
+    user=Depends(get_current_principal),
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    type: str = Query(None),
+    account_id: int = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+):
+    def matches():
+        # matches from the hot table first, then from the archive, each ranked on its own
+        queries = [search.apply(db, filtered_query(db, user.user_id, T, start_date, end_date, type, account_id), user.user_id, q, T) for T in archive.tiers(db, start_date)]
+        return archive.chained(queries, page_size + 1, (page - 1) * page_size)
+    try:
+        rows = matches()
+    except DBAPIError:
+        # the FULLTEXT index may have gone since it was last seen (maintain_partitions.py enable drops it)
+        if db.get_bind().dialect.name != "mysql":
+            raise
+        db.rollback()
+        search.forget()
+        rows = matches()
+    return fast_ok({
+        "list": [r._asdict() for r in rows[:page_size]],
+        "current_page": page,
+        "has_more": len(rows) > page_size,
+    })
 
 @router.post("/update")
-def update_transaction(payload: TransactionUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    trx = db.query(Transaction).filter(Transaction.transaction_id == payload.transaction_id, Transaction.user_id == user.user_id).first()
+def update_transaction(payload: TransactionUpdate, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    trx = archive.find(db, user.user_id, payload.transaction_id)
     if not trx:
         raise HTTPException(status_code=404, detail="transaction not found")
-    # rollback old
-    apply_balance(db, trx.account_id, float(trx.amount), trx.transaction_type, reverse=True)
-    # apply changes
+    old = (trx.account_id, trx.transaction_time, -signed_amount(trx.amount, trx.transaction_type))
+    rollup.record_transaction(db, trx, sign=-1)
     if payload.amount is not None:
-        trx.amount = payload.amount
+        trx.amount = to_decimal(payload.amount)
     if payload.category_id is not None:
         trx.category_id = payload.category_id
     if payload.account_id is not None:
@@ -102,18 +237,24 @@ def update_transaction(payload: TransactionUpdate, db: Session = Depends(get_db)
         trx.target_person = payload.target_person
     if payload.note is not None:
         trx.note = payload.note
-    # apply new
-    apply_balance(db, trx.account_id, float(trx.amount), trx.transaction_type, reverse=False)
+    # revert + reapply collapse into one net delta when account and day are unchanged
+    balances.post_many(db, user.user_id, [old, (trx.account_id, trx.transaction_time, signed_amount(trx.amount, trx.transaction_type))])
+    rollup.record_transaction(db, trx)
+    archive.settle(db, user.user_id, trx.transaction_time)
     db.commit()
+    invalidate_counts(user.user_id)
+    versions.bump(user.user_id, "transactions", "accounts")
     return ok(message="修改成功")
 
 @router.post("/delete")
-def delete_transaction(req: dict, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    transaction_id = req.get("transaction_id")
-    trx = db.query(Transaction).filter(Transaction.transaction_id == transaction_id, Transaction.user_id == user.user_id).first()
+def delete_transaction(req: dict, db: Session = Depends(get_db), user=Depends(get_current_principal)):
+    trx = archive.find(db, user.user_id, req.get("transaction_id"))
     if not trx:
         raise HTTPException(status_code=404, detail="transaction not found")
-    apply_balance(db, trx.account_id, float(trx.amount), trx.transaction_type, reverse=True)
+    balances.post(db, user.user_id, trx.account_id, trx.transaction_time, -signed_amount(trx.amount, trx.transaction_type))
+    rollup.record_transaction(db, trx, sign=-1)
     db.delete(trx)
     db.commit()
+    invalidate_counts(user.user_id)
+    versions.bump(user.user_id, "transactions", "accounts")
     return ok(message="删除成功")
@@ -0,0 +1,237 @@
+import heapq
+import logging
+import calendar
+import importlib
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, update, and_, or_
+from .config import SCHEDULER_ENABLED, REMINDER_BATCH, REMINDER_LOOKAHEAD, REMINDER_NOTIFIER
+from .database import SessionLocal
+from .models import Reminder
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+FREQUENCIES = ("ONCE", "DAILY", "WEEKLY", "MONTHLY")
+
+# reminder times are UTC wall-clock times, like every other timestamp in the database
+
+def _month_day(year: int, month: int, day: int) -> date:
+    # the 31st fires on the last day of shorter months
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+def _add_months(d: date, months: int, day: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    return _month_day(d.year + y, m + 1, day)
+
+def first_fire(at: time, frequency: str, starts_on: date, now: datetime) -> datetime:
+    """Earliest occurrence after now of a schedule anchored on starts_on."""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"invalid frequency: {frequency}")
+    at = at.replace(tzinfo=None)
+    if frequency in ("ONCE", "DAILY"):
+        fire = datetime.combine(max(starts_on, now.date()), at)
+        return fire if fire > now else fire + timedelta(days=1)
+    if frequency == "WEEKLY":
+        d = max(starts_on, now.date())
+        d += timedelta(days=(starts_on.weekday() - d.weekday()) % 7)
+        fire = datetime.combine(d, at)
+        return fire if fire > now else fire + timedelta(days=7)
+    d = max(starts_on, now.date())
+    months = 0
+    while True:
+        fire = datetime.combine(_add_months(d.replace(day=1), months, starts_on.day), at)
+        if fire > now and fire.date() >= starts_on:
+            return fire
+        months += 1
+
+def advance(fired_at: datetime, frequency: str, starts_on: date):
+    """The occurrence after fired_at, or None once a ONCE reminder has fired."""
+    if frequency == "DAILY":
+        return fired_at + timedelta(days=1)
+    if frequency == "WEEKLY":
+        return fired_at + timedelta(days=7)
+    if frequency == "MONTHLY":
+        return datetime.combine(_add_months(fired_at.date(), 1, starts_on.day), fired_at.time())
+    return None
+
+def reschedule(row: Reminder, now: datetime = None):
+    """Restart the schedule from today after its time, frequency or active flag changed."""
+    now = now or datetime.utcnow()
+    row.starts_on = now.date()
+    row.next_fire_at = first_fire(row.reminder_time, row.frequency, row.starts_on, now) if row.is_active != 0 else None
+    return row.next_fire_at
+
+class LogNotifier:
+    def send(self, reminders: list):
+        for r in reminders:
+            logger.info("reminder %s for user %s: %s at %s", r["reminder_id"], r["user_id"], r["event_name"], r["fire_at"])
+
+def _make_notifier():
+    # "log" or "package.module:Factory" for a real push/email sender
+    if REMINDER_NOTIFIER == "log":
+        return LogNotifier()
+    module, _, attr = REMINDER_NOTIFIER.partition(":")
+    if not attr:
+        raise ValueError(f"unknown REMINDER_NOTIFIER: {REMINDER_NOTIFIER}")
+    return getattr(importlib.import_module(module), attr)()
+
+class Scheduler:
+    """Fires due reminders from a heap of the ones due within the lookahead window.
+
+    The heap is refilled from ix_reminders_next_fire in time-ordered batches, so
+    only reminders about to fire are ever read. A firing is claimed by moving
+    next_fire_at forward in the same transaction that locked the row, so several
+    workers can each run a scheduler without double delivery; delivery happens
+    after the commit, i.e. at most once.
+    """
+
+    def __init__(self, notifier=None, batch: int = REMINDER_BATCH, lookahead: int = REMINDER_LOOKAHEAD, session_factory=None):
+        self.notifier = notifier
+        self.batch = batch
+        self.lookahead = timedelta(seconds=lookahead)
+        self._session = session_factory or SessionLocal.session_factory
+        self._heap = []
+        self._queued = set()
+        self._window_end = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def hint(self, fire_at):
+        # a reminder changed in this process; reload if it now fires inside the current window
+        if fire_at is not None and self._window_end is not None and fire_at <= self._window_end:
+            self._window_end = None
+            self._wake.set()
+
+    def refill(self, now: datetime) -> int:
+        """Queue every reminder due by now + lookahead, including overdue ones."""
+        end = now + self.lookahead
+        loaded = 0
+        after = None
+        db = self._session()
+        try:
+            while True:
+                q = select(Reminder.next_fire_at, Reminder.reminder_id).where(Reminder.next_fire_at <= end)
+                if after is not None:
+                    # keyset on the index; spelled out because MySQL won't range-scan a row comparison
+                    q = q.where(or_(Reminder.next_fire_at > after[0], and_(Reminder.next_fire_at == after[0], Reminder.reminder_id > after[1])))
+                rows = db.execute(q.order_by(Reminder.next_fire_at, Reminder.reminder_id).limit(self.batch)).all()
+                for fire_at, reminder_id in rows:
+                    if (fire_at, reminder_id) not in self._queued:
+                        self._queued.add((fire_at, reminder_id))
+                        heapq.heappush(self._heap, (fire_at, reminder_id))
+                        loaded += 1
+                if len(rows) < self.batch:
+                    break
+                after = tuple(rows[-1])
+        finally:
+            db.close()
+        self._window_end = end
+        return loaded
+
+    def _due(self, now: datetime) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch:
+            fire_at, reminder_id = heapq.heappop(self._heap)
+            self._queued.discard((fire_at, reminder_id))
+            due.append((reminder_id, fire_at))
+        return due
+
+    def fire(self, due: list, now: datetime = None) -> int:
+        """Claim and deliver one batch of (reminder_id, fire_at) pairs."""
+        now = now or datetime.utcnow()
+        expected = dict(due)
+        claims = defaultdict(list)
+        sent = []
+        db = self._session()
+        try:
+            # rows another worker is firing right now are skipped, not waited on
+            rows = db.execute(
+                select(Reminder.reminder_id, Reminder.user_id, Reminder.event_name, Reminder.note, Reminder.frequency, Reminder.starts_on, Reminder.next_fire_at)
+                .where(Reminder.reminder_id.in_(expected))
+                .with_for_update(skip_locked=True)
+            ).all()
+            for r in rows:
+                fire_at = expected[r.reminder_id]
+                # deleted, deactivated, rescheduled or already fired since it was queued
+                if r.next_fire_at != fire_at:
+                    continue
+                nxt = advance(fire_at, r.frequency, r.starts_on or fire_at.date())
+                # after downtime a reminder fires once, not once per missed occurrence
+                while nxt is not None and nxt <= now:
+                    nxt = advance(nxt, r.frequency, r.starts_on or fire_at.date())
+                claims[fire_at, nxt].append(r.reminder_id)
+                sent.append({"reminder_id": r.reminder_id, "user_id": r.user_id, "event_name": r.event_name, "note": r.note, "fire_at": fire_at})
+            for (fire_at, nxt), ids in claims.items():
+                # a ONCE reminder that has fired is done
+                done = {"is_active": 0} if nxt is None else {}
+                db.execute(update(Reminder).where(Reminder.reminder_id.in_(ids), Reminder.next_fire_at == fire_at).values(next_fire_at=nxt, **done))
+            db.commit()
+        finally:
+            db.close()
+        # next_fire_at is part of the reminder list
+        for user_id in {r["user_id"] for r in sent}:
+            versions.bump(user_id, "reminders")
+        if sent:
+            self.notifier.send(sent)
+        return len(sent)
+
+    def run_once(self, now: datetime = None) -> int:
+        now = now or datetime.utcnow()
+        if self._window_end is None or now >= self._window_end:
+            self.refill(now)
+        fired = 0
+        while True:
+            due = self._due(now)
+            if not due:
+                return fired
+            fired += self.fire(due, now)
+
+    def _sleep_for(self) -> float:
+        now = datetime.utcnow()
+        until = self._window_end or now
+        if self._heap:
+            until = min(until, self._heap[0][0])
+        return max(0.0, (until - now).total_seconds())
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("reminder scheduler tick failed")
+                self._window_end = None
+                self._stop.wait(5)
+            self._wake.wait(self._sleep_for())
+            self._wake.clear()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.notifier is None:
+            self.notifier = _make_notifier()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+scheduler = Scheduler()
+
+def hint(fire_at):
+    scheduler.hint(fire_at)
+
+def start():
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
+def shutdown():
+    scheduler.shutdown()
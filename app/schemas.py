@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Any, Dict
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, time
 
@@ -73,6 +73,10 @@ class TransactionUpdate(BaseModel):
     target_person: Optional[str]
     note: Optional[str]
 
+class TransactionBatchCreate(BaseModel):
+    # items are validated one by one so a bad entry does not reject the batch
+    items: List[Dict[str, Any]]
+
 class TransactionBrief(BaseModel):
     transaction_id: int
     amount: float
@@ -126,6 +130,7 @@ class ReminderItem(BaseModel):
     reminder_time: time
     frequency: str
     is_active: bool
+    next_fire_at: Optional[datetime]
     note: Optional[str]
 
 # Dashboard
@@ -138,7 +143,10 @@ class DashboardSummary(BaseModel):
 # Stats
 class StatsReportRequest(BaseModel):
     period_type: str
-    date: str
+    date: Optional[str] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+    bucket: Optional[str] = None
 
 class ExpenseByCategoryItem(BaseModel):
     category: str
@@ -146,10 +154,17 @@ class ExpenseByCategoryItem(BaseModel):
     percent: float
 
 class StatsReportResponse(BaseModel):
+    period_type: str
+    start: str
+    end: str
+    bucket: str
+    buckets: List[str]
     income_total: float
     expense_total: float
     expense_by_category: List[ExpenseByCategoryItem]
+    income_by_category: List[ExpenseByCategoryItem]
     income_trend: List[float]
+    expense_trend: List[float]
 
 class AIAnalysisRequest(BaseModel):
     period: str
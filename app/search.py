@@ -0,0 +1,175 @@
+import re
+from fastapi import HTTPException
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, func, inspect, literal_column, or_, select, text
+from sqlalchemy.dialects import mysql
+from .models import Transaction
+from .cache import TTLCache
+from . import partitions
+
+# MySQL: InnoDB FULLTEXT with the ngram parser (ngram_token_size, default 2) maintained by the server.
+# SQLite: FTS5 table fed by triggers; text is split into the same CJK uni/bigrams in Python
+# and every token is namespaced by user ("12x午饭"), so a term's doclist only holds that user's rows.
+# The archive tier keeps the same ids, so on SQLite it feeds the same FTS table.
+
+FULLTEXT_INDEX = "ft_transactions_text"
+ARCHIVE_FULLTEXT_INDEX = "ft_transactions_archive_text"
+FTS_TABLE = "transactions_fts"
+MAX_TERMS = 8
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN = re.compile(f"[{_CJK}]+|[^\\W_{_CJK}]+")
+_IS_CJK = re.compile(f"[{_CJK}]")
+
+fts = Table(FTS_TABLE, MetaData(), Column("rowid", Integer, primary_key=True), Column("body", String))
+_fts_ref = literal_column(FTS_TABLE)
+# table -> has a FULLTEXT index; a partitioned transactions table can't have one. Rechecked every
+# FULLTEXT_CHECK_SECONDS, or right away through forget() when a MATCH fails
+FULLTEXT_CHECK_SECONDS = 60
+_fulltext = TTLCache(maxsize=8, ttl=FULLTEXT_CHECK_SECONDS)
+
+def _runs(value: str):
+    return _TOKEN.findall((value or "").lower())
+
+def ngrams(*values) -> str:
+    """Index text: words as-is, CJK runs as every single character plus every bigram."""
+    out = []
+    for value in values:
+        for run in _runs(value):
+            if _IS_CJK.match(run):
+                out.extend(run)
+                out.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                out.append(run)
+    return " ".join(out)
+
+def user_ngrams(user_id: int, *values) -> str:
+    return " ".join(f"{user_id}x{token}" for token in ngrams(*values).split())
+
+def parse(q: str) -> list:
+    terms = _runs(q)[:MAX_TERMS]
+    if not terms:
+        raise HTTPException(status_code=400, detail="empty search query")
+    return terms
+
+def _fts_query(user_id: int, terms: list) -> str:
+    parts = []
+    for term in terms:
+        if _IS_CJK.match(term):
+            # a longer CJK term must contain all of its bigrams
+            grams = [term] if len(term) == 1 else [term[i:i + 2] for i in range(len(term) - 1)]
+            parts.extend(f'"{user_id}x{g}"' for g in grams)
+        else:
+            parts.append(f'"{user_id}x{term}" *')
+    return " AND ".join(parts)
+
+def _boolean_query(terms: list) -> str:
+    # every term required; words and single CJK characters match as prefixes
+    return " ".join(f"+{t}*" if len(t) == 1 or not _IS_CJK.match(t) else f'+"{t}"' for t in terms)
+
+def _has_fulltext(db, table: str) -> bool:
+    found = _fulltext.get(table)
+    if found is None:
+        found = bool(partitions.fulltext_indexes(db.connection(), table))
+        _fulltext.set(table, found)
+    return found
+
+def forget():
+    """Drop what is known about FULLTEXT indexes, e.g. after partitioning removed one."""
+    _fulltext.clear()
+
+def apply(db, query, user_id: int, q: str, T=Transaction):
+    """Restrict a query on T (Transaction or ArchivedTransaction) to rows matching q, best matches first."""
+    terms = parse(q)
+    recent = (T.transaction_time.desc(), T.transaction_id.desc())
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql" and _has_fulltext(db, T.__tablename__):
+        score = mysql.match(T.summary, T.note, T.target_person, against=_boolean_query(terms)).in_boolean_mode()
+        return query.filter(score).order_by(score.desc(), *recent)
+    if dialect == "sqlite":
+        # materialized so the FTS index drives the join; a plain join lets SQLite
+        # walk the transactions index and re-run MATCH once per row
+        matches = select(fts.c.rowid.label("rowid"), func.bm25(_fts_ref).label("rank")).where(_fts_ref.op("MATCH")(_fts_query(user_id, terms))).cte("matches").prefix_with("MATERIALIZED")
+        return query.join(matches, matches.c.rowid == T.transaction_id).order_by(matches.c.rank, *recent)
+    # no index elsewhere: correct but scans the user's rows
+    for term in terms:
+        like = f"%{term}%"
+        query = query.filter(or_(T.summary.ilike(like), T.note.ilike(like), T.target_person.ilike(like)))
+    return query.order_by(*recent)
+
+def register_sqlite(engine):
+    # the FTS triggers call back into ngrams() on every connection
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, _record):
+        dbapi_connection.create_function("meloon_ngrams", 4, user_ngrams, deterministic=True)
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body, tokenize = 'unicode61')",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, body) VALUES (new.transaction_id, meloon_ngrams(new.user_id, new.summary, new.note, new.target_person));
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.transaction_id;
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF user_id, summary, note, target_person ON transactions BEGIN
+        UPDATE {FTS_TABLE} SET body = meloon_ngrams(new.user_id, new.summary, new.note, new.target_person) WHERE rowid = new.transaction_id;
+    END""",
+]
+
+# archived rows are never updated in place: an edit moves them back to transactions first
+_SQLITE_ARCHIVE_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_archive_ai AFTER INSERT ON transactions_archive BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, body) VALUES (new.transaction_id, meloon_ngrams(new.user_id, new.summary, new.note, new.target_person));
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_archive_ad AFTER DELETE ON transactions_archive BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.transaction_id;
+    END""",
+]
+
+_MYSQL_INDEXES = {"transactions": FULLTEXT_INDEX, "transactions_archive": ARCHIVE_FULLTEXT_INDEX}
+
+def _tables(conn) -> list:
+    # the archive table arrives in a later migration than the index
+    return [t for t in _MYSQL_INDEXES if inspect(conn).has_table(t)]
+
+def drop(conn) -> None:
+    """Remove the search index, e.g. ahead of a bulk load; rebuild() restores it."""
+    if conn.dialect.name == "mysql":
+        for table in _tables(conn):
+            if _MYSQL_INDEXES[table] in partitions.fulltext_indexes(conn, table):
+                conn.execute(text(f"ALTER TABLE {table} DROP INDEX {_MYSQL_INDEXES[table]}"))
+    elif conn.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au", "archive_ai", "archive_ad"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    forget()
+
+def rebuild(conn) -> None:
+    """(Re)create the search index from the transactions table and its archive."""
+    # table layout or tokenizer may have changed, so everything is recreated
+    drop(conn)
+    if conn.dialect.name == "mysql":
+        for table in _tables(conn):
+            _add_fulltext(conn, table)
+    elif conn.dialect.name == "sqlite":
+        for ddl in _SQLITE_DDL:
+            conn.execute(text(ddl))
+        for table in ["transactions"] + [t for t in _tables(conn) if t == "transactions_archive"]:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE} (rowid, body) SELECT transaction_id, meloon_ngrams(user_id, summary, note, target_person) FROM {table}"))
+        if "transactions_archive" in _tables(conn):
+            for ddl in _SQLITE_ARCHIVE_DDL:
+                conn.execute(text(ddl))
+    forget()
+
+def _add_fulltext(conn, table: str):
+    # MySQL has no FULLTEXT on partitioned tables; search falls back to LIKE there
+    if not partitions.is_partitioned(conn, table):
+        conn.execute(text(f"ALTER TABLE {table} ADD FULLTEXT INDEX {_MYSQL_INDEXES[table]} (summary, note, target_person) WITH PARSER ngram"))
+
+def index_archive(conn) -> None:
+    """Extend the search index to transactions_archive."""
+    if conn.dialect.name == "mysql":
+        if ARCHIVE_FULLTEXT_INDEX not in partitions.fulltext_indexes(conn, "transactions_archive"):
+            _add_fulltext(conn, "transactions_archive")
+    elif conn.dialect.name == "sqlite":
+        for ddl in _SQLITE_ARCHIVE_DDL:
+            conn.execute(text(ddl))
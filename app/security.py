@@ -1,9 +1,16 @@
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 import jwt
-from .config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_MINUTES
+from .config import JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRE_MINUTES, PASSWORD_ROUNDS
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# hashes with any other round count are upgraded (or downgraded) on the next login
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_ROUNDS,
+    pbkdf2_sha256__min_desired_rounds=PASSWORD_ROUNDS,
+    pbkdf2_sha256__max_desired_rounds=PASSWORD_ROUNDS,
+)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -11,6 +18,10 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update(plain_password: str, hashed_password: str):
+    """(matches, new_hash); new_hash is set when the stored hash uses outdated settings."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=JWT_EXPIRE_MINUTES)
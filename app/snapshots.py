@@ -0,0 +1,123 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import mysql, sqlite
+from .models import Account, BalanceSnapshot, Transaction
+from . import archive
+
+# an account with more changed days than this in one write gets rebuilt instead
+REBUILD_DAYS = 31
+CHUNK_SIZE = 1000
+ACCOUNT_BATCH = 200
+
+def day_of(when) -> date:
+    if isinstance(when, datetime):
+        return when.date()
+    if isinstance(when, date):
+        return when
+    return date.fromisoformat(str(when)[:10])
+
+def signed_amount_expr(T=Transaction):
+    return case((T.transaction_type == "INCOME", T.amount), else_=-T.amount)
+
+def _before(db: Session, account_id: int, day: date, lock: bool = False):
+    q = select(BalanceSnapshot.closing_balance).where(BalanceSnapshot.account_id == account_id, BalanceSnapshot.snap_date < day).order_by(BalanceSnapshot.snap_date.desc()).limit(1)
+    return db.execute(q.with_for_update() if lock else q).scalar()
+
+def _ensure_day(db: Session, user_id: int, account_id: int, day: date):
+    # a new day starts from the previous closing balance (or the opening balance). The account row
+    # lock serializes snapshot writers per account, and the locking reads see the latest committed
+    # closing rather than an older REPEATABLE READ snapshot, so two backdated writes can't both
+    # seed from the same stale value
+    opening = db.execute(select(Account.opening_balance).where(Account.account_id == account_id).with_for_update()).scalar()
+    start = _before(db, account_id, day, lock=True)
+    if start is None:
+        start = opening or Decimal("0")
+    row = {"account_id": account_id, "snap_date": day, "user_id": user_id, "net_change": 0, "closing_balance": start}
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        db.execute(mysql.insert(BalanceSnapshot).values(row).prefix_with("IGNORE"))
+    elif dialect == "sqlite":
+        db.execute(sqlite.insert(BalanceSnapshot).values(row).on_conflict_do_nothing())
+    elif db.get(BalanceSnapshot, (account_id, day)) is None:
+        db.add(BalanceSnapshot(**row))
+        db.flush()
+
+def _apply(db: Session, user_id: int, account_id: int, day: date, delta: Decimal):
+    _ensure_day(db, user_id, account_id, day)
+    # a write in the past moves every later closing balance too
+    db.execute(update(BalanceSnapshot).where(BalanceSnapshot.account_id == account_id, BalanceSnapshot.snap_date >= day).values(
+        closing_balance=BalanceSnapshot.closing_balance + delta,
+        net_change=BalanceSnapshot.net_change + case((BalanceSnapshot.snap_date == day, delta), else_=0),
+    ))
+
+def record_many(db: Session, user_id: int, items):
+    # items: (account_id, transaction_time, signed delta)
+    days = defaultdict(lambda: defaultdict(Decimal))
+    for account_id, when, delta in items:
+        days[account_id][day_of(when)] += delta
+    rebuild_ids = []
+    # sorted, so concurrent writers lock accounts in the same order
+    for account_id, changes in sorted(days.items()):
+        changes = {d: v for d, v in changes.items() if v}
+        if len(changes) > REBUILD_DAYS:
+            rebuild_ids.append(account_id)
+            continue
+        for day in sorted(changes):
+            _apply(db, user_id, account_id, day, changes[day])
+    if rebuild_ids:
+        db.flush()
+        rebuild(db, account_ids=rebuild_ids)
+
+def record(db: Session, user_id: int, account_id: int, when, delta: Decimal):
+    if delta:
+        _apply(db, user_id, account_id, day_of(when), delta)
+
+def shift(db: Session, account_id: int, delta: Decimal):
+    # opening balance changed: every snapshot moves by the same amount
+    db.execute(update(BalanceSnapshot).where(BalanceSnapshot.account_id == account_id).values(closing_balance=BalanceSnapshot.closing_balance + delta))
+
+def balance_at(db: Session, account: Account, day: date) -> Decimal:
+    closing = _before(db, account.account_id, day + timedelta(days=1))
+    return account.opening_balance if closing is None else closing
+
+def closing_by_day(db: Session, account: Account, start: date, end: date) -> dict:
+    # [start, end): day -> closing balance, for days with activity only
+    rows = db.execute(select(BalanceSnapshot.snap_date, BalanceSnapshot.closing_balance).where(BalanceSnapshot.account_id == account.account_id, BalanceSnapshot.snap_date >= start, BalanceSnapshot.snap_date < end).order_by(BalanceSnapshot.snap_date))
+    return {day_of(d): closing for d, closing in rows}
+
+def rebuild(db, user_id: int = None, account_ids=None) -> int:
+    # db may be a Session or a Connection (migrations)
+    accounts = select(Account.account_id, Account.user_id, Account.opening_balance)
+    clear = delete(BalanceSnapshot)
+    if account_ids is not None:
+        accounts = accounts.where(Account.account_id.in_(account_ids))
+        clear = clear.where(BalanceSnapshot.account_id.in_(account_ids))
+    elif user_id is not None:
+        accounts = accounts.where(Account.user_id == user_id)
+        clear = clear.where(BalanceSnapshot.user_id == user_id)
+    opening = {account_id: (uid, balance or Decimal("0")) for account_id, uid, balance in db.execute(accounts)}
+    db.execute(clear)
+    tiers = archive.all_tiers(db)
+    ids = sorted(opening)
+    count = 0
+    # a bounded batch of accounts at a time keeps the grouped rows small
+    for i in range(0, len(ids), ACCOUNT_BATCH):
+        batch = ids[i:i + ACCOUNT_BATCH]
+        src = archive.union([select(T.account_id, T.transaction_time, signed_amount_expr(T).label("net")).where(T.account_id.in_(batch)) for T in tiers])
+        day = func.date(src.c.transaction_time)
+        grouped = select(src.c.account_id, day, func.sum(src.c.net)).group_by(src.c.account_id, day).order_by(src.c.account_id, day)
+        rows = []
+        current, closing = None, Decimal("0")
+        for account_id, d, net in db.execute(grouped).all():
+            if account_id != current:
+                current, closing = account_id, opening[account_id][1]
+            net = Decimal(str(net or 0)).quantize(Decimal("0.01"))
+            closing += net
+            rows.append({"account_id": account_id, "snap_date": day_of(d), "user_id": opening[account_id][0], "net_change": net, "closing_balance": closing})
+        for j in range(0, len(rows), CHUNK_SIZE):
+            db.execute(insert(BalanceSnapshot), rows[j:j + CHUNK_SIZE])
+        count += len(rows)
+    return count
@@ -0,0 +1,140 @@
+import uuid
+import hashlib
+import logging
+import threading
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from .cache import TTLCache
+from .config import VERSION_STORE, REDIS_URL, DATABASE_REPLICA_URLS, READ_YOUR_WRITES_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# "user" is the account itself (profile, deletion): cached principals are tied to it
+RESOURCES = ("accounts", "categories", "transactions", "debts", "reminders", "user")
+
+class MemoryVersionStore:
+    # per-process counters; the epoch keeps a restarted process from reissuing old tags
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._data = {}
+        self._pins = TTLCache(maxsize=100000)
+        self._lock = threading.Lock()
+
+    def get_many(self, user_id: int, resources) -> list:
+        return [self._data.get((user_id, r), 0) for r in resources]
+
+    def snapshot(self, user_id: int, resources) -> tuple:
+        return self.epoch, self.get_many(user_id, resources)
+
+    def bump(self, user_id: int, resources):
+        with self._lock:
+            for r in resources:
+                self._data[user_id, r] = self._data.get((user_id, r), 0) + 1
+
+    def pin(self, user_id: int, seconds: float):
+        self._pins.set(user_id, True, seconds)
+
+    def pinned(self, user_id: int) -> bool:
+        return self._pins.get(user_id, False)
+
+class RedisVersionStore:
+    # one hash per user, shared by every worker. The epoch lives next to the counters: if Redis
+    # loses them (flush, restart without persistence) it loses the epoch too, and the first
+    # reader sets a new one, so counters starting again from 0 never reissue an old tag
+    EPOCH_KEY = "meloon:versions:epoch"
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, user_id: int) -> str:
+        return f"meloon:versions:{user_id}"
+
+    def _new_epoch(self) -> str:
+        # SETNX: of several workers racing here, every one ends up with the winner's value
+        self.client.set(self.EPOCH_KEY, uuid.uuid4().hex[:8], nx=True)
+        return self.client.get(self.EPOCH_KEY).decode()
+
+    def get_many(self, user_id: int, resources) -> list:
+        return [int(v or 0) for v in self.client.hmget(self._key(user_id), list(resources))]
+
+    def snapshot(self, user_id: int, resources) -> tuple:
+        # epoch and counters in one round trip
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.EPOCH_KEY)
+        pipe.hmget(self._key(user_id), list(resources))
+        epoch, values = pipe.execute()
+        return (epoch.decode() if epoch is not None else self._new_epoch()), [int(v or 0) for v in values]
+
+    def bump(self, user_id: int, resources):
+        pipe = self.client.pipeline(transaction=False)
+        for r in resources:
+            pipe.hincrby(self._key(user_id), r, 1)
+        pipe.execute()
+
+    def pin(self, user_id: int, seconds: float):
+        self.client.set(f"meloon:pin:{user_id}", 1, px=int(seconds * 1000))
+
+    def pinned(self, user_id: int) -> bool:
+        return bool(self.client.exists(f"meloon:pin:{user_id}"))
+
+def _make_store():
+    if VERSION_STORE == "redis":
+        return RedisVersionStore(REDIS_URL)
+    if VERSION_STORE != "memory":
+        raise ValueError(f"unknown VERSION_STORE: {VERSION_STORE}")
+    return MemoryVersionStore()
+
+store = _make_store()
+
+async def off_loop(fn, *args):
+    """fn(*args) from async code: with the Redis store it is network I/O, so it runs on the threadpool."""
+    if isinstance(store, RedisVersionStore):
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+def bump(user_id: int, *resources):
+    try:
+        store.bump(user_id, resources)
+        # every write passes through here, so this is where read-your-writes starts
+        if DATABASE_REPLICA_URLS:
+            store.pin(user_id, READ_YOUR_WRITES_SECONDS)
+    except Exception:
+        logger.exception("version bump failed for user %s", user_id)
+
+def pinned(user_id: int) -> bool:
+    """True while the user's reads must stay on the primary after a write."""
+    try:
+        return store.pinned(user_id)
+    except Exception:
+        logger.exception("pin lookup failed for user %s", user_id)
+        # can't tell, so take the safe side
+        return True
+
+def token(user_id: int, resources, *extra) -> str:
+    """Opaque token that changes whenever any of the user's resources is written."""
+    epoch, versions = store.snapshot(user_id, resources)
+    raw = "|".join([epoch, str(user_id), ",".join(map(str, versions))] + [str(x) for x in extra])
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+def etag(request: Request, user_id: int, resources, *extra) -> str:
+    return '"' + token(user_id, resources, request.url.path, request.url.query, *extra) + '"'
+
+def _matches(header: str, tag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    return any(t.strip().removeprefix("W/") == tag for t in header.split(","))
+
+def conditional(request: Request, response: Response, user_id: int, resources, *extra):
+    """Tag the response; raise 304 before any query when the client's copy is current."""
+    try:
+        tag = etag(request, user_id, resources, *extra)
+    except Exception:
+        logger.exception("version lookup failed for user %s", user_id)
+        return
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and _matches(inm, tag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
@@ -0,0 +1,22 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import ARCHIVE_AFTER_MONTHS, ARCHIVE_CUTOFF_TTL
+from app.database import SessionLocal
+from app import archive
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move transactions older than whole months into transactions_archive; run monthly from cron")
+    parser.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="keep this many whole months (plus the current one) hot")
+    parser.add_argument("--wait", type=float, default=ARCHIVE_CUTOFF_TTL, help="seconds between publishing a new cutoff and moving rows; keep it at ARCHIVE_CUTOFF_TTL of the API")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        report = archive.run(db, args.months, args.wait, log=print)
+    finally:
+        db.close()
+    dropped = ", ".join(report["dropped_partitions"]) or "none"
+    print(f"archived {report['moved']} transactions dated before {report['cutoff']:%Y-%m-%d}; dropped partitions: {dropped}")
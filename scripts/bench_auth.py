@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import Counter
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import PREFIX, start_server, _pct
+
+# old behaviour: hash on the request thread, no limit on how many wait
+MODES = {
+    "inline": {"HASH_WORKERS": "0", "HASH_QUEUE": "100000"},
+    "pool": {},
+}
+EMAIL = "bench-auth@example.com"
+PASSWORD = "bench-password"
+
+def seed(base: str, transactions: int) -> str:
+    with httpx.Client(base_url=base + PREFIX, timeout=60) as c:
+        token = c.post("/auth/register", json={"email": EMAIL, "password": PASSWORD, "language": None}).json()["data"]["token"]
+        c.headers["Authorization"] = f"Bearer {token}"
+        c.post("/accounts/add", json={"name": "cash", "type": "CASH"}).raise_for_status()
+        c.post("/categories/add", json={"name": "food", "type": "EXPENSE"}).raise_for_status()
+        account_id = c.get("/accounts/list").json()["data"][0]["account_id"]
+        category_id = c.get("/categories/list").json()["data"][-1]["category_id"]
+        items = [{"amount": 10 + i % 50, "type": "EXPENSE", "category_id": category_id, "account_id": account_id, "transaction_time": None, "target_person": None, "summary": "lunch", "note": None} for i in range(transactions)]
+        c.post("/transactions/batch_add", json={"items": items}).raise_for_status()
+    return token
+
+def _worker(base: str, request, stop: threading.Event, out: list):
+    with httpx.Client(base_url=base + PREFIX, timeout=60) as c:
+        while not stop.is_set():
+            start = time.perf_counter()
+            retry_after = None
+            try:
+                r = request(c)
+                status, retry_after = r.status_code, r.headers.get("Retry-After")
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            out.append((status, (time.perf_counter() - start) * 1000))
+            if retry_after:
+                # well-behaved clients back off when refused
+                stop.wait(float(retry_after))
+
+def run(base: str, logins: int, readers: int, duration: float, token: str) -> dict:
+    login = lambda c: c.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    read = lambda c: c.get("/transactions/list", headers={"Authorization": f"Bearer {token}"})
+    stop = threading.Event()
+    login_out, read_out = [], []
+    threads = [threading.Thread(target=_worker, args=(base, login, stop, login_out)) for _ in range(logins)]
+    threads += [threading.Thread(target=_worker, args=(base, read, stop, read_out)) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    result = {}
+    for name, samples in (("login", login_out), ("list", read_out)):
+        ok = sorted(ms for status, ms in samples if status == 200)
+        result[name] = {
+            "status": dict(Counter(str(s) for s, _ in samples)),
+            "ok_per_s": len(ok) / duration,
+            "p50": _pct(ok, 0.5) if ok else None,
+            "p95": _pct(ok, 0.95) if ok else None,
+            "p99": _pct(ok, 0.99) if ok else None,
+            "refused_ms": _pct(sorted(ms for status, ms in samples if status == 503), 0.5) if any(s == 503 for s, _ in samples) else None,
+        }
+    return result
+
+def _fmt(v) -> str:
+    return f"{v:8.1f}" if v is not None else "       -"
+
+def main():
+    parser = argparse.ArgumentParser(description="Login storm next to list traffic: hashing inline on request threads against the bounded hash pool")
+    parser.add_argument("--modes", default="inline,pool", help=f"comma separated, from {', '.join(MODES)}")
+    parser.add_argument("--logins", type=int, default=64, help="concurrent clients logging in back to back")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent clients calling /transactions/list")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--transactions", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=None, help="PASSWORD_ROUNDS for the server")
+    parser.add_argument("--db", default="/tmp/meloon_bench_auth.db")
+    args = parser.parse_args()
+    print(f"{'mode':8} {'traffic':6} {'ok/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'503 ms':>8}  status")
+    for mode in args.modes.split(","):
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        env = {**MODES[mode], "DATABASE_URL": f"sqlite:///{args.db}", "METRICS_ENABLED": "0"}
+        if args.rounds:
+            env["PASSWORD_ROUNDS"] = str(args.rounds)
+        proc, base = start_server(1, env)
+        try:
+            token = seed(base, args.transactions)
+            # let the startup thread warm the pools
+            while httpx.get(base + "/ready", timeout=5).status_code != 200:
+                time.sleep(0.1)
+            result = run(base, args.logins, args.readers, args.duration, token)
+        finally:
+            proc.terminate()
+            proc.wait()
+        for name, r in result.items():
+            print(f"{mode:8} {name:6} {r['ok_per_s']:8.1f} {_fmt(r['p50'])} {_fmt(r['p95'])} {_fmt(r['p99'])} {_fmt(r['refused_ms'])}  {r['status']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import resource
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+def _maxrss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def seed_db(path: str, rows: int):
+    from app.models import Base
+    from bench_report import seed
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, rows)
+    db.close()
+    engine.dispose()
+
+def legacy_export(db, user_id):
+    # the pre-streaming implementation: ORM .all() into an in-memory Workbook
+    import io
+    from openpyxl import Workbook
+    from app.models import Transaction, Account, Category
+    wb = Workbook()
+    ws = wb.active
+    rows = db.query(Transaction, Category.category_name, Account.account_name).join(Category, Transaction.category_id == Category.category_id).join(Account, Transaction.account_id == Account.account_id).filter(Transaction.user_id == user_id).order_by(Transaction.transaction_time).all()
+    for r in rows:
+        ws.append([r.Transaction.transaction_id, r.Transaction.transaction_type, float(r.Transaction.amount), r[1], r[2], r.Transaction.transaction_time.strftime("%Y-%m-%d %H:%M:%S"), r.Transaction.summary or "", r.Transaction.target_person or ""])
+    out = io.BytesIO()
+    wb.save(out)
+    yield out.getvalue()
+
+def child(path: str, fmt: str):
+    from app import exporter
+    engine = create_engine(f"sqlite:///{path}")
+    db = sessionmaker(bind=engine)()
+    base = _maxrss_mb()
+    t0 = time.perf_counter()
+    first = None
+    size = 0
+    if fmt == "legacy":
+        chunks = legacy_export(db, 1)
+    elif fmt == "csv":
+        chunks = exporter.iter_csv(db, 1)
+    elif fmt == "ndjson":
+        chunks = exporter.iter_ndjson(db, 1)
+    else:
+        chunks = exporter.iter_xlsx(db, 1)
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - t0
+        size += len(chunk)
+    total = time.perf_counter() - t0
+    peak = _maxrss_mb()
+    print(f"{fmt:<8} {size / 1e6:>10.1f} {first:>9.2f} {total:>9.2f} {peak:>12.1f} {peak - base:>9.1f}")
+
+def run(rows: int, formats, path: str):
+    print(f"seeding {rows} transactions into {path} ...")
+    seed_db(path, rows)
+    print(f"{'format':<8} {'size MB':>10} {'ttfb s':>9} {'total s':>9} {'peak RSS MB':>12} {'+RSS MB':>9}")
+    for fmt in formats:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", fmt, "--db", path], check=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and time-to-first-byte of /data/export formats")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--formats", default="csv,ndjson,xlsx", help="comma separated; add 'legacy' to compare with the in-memory workbook")
+    parser.add_argument("--db", default="/tmp/meloon_bench_export.db")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.db, args.child)
+    else:
+        run(args.rows, args.formats.split(","), args.db)
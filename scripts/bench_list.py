@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, Transaction, Account, Category
+from app.response import ok
+from app.routers.transactions import list_transactions
+from bench_report import seed
+
+def legacy_page(db, user_id: int, page_size: int):
+    # the previous read path: Transaction entities + names, dicts, jsonable_encoder, json.dumps
+    rows = db.query(Transaction, Category.category_name, Account.account_name).join(Category, Transaction.category_id == Category.category_id).join(Account, Transaction.account_id == Account.account_id).filter(Transaction.user_id == user_id).order_by(Transaction.transaction_time.desc(), Transaction.transaction_id.desc()).limit(page_size + 1).all()
+    data = {
+        "list": [
+            {
+                "transaction_id": r.Transaction.transaction_id,
+                "amount": float(r.Transaction.amount),
+                "type": r.Transaction.transaction_type,
+                "category_name": r[1],
+                "account_name": r[2],
+                "transaction_time": r.Transaction.transaction_time,
+                "summary": r.Transaction.summary,
+                "target_person": r.Transaction.target_person,
+            }
+            for r in rows[:page_size]
+        ],
+    }
+    return JSONResponse(jsonable_encoder(ok(data))).body
+
+def current_page(db, user_id: int, page_size: int):
+    return list_transactions(db=db, user=SimpleNamespace(user_id=user_id), start_date=None, end_date=None, type=None, account_id=None, page=1, page_size=page_size, cursor=None, with_total=False).body
+
+def timed(fn, db, page_size: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        db.expunge_all()
+        t0 = time.perf_counter()
+        fn(db, 1, page_size)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def run(rows: int, page_size: int, repeat: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    seed(db, rows)
+    legacy = timed(legacy_page, db, page_size, repeat)
+    current = timed(current_page, db, page_size, repeat)
+    print(f"{rows} rows, {page_size}-row page, best of {repeat}")
+    print(f"{'path':<10} {'ms':>8}")
+    print(f"{'before':<10} {legacy:>8.2f}")
+    print(f"{'after':<10} {current:>8.2f}")
+    print(f"speedup    {legacy / current:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time one /transactions/list page: ORM entities + jsonable_encoder vs column rows + orjson")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.rows, args.page_size, args.repeat)
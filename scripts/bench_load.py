@@ -0,0 +1,381 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import threading
+import statistics
+import subprocess
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen_data import PASSWORD
+
+PREFIX = "/v1"
+WORDS = ["午饭", "咖啡", "地铁", "超市", "电影", "房租"]
+
+class Scenario:
+    """One endpoint call; prepare() may make untimed setup requests and returns the timed one."""
+
+    def __init__(self, name: str, method: str, path: str, prepare, heavy: bool = False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.prepare = prepare
+        self.heavy = heavy
+
+    @property
+    def route(self) -> str:
+        return PREFIX + self.path
+
+def _trx(u, rnd, **extra) -> dict:
+    body = {
+        "amount": rnd.randint(100, 20000) / 100,
+        "type": "EXPENSE",
+        "category_id": u["expense_category"],
+        "account_id": rnd.choice(u["accounts"]),
+        "transaction_time": (datetime.now() - timedelta(minutes=rnd.randrange(60 * 24 * 30))).isoformat(timespec="seconds"),
+        "target_person": None,
+        "summary": rnd.choice(WORDS),
+        "note": "bench",
+    }
+    body.update(extra)
+    return body
+
+def _created(c, path: str, body: dict, key: str, list_path: str):
+    # the add endpoints don't return ids; the newest row is ours as each user runs one writer at a time
+    c.post(PREFIX + path, json=body).raise_for_status()
+    data = c.get(PREFIX + list_path).json()["data"]
+    rows = data["list"] if isinstance(data, dict) else data
+    return max(r[key] for r in rows)
+
+def _add_transaction(c, u, rnd) -> int:
+    return c.post(PREFIX + "/transactions/batch_add", json={"items": [_trx(u, rnd)]}).json()["data"]["results"][0]["transaction_id"]
+
+def _xlsx(u, rows: int) -> bytes:
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "transactions"
+    ws.append(["id", "type", "amount", "category", "account", "time", "summary", "person"])
+    for i in range(rows):
+        ws.append([None, "EXPENSE", 12.5, u["expense_category_name"], u["account_name"], f"2024-01-01 12:{i % 60:02d}:00", "导入", None])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+def _today() -> str:
+    return date.today().isoformat()
+
+SCENARIOS = [
+    Scenario("auth.login", "POST", "/auth/login", lambda c, u, r: {"json": {"email": u["email"], "password": PASSWORD}}),
+    Scenario("auth.register", "POST", "/auth/register", lambda c, u, r: {"json": {"email": f"load{r.getrandbits(48)}@example.com", "password": PASSWORD}}),
+    Scenario("bootstrap", "GET", "/bootstrap", lambda c, u, r: {}),
+    Scenario("dashboard.summary", "GET", "/dashboard/summary", lambda c, u, r: {}),
+    Scenario("accounts.list", "GET", "/accounts/list", lambda c, u, r: {}),
+    Scenario("accounts.balance_at", "GET", "/accounts/balance_at", lambda c, u, r: {"params": {"account_id": r.choice(u["accounts"]), "date": (date.today() - timedelta(days=r.randrange(700))).isoformat()}}),
+    Scenario("accounts.balance_history", "GET", "/accounts/balance_history", lambda c, u, r: {"params": {"account_id": r.choice(u["accounts"]), "period_type": "YEAR", "date": str(date.today().year), "bucket": "week"}}),
+    Scenario("accounts.add", "POST", "/accounts/add", lambda c, u, r: {"json": {"name": f"bench{r.getrandbits(32)}", "type": "CASH", "initial_balance": 10}}),
+    Scenario("accounts.update", "POST", "/accounts/update", lambda c, u, r: {"json": {"account_id": u["scratch_account"], "name": f"scratch{r.randrange(100)}", "balance": r.randint(0, 1000)}}),
+    Scenario("accounts.delete", "POST", "/accounts/delete", lambda c, u, r: {"json": {"account_id": _created(c, "/accounts/add", {"name": f"del{r.getrandbits(32)}", "type": "CASH", "initial_balance": 0}, "account_id", "/accounts/list")}}),
+    Scenario("categories.list", "GET", "/categories/list", lambda c, u, r: {}),
+    Scenario("categories.add", "POST", "/categories/add", lambda c, u, r: {"json": {"name": f"bench{r.getrandbits(32)}", "type": "EXPENSE", "icon": None}}),
+    Scenario("categories.update", "POST", "/categories/update", lambda c, u, r: {"json": {"category_id": u["scratch_category"], "name": f"scratch{r.randrange(100)}", "icon": None}}),
+    Scenario("categories.delete", "POST", "/categories/delete", lambda c, u, r: {"json": {"category_id": _created(c, "/categories/add", {"name": f"del{r.getrandbits(32)}", "type": "EXPENSE", "icon": None}, "category_id", "/categories/list")}}),
+    Scenario("transactions.list", "GET", "/transactions/list", lambda c, u, r: {"params": {"page": r.randint(1, 5)}}),
+    Scenario("transactions.list.filtered", "GET", "/transactions/list", lambda c, u, r: {"params": {"type": "EXPENSE", "account_id": r.choice(u["accounts"]), "start_date": f"{date.today().year - 1}-01-01", "end_date": _today()}}),
+    Scenario("transactions.list.cursor", "GET", "/transactions/list", lambda c, u, r: {"params": {"cursor": u["cursor"]}}),
+    Scenario("transactions.search", "GET", "/transactions/search", lambda c, u, r: {"params": {"q": r.choice(WORDS)}}),
+    Scenario("transactions.add", "POST", "/transactions/add", lambda c, u, r: {"json": _trx(u, r)}),
+    Scenario("transactions.batch_add", "POST", "/transactions/batch_add", lambda c, u, r: {"json": {"items": [_trx(u, r) for _ in range(20)]}}),
+    Scenario("transactions.update", "POST", "/transactions/update", lambda c, u, r: {"json": {"transaction_id": r.choice(u["transactions"]), "amount": None, "category_id": None, "account_id": None, "transaction_time": None, "summary": r.choice(WORDS), "target_person": None, "note": None}}),
+    Scenario("transactions.delete", "POST", "/transactions/delete", lambda c, u, r: {"json": {"transaction_id": _add_transaction(c, u, r)}}),
+    Scenario("debts.summary", "GET", "/debts/summary", lambda c, u, r: {}),
+    Scenario("debts.list", "GET", "/debts/list", lambda c, u, r: {"params": {"page": r.randint(1, 3)}}),
+    Scenario("debts.add", "POST", "/debts/add", lambda c, u, r: {"json": {"type": r.choice(("BORROW", "LEND")), "person_name": "bench", "amount": 50, "action_time": datetime.now().isoformat(timespec="seconds"), "note": None}}),
+    Scenario("debts.update", "POST", "/debts/update", lambda c, u, r: {"json": {"debt_id": r.choice(u["debts"]), "person_name": None, "amount": None, "note": r.choice(WORDS)}}),
+    Scenario("debts.delete", "POST", "/debts/delete", lambda c, u, r: {"json": {"debt_id": _created(c, "/debts/add", {"type": "LEND", "person_name": "bench", "amount": 1, "action_time": datetime.now().isoformat(timespec="seconds"), "note": None}, "debt_id", "/debts/list")}}),
+    Scenario("reminders.list", "GET", "/reminders/list", lambda c, u, r: {}),
+    Scenario("reminders.add", "POST", "/reminders/add", lambda c, u, r: {"json": {"event_name": "bench", "reminder_time": "07:00:00", "frequency": "WEEKLY", "note": None}}),
+    Scenario("reminders.update", "POST", "/reminders/update", lambda c, u, r: {"json": {"reminder_id": r.choice(u["reminders"]), "event_name": None, "reminder_time": None, "frequency": None, "note": r.choice(WORDS), "is_active": None}}),
+    Scenario("reminders.delete", "POST", "/reminders/delete", lambda c, u, r: {"json": {"reminder_id": _created(c, "/reminders/add", {"event_name": "del", "reminder_time": "07:00:00", "frequency": "ONCE", "note": None}, "reminder_id", "/reminders/list")}}),
+    Scenario("stats.report.month", "GET", "/stats/report", lambda c, u, r: {"params": {"period_type": "MONTH", "date": date.today().strftime("%Y-%m")}}),
+    Scenario("stats.report.year", "GET", "/stats/report", lambda c, u, r: {"params": {"period_type": "YEAR", "date": str(date.today().year - 1), "bucket": "week"}}),
+    Scenario("stats.ai_analysis", "POST", "/stats/ai_analysis", lambda c, u, r: {"json": {"period": date.today().strftime("%Y-%m")}}),
+    Scenario("jobs.list", "GET", "/jobs/list", lambda c, u, r: {}),
+    Scenario("jobs.status", "GET", "/jobs/status", lambda c, u, r: {"params": {"job_id": u["job"]}}, heavy=True),
+    Scenario("jobs.download", "GET", "/jobs/download", lambda c, u, r: {"params": {"job_id": u["job"]}}, heavy=True),
+    Scenario("jobs.export", "POST", "/jobs/export", lambda c, u, r: {"params": {"format": "csv", "sheet": "debts"}}, heavy=True),
+    Scenario("jobs.import", "POST", "/jobs/import", lambda c, u, r: {"files": {"file": ("bench.xlsx", u["xlsx"])}}, heavy=True),
+    Scenario("jobs.rebuild", "POST", "/jobs/rebuild", lambda c, u, r: {"json": {"target": "rollup"}}, heavy=True),
+    Scenario("data.export.csv", "GET", "/data/export", lambda c, u, r: {"params": {"format": "csv"}}, heavy=True),
+    Scenario("data.export.xlsx", "GET", "/data/export", lambda c, u, r: {"params": {"format": "xlsx", "sheet": "debts"}}, heavy=True),
+    Scenario("data.import", "POST", "/data/import", lambda c, u, r: {"files": {"file": ("bench.xlsx", u["xlsx"])}}, heavy=True),
+]
+
+def setup_user(base: str, uid: int, heavy: bool) -> dict:
+    """Log in and learn the ids the scenarios need; none of this is timed."""
+    email = f"bench{uid}@example.com"
+    with httpx.Client(base_url=base, timeout=120) as c:
+        r = c.post(PREFIX + "/auth/login", json={"email": email, "password": PASSWORD})
+        r.raise_for_status()
+        c.headers["Authorization"] = f"Bearer {r.json()['data']['token']}"
+        accounts = c.get(PREFIX + "/accounts/list").json()["data"]
+        categories = c.get(PREFIX + "/categories/list").json()["data"]
+        expense = [x for x in categories if x["type"] == "EXPENSE"]
+        page = c.get(PREFIX + "/transactions/list", params={"page_size": 100}).json()["data"]
+        u = {
+            "uid": uid,
+            "email": email,
+            "headers": dict(c.headers),
+            "accounts": [a["account_id"] for a in accounts],
+            "account_name": accounts[0]["name"],
+            "expense_category": expense[0]["category_id"],
+            "expense_category_name": expense[0]["name"],
+            "transactions": [t["transaction_id"] for t in page["list"]],
+            "cursor": page["next_cursor"],
+            "debts": [d["debt_id"] for d in c.get(PREFIX + "/debts/list", params={"page_size": 100}).json()["data"]["list"]],
+            "reminders": [x["reminder_id"] for x in c.get(PREFIX + "/reminders/list").json()["data"]],
+        }
+        # rows the update scenarios may rename freely
+        u["scratch_account"] = _created(c, "/accounts/add", {"name": "scratch", "type": "CASH", "initial_balance": 0}, "account_id", "/accounts/list")
+        u["scratch_category"] = _created(c, "/categories/add", {"name": "scratch", "type": "EXPENSE", "icon": None}, "category_id", "/categories/list")
+        if heavy:
+            u["xlsx"] = _xlsx(u, 50)
+            u["job"] = c.post(PREFIX + "/jobs/export", params={"format": "csv", "sheet": "debts"}).json()["data"]["job_id"]
+            for _ in range(600):
+                if c.get(PREFIX + "/jobs/status", params={"job_id": u["job"]}).json()["data"]["status"] in ("SUCCEEDED", "FAILED"):
+                    break
+                time.sleep(0.1)
+    return u
+
+_METRIC = re.compile(r'^(meloon_http_request_(?:queries|db_seconds)_(?:sum|count))\{method="([^"]+)",route="([^"]+)"\} (\S+)$')
+
+def scrape(base: str) -> dict:
+    try:
+        text = httpx.get(base + "/metrics", timeout=30).text
+    except httpx.HTTPError:
+        return {}
+    out = {}
+    for line in text.splitlines():
+        m = _METRIC.match(line)
+        if m:
+            out[m.group(1), m.group(2), m.group(3)] = float(m.group(4))
+    return out
+
+def _per_request(before: dict, after: dict, metric: str, method: str, route: str):
+    count = after.get((f"{metric}_count", method, route), 0) - before.get((f"{metric}_count", method, route), 0)
+    if count <= 0:
+        return None
+    return (after.get((f"{metric}_sum", method, route), 0) - before.get((f"{metric}_sum", method, route), 0)) / count
+
+def _pct(sorted_ms: list, q: float) -> float:
+    # nearest rank
+    return sorted_ms[min(len(sorted_ms) - 1, max(0, round(q * len(sorted_ms)) - 1))]
+
+def run_scenario(base: str, scenario: Scenario, users: list, concurrency: int, requests: int, duration: float, warmup: int, seed: int) -> dict:
+    local = threading.local()
+    lock = threading.Lock()
+    issued = [0]
+    latencies = []
+    statuses = {}
+    # one writer per user at a time, so "newest row is mine" holds for the delete scenarios
+    user_locks = {u["uid"]: threading.Lock() for u in users}
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = httpx.Client(base_url=base, timeout=120)
+            local.rnd = random.Random(f"{seed}:{scenario.name}:{threading.get_ident()}")
+        return local.client, local.rnd
+
+    def one(timed: bool):
+        c, rnd = client()
+        u = users[rnd.randrange(len(users))]
+        c.headers.clear()
+        c.headers.update(u["headers"])
+        with user_locks[u["uid"]] if scenario.method == "POST" else nullcontext():
+            kwargs = scenario.prepare(c, u, rnd)
+            t0 = time.perf_counter()
+            r = c.request(scenario.method, PREFIX + scenario.path, **kwargs)
+            r.read()
+            elapsed = (time.perf_counter() - t0) * 1000
+        if timed:
+            with lock:
+                latencies.append(elapsed)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    def worker(deadline):
+        while True:
+            with lock:
+                if (requests and issued[0] >= requests) or (deadline and time.perf_counter() >= deadline):
+                    return
+                issued[0] += 1
+            try:
+                one(True)
+            except Exception as e:
+                with lock:
+                    statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+
+    for _ in range(warmup):
+        one(False)
+    before = scrape(base)
+    t0 = time.perf_counter()
+    deadline = t0 + duration if duration else None
+    with ThreadPoolExecutor(concurrency) as pool:
+        for f in [pool.submit(worker, deadline) for _ in range(concurrency)]:
+            f.result()
+    wall = time.perf_counter() - t0
+    after = scrape(base)
+    latencies.sort()
+    errors = sum(n for s, n in statuses.items() if not (isinstance(s, int) and s < 400))
+    queries = _per_request(before, after, "meloon_http_request_queries", scenario.method, scenario.route)
+    db_seconds = _per_request(before, after, "meloon_http_request_db_seconds", scenario.method, scenario.route)
+    return {
+        "method": scenario.method,
+        "route": scenario.route,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "throughput_rps": len(latencies) / wall if wall else None,
+        "p50_ms": _pct(latencies, 0.50) if latencies else None,
+        "p95_ms": _pct(latencies, 0.95) if latencies else None,
+        "p99_ms": _pct(latencies, 0.99) if latencies else None,
+        "mean_ms": statistics.fmean(latencies) if latencies else None,
+        "max_ms": latencies[-1] if latencies else None,
+        "queries_per_request": queries,
+        "db_ms_per_request": db_seconds * 1000 if db_seconds is not None else None,
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(workers: int, env: dict):
+    port = _free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # metrics on for queries per request; the scheduler would add background queries
+    env = {**os.environ, "METRICS_ENABLED": "1", "SCHEDULER_ENABLED": "0", **env}
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"], cwd=root, env=env)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}")
+        try:
+            if httpx.get(base + "/", timeout=1).status_code == 200:
+                return proc, base
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("server did not start")
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _database_label() -> str:
+    from app.config import DATABASE_URL
+    # scheme and database only; never the credentials
+    return re.sub(r"//[^@/]*@", "//", DATABASE_URL)
+
+def _user_ids(spec: str) -> list:
+    ids = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        ids += list(range(int(lo), int(hi or lo) + 1))
+    return ids
+
+def compare(old_path: str, new: dict):
+    with open(old_path) as f:
+        old = json.load(f)["results"]
+    print(f"\ncompared with {old_path}")
+    print(f"{'scenario':<28} {'p50 ms':>17} {'p95 ms':>17} {'rps':>17} {'queries':>15}")
+    for name, r in new["results"].items():
+        o = old.get(name)
+        if not o:
+            continue
+
+        def cell(key, width, fmt="{:.1f}"):
+            a, b = o.get(key), r.get(key)
+            if a is None or b is None:
+                return f"{'-':>{width}}"
+            delta = f" {(b - a) / a * 100:+.0f}%" if a else ""
+            return f"{(fmt.format(a) + '->' + fmt.format(b) + delta):>{width}}"
+
+        print(f"{name:<28} {cell('p50_ms', 17)} {cell('p95_ms', 17)} {cell('throughput_rps', 17, '{:.0f}')} {cell('queries_per_request', 15)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive every API endpoint at a fixed concurrency and record latency percentiles and queries per request")
+    parser.add_argument("--url", default=None, help="benchmark a running server (needs METRICS_ENABLED=1 for query counts) instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when starting the server")
+    parser.add_argument("--users", default="1-10", help="user ids created by gen_data.py, e.g. 1-10 or 1,4,7")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--duration", type=float, default=0, help="seconds per scenario instead of --requests")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", default=None, help="comma separated scenario name prefixes")
+    parser.add_argument("--heavy", action="store_true", help="include exports, imports and background jobs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="earlier --out file to diff against")
+    args = parser.parse_args()
+
+    scenarios = [s for s in SCENARIOS if args.heavy or not s.heavy]
+    if args.only:
+        prefixes = tuple(args.only.split(","))
+        scenarios = [s for s in scenarios if s.name.startswith(prefixes)]
+    proc = None
+    base = args.url
+    if base is None:
+        proc, base = start_server(args.workers, {})
+    try:
+        users = [setup_user(base, uid, args.heavy) for uid in _user_ids(args.users)]
+        results = {}
+        print(f"{'scenario':<28} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'db ms':>7}")
+        for s in scenarios:
+            r = run_scenario(base, s, users, args.concurrency, 0 if args.duration else args.requests, args.duration, args.warmup, args.seed)
+            results[s.name] = r
+            q = f"{r['queries_per_request']:.1f}" if r["queries_per_request"] is not None else "-"
+            db = f"{r['db_ms_per_request']:.1f}" if r["db_ms_per_request"] is not None else "-"
+            print(f"{s.name:<28} {r['requests']:>6} {r['errors']:>4} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {q:>8} {db:>7}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "database": _database_label() if args.url is None else args.url,
+            "server_workers": args.workers if args.url is None else None,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests if not args.duration else None,
+            "duration_per_scenario": args.duration or None,
+            "users": _user_ids(args.users),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"wrote {args.out}")
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
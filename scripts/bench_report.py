@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, User, Account, Category, Transaction
+from app.reports import build_report
+from app import rollup
+
+CASES = [
+    ("WEEK", "2024-06-12", None, None, None),
+    ("MONTH", "2024-06", None, None, None),
+    ("QUARTER", "2024-Q2", None, None, None),
+    ("YEAR", "2024", None, None, None),
+    ("YEAR", "2024", None, None, "week"),
+    ("CUSTOM", None, "2023-11-15", "2024-02-20", "day"),
+]
+
+def seed(db, rows: int):
+    db.add(User(user_id=1, email="bench@example.com", password_hash="x"))
+    db.add(Account(account_id=1, user_id=1, account_name="cash", account_type="CASH"))
+    for i in range(1, 11):
+        db.add(Category(category_id=i, user_id=1, category_name=f"c{i}", category_type="INCOME" if i <= 2 else "EXPENSE"))
+    db.flush()
+    rnd = random.Random(rows)
+    start = datetime(2021, 1, 1)
+    span = int((datetime(2025, 1, 1) - start).total_seconds())
+    batch = []
+    for _ in range(rows):
+        cat = rnd.randint(1, 10)
+        batch.append({
+            "user_id": 1,
+            "account_id": 1,
+            "category_id": cat,
+            "amount": Decimal(rnd.randint(100, 500000)) / 100,
+            "transaction_type": "INCOME" if cat <= 2 else "EXPENSE",
+            "transaction_time": start + timedelta(seconds=rnd.randrange(span)),
+        })
+        if len(batch) == 5000:
+            db.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Transaction), batch)
+    rollup.rebuild(db)
+    db.commit()
+
+def run(sizes):
+    print(f"{'rows':>8} {'period':<8} {'anchor/range':<24} {'bucket':<6} {'queries':>7} {'ms':>8}")
+    for size in sizes:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        counter = {"n": 0}
+        event.listen(engine, "before_cursor_execute", lambda *a: counter.__setitem__("n", counter["n"] + 1))
+        db = sessionmaker(bind=engine)()
+        seed(db, size)
+        for period_type, anchor, start, end, bucket in CASES:
+            counter["n"] = 0
+            t0 = time.perf_counter()
+            data = build_report(db, 1, period_type, anchor, start, end, bucket)
+            ms = (time.perf_counter() - t0) * 1000
+            label = anchor or f"{start}..{end}"
+            print(f"{size:>8} {period_type:<8} {label:<24} {data['bucket']:<6} {counter['n']:>7} {ms:>8.2f}")
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Round trips and latency of /stats/report at different history sizes")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated transaction counts")
+    args = parser.parse_args()
+    run([int(x) for x in args.sizes.split(",")])
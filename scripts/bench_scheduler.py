@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import date, datetime, time as dtime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, User, Reminder
+from app.scheduler import Scheduler, first_fire, FREQUENCIES
+
+NOW = datetime(2024, 6, 3, 7, 59, 30)
+
+class CountingNotifier:
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, reminders: list):
+        self.sent += len(reminders)
+
+def seed(db, reminders: int, users: int, hot: float):
+    rnd = random.Random(reminders)
+    db.execute(insert(User), [{"user_id": uid, "email": f"u{uid}@example.com", "password_hash": "x"} for uid in range(1, users + 1)])
+    batch = []
+    for _ in range(reminders):
+        # a share of everyone's reminders sit on the same popular minute
+        at = dtime(8, 0) if rnd.random() < hot else dtime(rnd.randrange(24), rnd.randrange(60))
+        frequency = rnd.choice(FREQUENCIES)
+        starts_on = date(2024, 1, 1) + timedelta(days=rnd.randrange(150))
+        active = rnd.random() < 0.9
+        batch.append({
+            "user_id": rnd.randint(1, users),
+            "event_name": "bill",
+            "reminder_time": at,
+            "frequency": frequency,
+            "is_active": 1 if active else 0,
+            "starts_on": starts_on,
+            "next_fire_at": first_fire(at, frequency, starts_on, NOW) if active else None,
+        })
+        if len(batch) == 10000:
+            db.execute(insert(Reminder), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Reminder), batch)
+    db.commit()
+
+def scan_due(db, now: datetime, horizon: timedelta) -> int:
+    # what finding due reminders costs without next_fire_at: evaluate every active row
+    due = 0
+    for at, frequency, starts_on in db.execute(select(Reminder.reminder_time, Reminder.frequency, Reminder.starts_on).where(Reminder.is_active != 0)):
+        if first_fire(at, frequency, starts_on, now - timedelta(microseconds=1)) <= now + horizon:
+            due += 1
+    return due
+
+def run(path: str, reminders: int, users: int, hot: float, lookahead: int):
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    t0 = time.perf_counter()
+    seed(db, reminders, users, hot)
+    print(f"seeded {reminders} reminders in {time.perf_counter() - t0:.1f}s")
+
+    with engine.connect() as conn:
+        plan = conn.execute(text("EXPLAIN QUERY PLAN SELECT next_fire_at, reminder_id FROM reminders WHERE next_fire_at <= :end ORDER BY next_fire_at, reminder_id LIMIT 500"), {"end": NOW}).all()
+    print("refill plan:", "; ".join(row[-1] for row in plan))
+
+    t0 = time.perf_counter()
+    due = scan_due(db, NOW, timedelta(seconds=lookahead))
+    print(f"full scan:   {(time.perf_counter() - t0) * 1000:8.1f} ms to find {due} due reminders")
+    db.close()
+
+    notifier = CountingNotifier()
+    sched = Scheduler(notifier=notifier, lookahead=lookahead, session_factory=factory)
+    t0 = time.perf_counter()
+    loaded = sched.refill(NOW)
+    print(f"index load:  {(time.perf_counter() - t0) * 1000:8.1f} ms to queue {loaded} due reminders")
+    t0 = time.perf_counter()
+    fired = sched.run_once(NOW + timedelta(seconds=lookahead))
+    elapsed = time.perf_counter() - t0
+    print(f"fire:        {elapsed * 1000:8.1f} ms for {fired} reminders ({fired / elapsed:,.0f}/s)")
+    t0 = time.perf_counter()
+    later = sched.run_once(NOW + timedelta(seconds=lookahead * 2))
+    print(f"next minute:{(time.perf_counter() - t0) * 1000:8.1f} ms ({later} fired)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reminder scheduler: indexed next_fire_at against evaluating every reminder")
+    parser.add_argument("--reminders", type=int, default=300_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--hot", type=float, default=0.1, help="share of reminders set for 08:00")
+    parser.add_argument("--lookahead", type=int, default=60)
+    parser.add_argument("--db", default="/tmp/meloon_bench_scheduler.db")
+    args = parser.parse_args()
+    run(args.db, args.reminders, args.users, args.hot, args.lookahead)
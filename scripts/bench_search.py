@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert, or_
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, User, Account, Category, Transaction
+from app.routers.transactions import item_query, search_transactions
+from app import search
+
+WORDS = ["午饭", "晚饭", "早餐", "咖啡", "地铁", "打车", "超市", "房租", "水电费", "电影", "话费", "工资", "奖金", "红包", "外卖", "水果", "零食", "加油", "停车", "医院"]
+LATIN = ["Starbucks", "Uber", "Amazon", "Netflix", "coffee", "taxi", "IKEA", "Costco"]
+PEOPLE = ["张三", "李四", "王五", "小明", "妈妈", None, None, None]
+
+QUERIES = [
+    ("咖啡", {}),
+    ("饭", {}),
+    ("水电", {}),
+    ("star", {}),
+    ("午饭 张三", {}),
+    ("ikea", {}),
+    ("火锅", {}),
+    ("咖啡", {"type": "EXPENSE", "start_date": "2024-01-01", "end_date": "2024-12-31"}),
+]
+
+def seed(db, rows: int, users: int):
+    rnd = random.Random(rows)
+    for uid in range(1, users + 1):
+        db.add(User(user_id=uid, email=f"u{uid}@example.com", password_hash="x"))
+        db.add(Account(account_id=uid, user_id=uid, account_name="cash", account_type="CASH"))
+        db.add(Category(category_id=uid, user_id=uid, category_name="misc", category_type="EXPENSE"))
+    db.flush()
+    start = datetime(2021, 1, 1)
+    span = int((datetime(2025, 1, 1) - start).total_seconds())
+    batch = []
+    for _ in range(rows):
+        uid = rnd.randint(1, users)
+        words = rnd.sample(WORDS, rnd.randint(1, 2)) + ([rnd.choice(LATIN)] if rnd.random() < 0.2 else [])
+        batch.append({
+            "user_id": uid,
+            "account_id": uid,
+            "category_id": uid,
+            "amount": rnd.randint(1, 50000) / 100,
+            "transaction_type": "EXPENSE",
+            "transaction_time": start + timedelta(seconds=rnd.randrange(span)),
+            "summary": "".join(words),
+            "note": rnd.choice(WORDS) + "备注" if rnd.random() < 0.3 else None,
+            "target_person": rnd.choice(PEOPLE),
+        })
+        if len(batch) == 10000:
+            db.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Transaction), batch)
+    db.commit()
+
+def like_page(db, user_id: int, q: str, **filters):
+    query = item_query(db, user_id)
+    if filters.get("type"):
+        query = query.filter(Transaction.transaction_type == filters["type"])
+    if filters.get("start_date"):
+        query = query.filter(Transaction.transaction_time >= f"{filters['start_date']} 00:00:00", Transaction.transaction_time <= f"{filters['end_date']} 23:59:59")
+    for term in search.parse(q):
+        like = f"%{term}%"
+        query = query.filter(or_(Transaction.summary.like(like), Transaction.note.like(like), Transaction.target_person.like(like)))
+    return query.order_by(Transaction.transaction_time.desc()).limit(21).all()
+
+def search_page(db, user_id: int, q: str, **filters):
+    args = {"start_date": None, "end_date": None, "type": None, "account_id": None, "page": 1, "page_size": 20}
+    args.update(filters)
+    return search_transactions(q=q, db=db, user=SimpleNamespace(user_id=user_id), **args)
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+def run(path: str, rows: int, users: int, repeat: int, reuse: bool):
+    fresh = not (reuse and os.path.exists(path))
+    if fresh and os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    search.register_sqlite(engine)
+    db = sessionmaker(bind=engine)()
+    if fresh:
+        Base.metadata.create_all(engine)
+        t0 = time.perf_counter()
+        seed(db, rows, users)
+        print(f"seeded {rows} rows for {users} users in {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        search.rebuild(conn)
+    print(f"built search index in {time.perf_counter() - t0:.1f}s")
+    print(f"{'query':<12} {'filters':<10} {'LIKE ms':>9} {'index ms':>9} {'speedup':>8}")
+    for q, filters in QUERIES:
+        like = median_ms(lambda: like_page(db, 1, q, **filters), repeat)
+        indexed = median_ms(lambda: search_page(db, 1, q, **filters), repeat)
+        print(f"{q:<12} {'yes' if filters else '-':<10} {like:>9.1f} {indexed:>9.1f} {like / indexed:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/transactions/search (SQLite FTS5 n-grams) against a LIKE scan")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--db", default="/tmp/meloon_bench_search.db")
+    parser.add_argument("--reuse", action="store_true", help="keep an existing database's rows; only the index is rebuilt")
+    args = parser.parse_args()
+    run(args.db, args.rows, args.users, args.repeat, args.reuse)
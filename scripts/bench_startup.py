@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# nothing listens on port 1: connects are refused at once, like a database that is restarting
+UNREACHABLE_URL = "mysql+pymysql://meloon:x@127.0.0.1:1/MeloonMoney"
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print((time.perf_counter() - t) * 1000)"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _env(database_url: str = None) -> dict:
+    env = dict(os.environ)
+    # background work would only add noise to a boot measurement
+    env.setdefault("SCHEDULER_ENABLED", "0")
+    if database_url:
+        env["DATABASE_URL"] = database_url
+    return env
+
+def import_ms(env: dict) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return float(out.stdout.strip().splitlines()[-1])
+
+def boot(env: dict, path: str, timeout: float, then: str = None):
+    """Seconds from spawning uvicorn until path answers 200, the first status seen on it and, once serving, then's status."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "error"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    first = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                return None, f"exited: {proc.stderr.read().decode(errors='replace').strip().splitlines()[-1]}", None
+            try:
+                status = httpx.get(base + path, timeout=1).status_code
+                first = first or status
+                if status == 200:
+                    elapsed = time.perf_counter() - start
+                    return elapsed, first, httpx.get(base + then, timeout=5).status_code if then else None
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        return None, first or "no answer", None
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main(runs: int, path: str, timeout: float):
+    env = _env()
+    imports = [import_ms(env) for _ in range(runs)]
+    print(f"import app.main:   median {statistics.median(imports):7.0f} ms  (min {min(imports):.0f}, max {max(imports):.0f})")
+    boots = []
+    for _ in range(runs):
+        seconds, status, _ = boot(env, path, timeout)
+        if seconds is None:
+            print(f"boot to {path}: failed ({status})")
+            return
+        boots.append(seconds * 1000)
+    print(f"spawn to {path} 200: median {statistics.median(boots):5.0f} ms  (min {min(boots):.0f}, max {max(boots):.0f})")
+    seconds, status, probe = boot(_env(UNREACHABLE_URL), "/", timeout, then=path)
+    print(f"database unreachable: {'serving' if seconds is not None else 'not serving'} ({status})" + (f", {path} answers {probe}" if probe else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start: import time of app.main and time until uvicorn serves, plus boot with the database down")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="endpoint that must answer 200, e.g. /ready")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    main(args.runs, args.path, args.timeout)
@@ -0,0 +1,66 @@
+import os
+import sys
+import uuid
+import argparse
+from decimal import Decimal
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.models import User, Account, Category, Transaction, MonthlyStat
+from app.schemas import TransactionCreate
+from app.routers.transactions import add_transaction
+
+# fires parallel /transactions/add calls at one account and checks no balance update is lost
+
+def setup(db):
+    user = User(email=f"concurrency-{uuid.uuid4().hex}@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    account = Account(user_id=user.user_id, account_name="concurrency", account_type="CASH", balance=Decimal("100.00"))
+    category = Category(user_id=user.user_id, category_name="concurrency", category_type="EXPENSE")
+    db.add_all([account, category])
+    db.commit()
+    return user.user_id, account.account_id, category.category_id
+
+def add(user_id, account_id, category_id, i):
+    amount = Decimal(i % 7 + 1) + Decimal("0.25")
+    ttype = "INCOME" if i % 3 == 0 else "EXPENSE"
+    payload = TransactionCreate(type=ttype, amount=amount, category_id=category_id, account_id=account_id, transaction_time=None, target_person=None, summary=None, note=None)
+    db = SessionLocal.session_factory()
+    try:
+        add_transaction(payload, db=db, user=SimpleNamespace(user_id=user_id))
+        return amount if ttype == "INCOME" else -amount
+    except Exception as e:
+        db.rollback()
+        print(f"write {i} failed: {e}")
+        return None
+    finally:
+        db.close()
+
+def run(writes: int, threads: int) -> bool:
+    db = SessionLocal.session_factory()
+    user_id, account_id, category_id = setup(db)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            deltas = list(pool.map(lambda i: add(user_id, account_id, category_id, i), range(writes)))
+        applied = [d for d in deltas if d is not None]
+        db.expire_all()
+        balance = db.get(Account, account_id).balance
+        expected = Decimal("100.00") + sum(applied, Decimal(0))
+        print(f"{len(applied)}/{writes} writes applied, balance {balance}, expected {expected}")
+        return balance == expected
+    finally:
+        for model in (Transaction, MonthlyStat, Category, Account, User):
+            db.query(model).filter(model.user_id == user_id).delete()
+        db.commit()
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that concurrent transactions never lose a balance update")
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+    sys.exit(0 if run(args.writes, args.threads) else 1)
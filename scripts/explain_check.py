@@ -0,0 +1,168 @@
+import io
+import os
+import sys
+import inspect
+import argparse
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.params import Depends as DependsParam
+from pydantic.fields import FieldInfo
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.database import engine
+from app.models import User, Account, Category, Transaction, Debt, Reminder
+from app.routers import accounts, categories, dashboard, debts, export_import, reminders, stats, transactions
+from app import schemas, exporter
+
+def call(fn, **kwargs):
+    # fill Query(...) defaults the way FastAPI would
+    for name, param in inspect.signature(fn).parameters.items():
+        if name in kwargs:
+            continue
+        if param.annotation is Request:
+            kwargs[name] = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+            continue
+        if param.annotation is Response:
+            kwargs[name] = Response()
+            continue
+        default = param.default
+        if isinstance(default, DependsParam):
+            raise TypeError(f"{fn.__name__}: dependency {name} must be given")
+        kwargs[name] = default.default if isinstance(default, FieldInfo) else default
+    return fn(**kwargs)
+
+def _workbook(cat_name, acc_name):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "transactions"
+    ws.append(["transaction_id", "type", "amount", "category", "account", "time", "summary", "person"])
+    ws.append([0, "EXPENSE", 1.0, cat_name, acc_name, "2024-06-01 12:00:00", "probe", ""])
+    ws = wb.create_sheet("debts")
+    ws.append(["debt_id", "type", "person", "amount", "time", "note"])
+    ws.append([0, "LEND", "probe", 1.0, "2024-06-01 12:00:00", ""])
+    buf = io.BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return UploadFile(file=buf, filename="probe.xlsx")
+
+def scenarios(db: Session, user_id: int):
+    user = SimpleNamespace(user_id=user_id)
+    acc = db.query(Account).filter(Account.user_id == user_id).first()
+    cat = db.query(Category).filter(Category.user_id == user_id, Category.category_type == "EXPENSE").first()
+    trx = db.query(Transaction).filter(Transaction.user_id == user_id).first()
+    debt = db.query(Debt).filter(Debt.user_id == user_id).first()
+    rem = db.query(Reminder).filter(Reminder.user_id == user_id).first()
+    yield "accounts.list", lambda: call(accounts.list_accounts, db=db, user=user)
+    yield "categories.list", lambda: call(categories.list_categories, db=db, user=user)
+    yield "dashboard.summary", lambda: call(dashboard.summary, db=db, user=user)
+    yield "transactions.list", lambda: call(transactions.list_transactions, db=db, user=user)
+    yield "transactions.list?page=50", lambda: call(transactions.list_transactions, db=db, user=user, page=50)
+    yield "transactions.list?range+type", lambda: call(transactions.list_transactions, db=db, user=user, start_date="2024-01-01", end_date="2024-12-31", type="EXPENSE")
+    if acc:
+        yield "transactions.list?account", lambda: call(transactions.list_transactions, db=db, user=user, account_id=acc.account_id)
+        yield "accounts.balance_at", lambda: call(accounts.balance_at, account_id=acc.account_id, date="2024-06-01", db=db, user=user)
+        yield "accounts.balance_history", lambda: call(accounts.balance_history, account_id=acc.account_id, period_type="YEAR", date="2024", db=db, user=user)
+    yield "transactions.search", lambda: call(transactions.search_transactions, q="午饭", db=db, user=user)
+    yield "transactions.search?filters", lambda: call(transactions.search_transactions, q="coffee", db=db, user=user, start_date="2024-01-01", end_date="2024-12-31", type="EXPENSE")
+    yield "debts.summary", lambda: call(debts.debts_summary, db=db, user=user)
+    yield "debts.list", lambda: call(debts.list_debts, db=db, user=user)
+    yield "debts.list?type", lambda: call(debts.list_debts, db=db, user=user, type="LEND")
+    yield "reminders.list", lambda: call(reminders.list_reminders, db=db, user=user)
+    for period_type, anchor in (("WEEK", "2024-06-12"), ("MONTH", "2024-06"), ("QUARTER", "2024-Q2"), ("YEAR", "2024")):
+        yield f"stats.report?{period_type}", lambda p=period_type, a=anchor: call(stats.report, db=db, user=user, period_type=p, date=a)
+    yield "stats.ai_analysis", lambda: call(stats.ai_analysis, req={"period": "2024-06"}, db=db, user=user)
+    yield "data.export", lambda: [list(rows(db, user_id)) for rows in exporter.ROWS.values()]
+    if acc and cat:
+        yield "data.import", lambda: call(export_import.import_data, file=_workbook(cat.category_name, acc.account_name), db=db, user=user)
+        create = schemas.TransactionCreate(amount=1, type="EXPENSE", category_id=cat.category_id, account_id=acc.account_id, transaction_time=None, target_person=None, summary=None, note=None)
+        yield "transactions.add", lambda: call(transactions.add_transaction, payload=create, db=db, user=user)
+    if trx:
+        update = schemas.TransactionUpdate(transaction_id=trx.transaction_id, amount=None, category_id=None, account_id=None, transaction_time=None, summary=None, target_person=None, note=None)
+        yield "transactions.update", lambda: call(transactions.update_transaction, payload=update, db=db, user=user)
+        yield "transactions.delete", lambda: call(transactions.delete_transaction, req={"transaction_id": trx.transaction_id}, db=db, user=user)
+    if debt:
+        yield "debts.delete", lambda: call(debts.delete_debt, req={"debt_id": debt.debt_id}, db=db, user=user)
+    if rem:
+        yield "reminders.delete", lambda: call(reminders.delete_reminder, req={"reminder_id": rem.reminder_id}, db=db, user=user)
+
+def explain(conn, statement, parameters):
+    # returns a list of (detail, is_full_scan)
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        # scanning a materialized CTE reads its (already filtered) result, not a table
+        ctes = {row[-1].split()[-1] for row in rows if row[-1].startswith("MATERIALIZE ")}
+        out = []
+        for row in rows:
+            detail = row[-1]
+            full = detail.startswith("SCAN ") and " INDEX " not in f"{detail} " and "CONSTANT ROW" not in detail and detail.split()[1] not in ctes
+            out.append((detail, full))
+        return out
+    result = conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+    keys = list(result.keys())
+    out = []
+    for row in result.fetchall():
+        r = dict(zip(keys, row))
+        detail = f"table={r.get('table')} type={r.get('type')} key={r.get('key')} rows={r.get('rows')} extra={r.get('Extra')}"
+        out.append((detail, r.get("type") == "ALL"))
+    return out
+
+def run(user_id=None, verbose=False) -> int:
+    captured = []
+    conn = engine.connect()
+    outer = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+
+    def capture(_conn, _cursor, statement, parameters, _context, executemany):
+        if executemany:
+            return
+        verb = statement.lstrip().split(None, 1)[0].upper()
+        if verb in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            captured.append((statement, parameters))
+
+    try:
+        if user_id is None:
+            user_id = db.execute(select(User.user_id).order_by(User.user_id).limit(1)).scalar()
+        if user_id is None:
+            print("no users in database; seed some data first")
+            return 2
+        flagged = 0
+        for label, fn in list(scenarios(db, user_id)):
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            try:
+                fn()
+            except HTTPException as e:
+                print(f"[skip] {label}: {e.detail}")
+                continue
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+            seen = set()
+            for statement, parameters in captured:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                plan = explain(conn, statement, parameters)
+                bad = [d for d, full in plan if full]
+                flagged += bool(bad)
+                if bad or verbose:
+                    print(f"[{'FULL SCAN' if bad else 'ok'}] {label}")
+                    print("    " + " ".join(statement.split())[:300])
+                    for detail, full in plan:
+                        print(f"      {'!!' if full else '  '} {detail}")
+        print(f"{flagged} statement(s) with full scans")
+        return 1 if flagged else 0
+    finally:
+        db.close()
+        outer.rollback()
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every query issued by the routers and flag full table scans")
+    parser.add_argument("--user", type=int, default=None, help="user_id to probe with (default: first user)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan, not only flagged ones")
+    args = parser.parse_args()
+    sys.exit(run(args.user, args.verbose))
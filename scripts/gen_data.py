@@ -0,0 +1,204 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+from itertools import accumulate
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select, update
+from app.database import engine, SessionLocal
+from app.models import User, Account, Category, Transaction, Debt, Reminder
+from app.security import hash_password
+from app import migrations, rollup, snapshots, search, scheduler, debt_ledger
+
+PASSWORD = "bench-password"
+
+ACCOUNTS = [("现金", "CASH", 1), ("招商银行", "BANK", 3), ("支付宝", "ALIPAY", 4), ("微信", "WECHAT", 3)]
+
+MEALS = [0] * 6 + [2, 6, 4, 1, 1, 5, 9, 4, 1, 1, 1, 4, 8, 6, 3, 2, 1, 1]
+COMMUTE = [0] * 6 + [1, 6, 8, 2, 1, 1, 1, 1, 1, 1, 1, 3, 7, 5, 2, 1, 1, 1]
+EVENING = [0] * 7 + [1, 1, 1, 2, 2, 3, 3, 3, 3, 3, 3, 4, 6, 7, 7, 5, 3]
+DAYTIME = [0] * 8 + [2, 5, 6, 5, 3, 5, 6, 5, 4, 3, 1, 1, 0, 0, 0, 0]
+
+# name, type, share of day-to-day volume, median amount, spread, hour profile, summaries
+CATEGORIES = [
+    ("餐饮", "EXPENSE", 38, 28, 0.6, MEALS, ["午饭", "晚饭", "早餐", "外卖", "咖啡", "奶茶", "火锅", "Starbucks"]),
+    ("交通", "EXPENSE", 18, 9, 0.7, COMMUTE, ["地铁", "公交", "打车", "加油", "停车", "Uber"]),
+    ("购物", "EXPENSE", 16, 120, 1.1, EVENING, ["超市", "淘宝", "京东", "衣服", "日用品", "IKEA", "Costco"]),
+    ("娱乐", "EXPENSE", 8, 80, 0.9, EVENING, ["电影", "KTV", "游戏", "演唱会", "Netflix"]),
+    ("医疗", "EXPENSE", 2, 150, 1.0, DAYTIME, ["药店", "医院", "体检"]),
+    ("人情", "EXPENSE", 3, 300, 0.8, EVENING, ["红包", "礼物", "请客"]),
+    ("兼职", "INCOME", 2, 400, 0.8, DAYTIME, ["兼职", "稿费", "咨询费"]),
+    ("理财", "INCOME", 2, 60, 1.2, DAYTIME, ["利息", "基金收益", "分红"]),
+]
+# fixed monthly items: name, type, day of month, hour, median amount
+MONTHLY = [
+    ("工资", "INCOME", 10, 9, 15000),
+    ("房租", "EXPENSE", 1, 20, 4500),
+    ("通讯", "EXPENSE", 5, 12, 88),
+    ("水电", "EXPENSE", 15, 19, 260),
+]
+PEOPLE = ["张三", "李四", "王五", "赵六", "小明", "小红", "妈妈", "老王", "Alex", "Chris"]
+CHUNK = 10_000
+
+def _poisson(rnd: random.Random, lam: float) -> int:
+    if lam > 30:
+        return max(0, round(rnd.gauss(lam, math.sqrt(lam))))
+    limit, k, p = math.exp(-lam), 0, rnd.random()
+    while p > limit:
+        k += 1
+        p *= rnd.random()
+    return k
+
+def _amount(rnd: random.Random, median: float, spread: float) -> Decimal:
+    return max(Decimal("0.01"), Decimal(str(round(rnd.lognormvariate(math.log(median), spread), 2))))
+
+def _day_weight(day: date, index: int, days: int) -> float:
+    # weekends and December busier; people record more as the habit sticks
+    w = 1.35 if day.weekday() >= 5 else 1.0
+    if day.month == 12:
+        w *= 1.2
+    return w * (0.6 + 0.4 * index / max(1, days - 1))
+
+HOURS = range(24)
+
+def create_user(db, uid: int, password_hash: str, rnd: random.Random):
+    db.execute(insert(User), [{"user_id": uid, "email": f"bench{uid}@example.com", "password_hash": password_hash, "nickname": f"bench{uid}"}])
+    accounts = []
+    for name, atype, weight in ACCOUNTS:
+        opening = Decimal(rnd.randint(0, 20000))
+        accounts.append((db.execute(insert(Account).values(user_id=uid, account_name=name, account_type=atype, balance=opening, opening_balance=opening)).inserted_primary_key[0], weight))
+    cats = {}
+    for name, ctype, *_ in CATEGORIES:
+        cats[name] = db.execute(insert(Category).values(user_id=uid, category_name=name, category_type=ctype)).inserted_primary_key[0]
+    for name, ctype, *_ in MONTHLY:
+        cats[name] = db.execute(insert(Category).values(user_id=uid, category_name=name, category_type=ctype)).inserted_primary_key[0]
+    return accounts, cats
+
+def transactions(rnd: random.Random, uid: int, accounts, cats, count: int, start: date, end: date):
+    """Yield count-ish transaction rows in time order."""
+    days = (end - start).days + 1
+    fixed = sum(1 for i in range(days) if (start + timedelta(i)).day in {m[2] for m in MONTHLY})
+    weights = [_day_weight(start + timedelta(i), i, days) for i in range(days)]
+    scale = max(0, count - fixed) / sum(weights)
+    account_ids = [a for a, _ in accounts]
+    # cumulative weights once, not per row: this loop runs millions of times
+    account_cum = list(accumulate(w for _, w in accounts))
+    category_cum = list(accumulate(c[2] for c in CATEGORIES))
+    hour_cum = {id(p): list(accumulate(p)) for p in (MEALS, COMMUTE, EVENING, DAYTIME)}
+    for i in range(days):
+        day = start + timedelta(i)
+        rows = []
+        for name, ttype, dom, hour, median in MONTHLY:
+            if day.day == dom:
+                rows.append((datetime.combine(day, dtime(hour, rnd.randrange(60), rnd.randrange(60))), ttype, cats[name], _amount(rnd, median, 0.05), name, None, account_ids[1]))
+        for _ in range(_poisson(rnd, weights[i] * scale)):
+            name, ttype, _, median, spread, profile, words = rnd.choices(CATEGORIES, cum_weights=category_cum)[0]
+            hour = rnd.choices(HOURS, cum_weights=hour_cum[id(profile)])[0]
+            when = datetime.combine(day, dtime(hour, rnd.randrange(60), rnd.randrange(60)))
+            person = rnd.choice(PEOPLE) if name == "人情" or rnd.random() < 0.05 else None
+            rows.append((when, ttype, cats[name], _amount(rnd, median, spread), rnd.choice(words), person, rnd.choices(account_ids, cum_weights=account_cum)[0]))
+        rows.sort(key=lambda r: r[0])
+        for when, ttype, category_id, amount, summary, person, account_id in rows:
+            yield {
+                "user_id": uid,
+                "account_id": account_id,
+                "category_id": category_id,
+                "amount": amount,
+                "transaction_type": ttype,
+                "transaction_time": when,
+                "summary": summary,
+                "note": None,
+                "target_person": person,
+            }
+
+def debts(rnd: random.Random, uid: int, count: int, start: date, end: date):
+    span = int((datetime.combine(end, dtime.max) - datetime.combine(start, dtime.min)).total_seconds())
+    times = sorted(datetime.combine(start, dtime.min) + timedelta(seconds=rnd.randrange(span)) for _ in range(count))
+    for when in times:
+        yield {
+            "user_id": uid,
+            "debt_type": rnd.choice(("BORROW", "LEND")),
+            "person_name": rnd.choice(PEOPLE),
+            "amount": _amount(rnd, 500, 1.0),
+            "action_time": when,
+            "note": None,
+        }
+
+def reminders(uid: int, start: date, now: datetime):
+    for name, at, frequency in (("信用卡还款", dtime(9, 0), "MONTHLY"), ("交房租", dtime(20, 0), "MONTHLY"), ("记账", dtime(21, 30), "DAILY")):
+        yield {"user_id": uid, "event_name": name, "reminder_time": at, "frequency": frequency, "is_active": 1, "starts_on": start, "next_fire_at": scheduler.first_fire(at, frequency, start, now)}
+
+def _insert_chunked(db, model, rows) -> int:
+    n = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == CHUNK:
+            db.execute(insert(model), batch)
+            n += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(model), batch)
+        n += len(batch)
+    return n
+
+def generate(users: int, per_user: int, debts_per_user: int, years: float, end: date, seed: int, skew: float):
+    migrations.run(engine)
+    start = end - timedelta(days=int(years * 365) - 1)
+    password_hash = hash_password(PASSWORD)
+    with engine.begin() as conn:
+        # triggers would re-tokenise every row as it lands; one rebuild at the end is far cheaper
+        search.drop(conn)
+    db = SessionLocal.session_factory()
+    try:
+        first = (db.execute(select(func.max(User.user_id))).scalar() or 0) + 1
+        total = 0
+        t0 = time.perf_counter()
+        for uid in range(first, first + users):
+            # str seeds hash stably, so a user's data doesn't depend on how many users there are
+            rnd = random.Random(f"{seed}:{uid - first}")
+            # a few heavy users and a long tail, like real usage
+            count = int(per_user * (rnd.paretovariate(skew) / (skew / (skew - 1)) if skew else 1))
+            accounts, cats = create_user(db, uid, password_hash, rnd)
+            n = _insert_chunked(db, Transaction, transactions(rnd, uid, accounts, cats, count, start, end))
+            _insert_chunked(db, Debt, debts(rnd, uid, debts_per_user, start, end))
+            db.execute(insert(Reminder), list(reminders(uid, start, datetime.utcnow())))
+            total += n
+            db.commit()
+            print(f"user {uid}: {n} transactions")
+        uids = range(first, first + users)
+        # balances follow from the generated rows, then every derived table is rebuilt from them
+        delta = select(func.coalesce(func.sum(snapshots.signed_amount_expr()), 0)).where(Transaction.account_id == Account.account_id).scalar_subquery()
+        db.execute(update(Account).where(Account.user_id.in_(uids)).values(balance=Account.opening_balance + delta).execution_options(synchronize_session=False))
+        for uid in uids:
+            rollup.rebuild(db, uid)
+            snapshots.rebuild(db, uid)
+            debt_ledger.rebuild(db, uid)
+            db.commit()
+        print(f"generated {total} transactions for {users} users in {time.perf_counter() - t0:.1f}s")
+    finally:
+        db.close()
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            search.rebuild(conn)
+        print(f"search index rebuilt in {time.perf_counter() - t0:.1f}s")
+    return first, total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill DATABASE_URL with deterministic, realistically distributed demo data")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=10_000, help="transactions per user (mean when --skew is set)")
+    parser.add_argument("--debts", type=int, default=200, help="debts per user")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--end", default=date.today().isoformat(), help="last day of generated history (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skew", type=float, default=0, help="Pareto shape for per-user volume, e.g. 2.5; 0 gives every user the same volume")
+    args = parser.parse_args()
+    first, total = generate(args.users, args.transactions, args.debts, args.years, date.fromisoformat(args.end), args.seed, args.skew)
+    print(f"users {first}..{first + args.users - 1}, password {PASSWORD!r}")
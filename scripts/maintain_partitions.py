@@ -0,0 +1,27 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app import partitions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly partitions of the transactions table (MySQL only)")
+    parser.add_argument("action", choices=["status", "enable", "maintain"], help="enable rebuilds the table once; maintain adds upcoming months, run it from cron")
+    parser.add_argument("--ahead", type=int, default=3, help="months after the current one that must have a partition")
+    args = parser.parse_args()
+    if engine.dialect.name != "mysql":
+        sys.exit(f"partitioning needs MySQL; DATABASE_URL is {engine.dialect.name}")
+    if args.action == "status":
+        with engine.connect() as conn:
+            rows = partitions.status(conn)
+        if not rows:
+            print("transactions is not partitioned")
+        for name, bound, count in rows:
+            print(f"{name:10} < {bound or 'MAXVALUE'!s:20} ~{count} rows")
+    else:
+        with engine.begin() as conn:
+            created = partitions.enable(conn, args.ahead) if args.action == "enable" else partitions.maintain(conn, args.ahead)
+        print(f"created partitions: {', '.join(created) or 'none'}")
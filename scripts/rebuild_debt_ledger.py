@@ -0,0 +1,23 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app import debt_ledger
+
+def run(user_id=None):
+    db = SessionLocal()
+    try:
+        rows = debt_ledger.rebuild(db, user_id)
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute debt_ledger and debt_totals from the debts table")
+    parser.add_argument("--user", type=int, default=None, help="only rebuild this user_id")
+    args = parser.parse_args()
+    print(f"rebuilt {run(args.user)} ledger rows")
@@ -0,0 +1,16 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine
+from app import search
+
+if __name__ == "__main__":
+    # MySQL: drops and re-adds the ngram FULLTEXT index (e.g. after changing ngram_token_size)
+    # SQLite: recreates the FTS5 table contents and triggers
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        search.rebuild(conn)
+    print(f"search index rebuilt in {time.perf_counter() - t0:.1f}s")
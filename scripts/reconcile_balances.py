@@ -0,0 +1,19 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import RECONCILE_WORKERS
+from app.balances import reconcile
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute account balances from transactions and report drift")
+    parser.add_argument("--user", type=int, default=None, help="only check this user_id")
+    parser.add_argument("--fix", action="store_true", help="rewrite drifted balances and rebuild every checked account's snapshots")
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS)
+    args = parser.parse_args()
+    report = reconcile(args.user, fix=args.fix, workers=args.workers)
+    for m in report["mismatches"]:
+        print(f"account {m['account_id']} (user {m['user_id']}): balance {m['balance']} expected {m['expected']} diff {m['diff']}")
+    print(f"checked {report['accounts']} accounts, {report['mismatch_count']} mismatched, {report['fixed']} fixed, {report.get('snapshots_rebuilt', 0)} snapshot rows rebuilt")